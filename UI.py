@@ -1,26 +1,11 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import psycopg2
-import asyncio
 import logging
-from solana.rpc.async_api import AsyncClient
-from solders.pubkey import Pubkey
-from solders.transaction import Transaction, VersionedTransaction
-from solders.system_program import transfer, TransferParams
-from solders.keypair import Keypair
 from news import get_latest_news
-from walletui import create_wallet
-from wallet import (
-    decode_base58_private_key,
-    encrypt_private_key,
-    save_encrypted_key,
-    load_keypair,
-    AES_PASSWORD,
-    get_encrypted_key,
-    decrypt_private_key
-)
 from limits import check_access, can_send_message, increment_message_count, can_add_alert
-from tokens import SYMBOL_TO_MINT
+import tokens
+from wallet_directory import get_wallet_address, has_wallet, set_wallet_address, invalidate_wallet_address
 import os
 
 
@@ -99,25 +84,30 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
             return
 
         # Fetch current balance to validate
-        encrypted = get_encrypted_key(user_id)
-        if not encrypted:
+        address = get_wallet_address(user_id)
+        if not address:
             await update.message.reply_text("⚠️ Wallet not found. Use /create_wallet or /import_wallet.")
             context.user_data["awaiting_withdraw_token_amount"] = False
             return
 
-        privkey_bytes = decrypt_private_key(encrypted, AES_PASSWORD)
-        keypair = load_keypair(privkey_bytes)
-        pubkey_obj = keypair.pubkey()
+        # Trading stack is loaded on first use, not at bot startup
+        from solana.rpc.async_api import AsyncClient
+        from solders.pubkey import Pubkey
+        from withdrawals import queue_withdrawal, start_withdrawal, network_fee_lamports, RPC_URL as WITHDRAW_RPC_URL
+
+        pubkey_obj = Pubkey.from_string(address)
 
-        async with AsyncClient("https://api.mainnet-beta.solana.com") as client:
+        async with AsyncClient(WITHDRAW_RPC_URL) as client:
             sol_balance_resp = await client.get_balance(pubkey_obj)
             sol_lamports = sol_balance_resp.value
             sol_balance = sol_lamports / 1_000_000_000
-            total_required = amount + WITHDRAW_FEE
+            network_fee = network_fee_lamports() / 1_000_000_000
+            total_required = amount + WITHDRAW_FEE + network_fee
 
             if sol_balance < total_required:
                 await update.message.reply_text(
-                    f"❌ Insufficient balance. You have {sol_balance:.4f} SOL, but need {total_required:.4f} SOL (including {WITHDRAW_FEE} SOL fee)."
+                    f"❌ Insufficient balance. You have {sol_balance:.4f} SOL, but need {total_required:.6f} SOL "
+                    f"(including {WITHDRAW_FEE} SOL fee and {network_fee:.6f} SOL network fee)."
                 )
                 context.user_data["awaiting_withdraw_token_amount"] = False
                 return
@@ -126,41 +116,20 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
         net_amount = amount - WITHDRAW_FEE
         net_amount_lamports = int(net_amount * 1_000_000_000)
 
-        async def perform_withdrawal(source_keypair: Keypair, dest_address: str, amount_lamports: int):
-            async with AsyncClient("https://api.mainnet-beta.solana.com") as client:
-                from solders.instruction import Instruction
-                from solders.message import Message
-                from solders.transaction import Transaction
-                from solders.system_program import transfer, TransferParams
-
-                dest_pubkey = Pubkey.from_string(dest_address)
-                # Create transfer instruction
-                transfer_ix = transfer(
-                    TransferParams(
-                        from_pubkey=source_keypair.pubkey(),
-                        to_pubkey=dest_pubkey,
-                        lamports=amount_lamports
-                    )
-                )
-                # Get recent blockhash
-                recent_blockhash = await client.get_latest_blockhash()
-                await asyncio.sleep(10)
-                # Create message with instructions and payer
-                message = Message([transfer_ix], payer=source_keypair.pubkey())
-                # Create and sign transaction with keypairs, message, and blockhash
-                transaction = Transaction([source_keypair], message, recent_blockhash.value.blockhash)
-                # Send transaction
-                tx_sig = await client.send_transaction(transaction)
-                await asyncio.sleep(15)
-                await client.confirm_transaction(tx_sig.value)
-    
-                return str(tx_sig.value)
+        try:
+            dest_address = str(Pubkey.from_string(context.user_data["withdraw_address"]))
+        except Exception:
+            await update.message.reply_text("❌ Invalid receiving wallet address.")
+            context.user_data["awaiting_withdraw_token_amount"] = False
+            return
 
         try:
-            tx_sig = await perform_withdrawal(keypair, context.user_data["withdraw_address"], net_amount_lamports)
+            # Signing, sending and confirmation run in the background pipeline
+            withdrawal_id = queue_withdrawal(user_id, address, dest_address, net_amount_lamports)
+            start_withdrawal(context.bot, withdrawal_id)
             await update.message.reply_text(
-                f"✅ Withdrawal successful! (Fee: {WITHDRAW_FEE} SOL)\n🔗 https://solscan.io/tx/{tx_sig}",
-                parse_mode="Markdown"
+                f"⏳ Withdrawal of {net_amount:.4f} SOL submitted (Fee: {WITHDRAW_FEE} SOL). "
+                "You will get a message as soon as it is confirmed."
             )
         except Exception as e:
             logger.error(f"Withdrawal failed: {str(e)}", exc_info=True)
@@ -197,6 +166,7 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
 
     # --- Handle UI-based Wallet Import (Base58 Private Key) ---
     if context.user_data.get('awaiting_import_key'):
+        from wallet import decode_base58_private_key, encrypt_private_key, save_encrypted_key, load_keypair, AES_PASSWORD
         try:
             privkey_bytes = decode_base58_private_key(text)
             if len(privkey_bytes) != 64:
@@ -216,8 +186,10 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
         c = conn.cursor()
         c.execute("INSERT INTO users(user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING", (user_id,))
         c.execute("UPDATE users SET wallet_address=%s WHERE user_id=%s", (pubkey, user_id))
+        c.execute("UPDATE swap_users SET wallet_address=%s WHERE user_id=%s", (pubkey, user_id))
         conn.commit()
         conn.close()
+        set_wallet_address(user_id, pubkey)
 
         context.user_data['awaiting_import_key'] = False
 
@@ -279,6 +251,7 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
 
     # --- Handle UI-based Wallet Import (Base58 Private Key) ---
     if context.user_data.get('awaiting_import_key'):
+        from wallet import decode_base58_private_key, encrypt_private_key, save_encrypted_key, load_keypair, AES_PASSWORD
         try:
             privkey_bytes = decode_base58_private_key(text)
             if len(privkey_bytes) != 64:
@@ -298,8 +271,10 @@ async def receive_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
         c = conn.cursor()
         c.execute("INSERT INTO users(user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING", (user_id,))
         c.execute("UPDATE users SET wallet_address=%s WHERE user_id=%s", (pubkey, user_id))
+        c.execute("UPDATE swap_users SET wallet_address=%s WHERE user_id=%s", (pubkey, user_id))
         conn.commit()
         conn.close()
+        set_wallet_address(user_id, pubkey)
 
         context.user_data['awaiting_import_key'] = False
 
@@ -414,7 +389,7 @@ def price_alert_submenu():
 async def show_token_mint_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = []
 
-    for symbol, mint in SYMBOL_TO_MINT.items():
+    for symbol, mint in tokens.solana_tokens():
         keyboard.append([InlineKeyboardButton(f"{symbol}", callback_data=f"mint_{mint}")])
 
     keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="back_to_menu")])
@@ -488,6 +463,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     increment_message_count(user_id)
 
     if data == 'create_wallet':
+        from walletui import create_wallet
         await create_wallet(update.callback_query, context)
         return
 
@@ -661,17 +637,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data == 'wallet_menu':
         # Check if user has wallet
-        conn = psycopg2.connect(os.environ["DATABASE_URL"])
-        c = conn.cursor()
-        c.execute("SELECT wallet_address FROM swap_users WHERE user_id = %s", (user_id,))
-        row = c.fetchone()
-        conn.close()
-
-        has_wallet = bool(row and row[0])
-
         await query.edit_message_text(
             "🔐 *Wallet Menu:*",
-            reply_markup=wallet_submenu_keyboard(has_wallet),
+            reply_markup=wallet_submenu_keyboard(has_wallet(user_id)),
             parse_mode="Markdown"
         )
         return
@@ -682,6 +650,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         c.execute("UPDATE swap_users SET wallet_address = NULL WHERE user_id = %s", (user_id,))
         conn.commit()
         conn.close()
+        invalidate_wallet_address(user_id)
 
         await context.bot.send_message(
             chat_id=user_id,
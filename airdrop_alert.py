@@ -1,10 +1,13 @@
-import requests
+import hashlib
+import json
 import psycopg2
+from psycopg2.extras import execute_values
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from limits import check_access
-import datetime
+from limits import check_access, allowed_packages
+from notify import send_bulk
+from http_client import get_session
+from jobs import schedule_repeating
 import os
 import logging
 
@@ -19,84 +22,65 @@ if not AIRDROP_SOURCE_URL:
 else:
     logger.info("AIRDROP_SOURCE_URL is set")
 
-# === Initialize DB ===
-def init_airdrop_db():
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    try:
-        # Add last_airdrop_sent column to users table if not exists
-        c.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_airdrop_sent TEXT")
-        logger.info("Checked/added last_airdrop_sent column to users table")
-    except psycopg2.Error as e:
-        logger.error(f"Failed to alter users table: {e}")
-    try:
-        # Create or recreate airdrops table with created_at
-        c.execute("DROP TABLE IF EXISTS airdrops")  # Force recreate to ensure schema
-        c.execute("""
-            CREATE TABLE airdrops (
-                id TEXT PRIMARY KEY,
-                name TEXT,
-                network TEXT,
-                category TEXT,
-                description TEXT,
-                url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        logger.info("Recreated airdrops table with created_at column")
-    except psycopg2.Error as e:
-        logger.error(f"Failed to recreate airdrops table: {e}")
-    conn.commit()
-    conn.close()
-
 # === Fetch from external API ===
-def fetch_airdrops():
+async def fetch_airdrops():
     try:
-        r = requests.get(AIRDROP_SOURCE_URL)
-        r.raise_for_status()
-        return r.json()
+        async with get_session().get(AIRDROP_SOURCE_URL) as r:
+            r.raise_for_status()
+            return await r.json(content_type=None)
     except Exception as e:
         logger.error(f"Airdrop API fetch failed: {e}")
         return []
 
-# === Save to DB ===
-def fetch_and_store_airdrops():
-    drops = fetch_airdrops()
-    if not drops:
+AIRDROP_FIELDS = ("name", "network", "category", "description", "url")
+
+def airdrop_hash(drop):
+    payload = json.dumps([drop.get(field) for field in AIRDROP_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+# === Save to DB: one batched upsert, only new or changed rows are rewritten ===
+async def fetch_and_store_airdrops():
+    drops = await fetch_airdrops()
+    rows = {}
+    for drop in drops or []:
+        if drop.get("id") is None:
+            continue
+        rows[str(drop["id"])] = (str(drop["id"]), *(drop.get(field) for field in AIRDROP_FIELDS), airdrop_hash(drop))
+    if not rows:
         return
 
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    for drop in drops:
-        c.execute("""
-            INSERT INTO airdrops (id, name, network, category, description, url)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO UPDATE SET
-                name = EXCLUDED.name,
-                network = EXCLUDED.network,
-                category = EXCLUDED.category,
-                description = EXCLUDED.description,
-                url = EXCLUDED.url
-        """, (
-            drop.get("id"),
-            drop.get("name"),
-            drop.get("network"),
-            drop.get("category"),
-            drop.get("description"),
-            drop.get("url")
-        ))
+    changed = execute_values(c, """
+        INSERT INTO airdrops (id, name, network, category, description, url, content_hash)
+        VALUES %s
+        ON CONFLICT (id) DO UPDATE SET
+            name = EXCLUDED.name,
+            network = EXCLUDED.network,
+            category = EXCLUDED.category,
+            description = EXCLUDED.description,
+            url = EXCLUDED.url,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE airdrops.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING (xmax = 0) AS inserted
+    """, list(rows.values()), fetch=True)
+    c.execute("UPDATE airdrops SET last_seen_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)", (list(rows),))
     conn.commit()
     conn.close()
 
+    inserted = sum(1 for (is_new,) in changed if is_new)
+    logger.info(f"Airdrops: {inserted} new, {len(changed) - inserted} changed, {len(rows) - len(changed)} unchanged")
+
 # === Read from DB ===
-def get_stored_airdrops(limit=5):
+def get_stored_airdrops(limit=5, since=None):
+    """Newest drops first; with since, only drops first seen after that timestamp."""
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    try:
+    if since is None:
         c.execute("SELECT id, name, network, category, description, url FROM airdrops ORDER BY created_at DESC LIMIT %s", (limit,))
-    except psycopg2.Error as e:
-        logger.error(f"Query failed, falling back to unordered selection: {e}")
-        c.execute("SELECT id, name, network, category, description, url FROM airdrops LIMIT %s", (limit,))  # Fallback
+    else:
+        c.execute("SELECT id, name, network, category, description, url FROM airdrops WHERE created_at > %s ORDER BY created_at DESC LIMIT %s", (since, limit))
     rows = c.fetchall()
     conn.close()
 
@@ -132,41 +116,50 @@ def format_airdrop_message(drops):
     return text
 
 # === Daily sending ===
+AIRDROP_BATCH_SIZE = 500
+
 def get_users_to_notify():
+    """[(user_id, last_airdrop_sent)] for entitled users without a digest today, in one indexed query."""
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    today = str(datetime.date.today())
-    c.execute("SELECT user_id, last_airdrop_sent FROM users")
+    c.execute("""
+        SELECT user_id, last_airdrop_sent FROM users
+        WHERE package = ANY(%s)
+          AND (last_airdrop_sent IS NULL OR last_airdrop_sent < CURRENT_DATE)
+        ORDER BY user_id
+    """, (allowed_packages("airdrop"),))
     users = c.fetchall()
     conn.close()
-    return [uid for uid, last in users if last is None or str(last) != today]
+    return users
 
-def mark_airdrop_sent(user_id):
+def mark_airdrop_sent(user_ids):
+    if not user_ids:
+        return
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    today = str(datetime.date.today())
-    c.execute("UPDATE users SET last_airdrop_sent=%s WHERE user_id=%s", (today, user_id))
+    c.execute("UPDATE users SET last_airdrop_sent = CURRENT_TIMESTAMP WHERE user_id = ANY(%s)", (list(user_ids),))
     conn.commit()
     conn.close()
 
 async def send_daily_airdrop_alerts(context: ContextTypes.DEFAULT_TYPE):
-    drops = get_stored_airdrops()
-    if not drops:
-        return
-
-    text = format_airdrop_message(drops)
-
-    for user_id in get_users_to_notify():
-        if not isinstance(user_id, int):
-            logger.error(f"Invalid user_id in notify list: {user_id}")
-            continue
-        if not check_access(user_id, "airdrop"):
-            continue
-        try:
-            await context.bot.send_message(chat_id=user_id, text=text, parse_mode="Markdown")
-            mark_airdrop_sent(user_id)
-        except Exception as e:
-            logger.error(f"Failed to send airdrop to {user_id}: {e}")
+    # Each user only hears about drops first seen since their previous digest;
+    # users sharing the same last digest time share one query and message.
+    users = get_users_to_notify()
+    texts = {}
+    total_sent = total_failed = 0
+    for start in range(0, len(users), AIRDROP_BATCH_SIZE):
+        messages = []
+        for user_id, last_sent in users[start:start + AIRDROP_BATCH_SIZE]:
+            if last_sent not in texts:
+                drops = get_stored_airdrops(since=last_sent)
+                texts[last_sent] = format_airdrop_message(drops) if drops else None
+            if texts[last_sent] is not None:
+                messages.append((user_id, texts[last_sent]))
+        sent, failed = await send_bulk(context.bot, messages, parse_mode="Markdown")
+        mark_airdrop_sent(sent)
+        total_sent += len(sent)
+        total_failed += len(failed)
+    logger.info(f"Airdrop digest sent to {total_sent} users ({total_failed} failed)")
 
 # === Manual command ===
 async def manual_airdrop_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -188,17 +181,17 @@ async def manual_airdrop_alert(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text(text, parse_mode="Markdown")
 
 # === Register everything ===
-def register_airdrop_handlers(application):
-    init_airdrop_db()  # Ensure table is recreated on startup
-
-    application.add_handler(CommandHandler("airdrop_alert", manual_airdrop_alert))
-
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(fetch_and_store_airdrops, "interval", hours=8)  # Fetch API 3x/day
-    scheduler.add_job(lambda: send_daily_airdrop_alerts(application), "interval", hours=24)  # Alert 1x/day
-    scheduler.start()
-
-    fetch_and_store_airdrops()  # Initial fetch
+AIRDROP_FETCH_HOURS = 8
+AIRDROP_SEND_CHECK_MINUTES = 60
 
+async def refresh_airdrops_job(context: ContextTypes.DEFAULT_TYPE):
+    await fetch_and_store_airdrops()
 
+def register_airdrop_handlers(application):
+    application.add_handler(CommandHandler("airdrop_alert", manual_airdrop_alert))
 
+    schedule_repeating(application, "airdrop_fetch", refresh_airdrops_job,
+                       interval=AIRDROP_FETCH_HOURS * 3600, first=5, jitter=60)
+    # Delivery is idempotent per day (last_airdrop_sent), so checking hourly survives restarts
+    schedule_repeating(application, "airdrop_digest", send_daily_airdrop_alerts,
+                       interval=AIRDROP_SEND_CHECK_MINUTES * 60, first=300, jitter=60)
@@ -1,99 +1,99 @@
-import psycopg2
+from db import lazy_connection, lazy_cursor
 import asyncio
 import logging
-from datetime import datetime, timedelta
-import os
+import time
+import numpy as np
+import timeseries
+from timeseries import SYMBOL_LIST
+from notify import broadcast_text
 
 logger = logging.getLogger(__name__)
 
-TRACKED_SYMBOLS = ['btc', 'eth', 'sol']
-
-conn_alerts = psycopg2.connect(os.environ["DATABASE_URL"])
-c_alerts = conn_alerts.cursor()
-
-conn_prices = psycopg2.connect(os.environ["DATABASE_URL"])
-c_prices = conn_prices.cursor()
-
-# --- Store previously sent alert levels ---
-sent_alerts = {
-    '15m': {s: set() for s in TRACKED_SYMBOLS},
-    '1h': {s: set() for s in TRACKED_SYMBOLS},
-    '24h': {s: set() for s in TRACKED_SYMBOLS},
-    '7d': {s: set() for s in TRACKED_SYMBOLS},
-}
-
-# --- Load price from DB ---
-def get_cached_price(symbol):
-    c_prices.execute("SELECT price FROM price_cache WHERE symbol=%s", (symbol,))
-    row = c_prices.fetchone()
-    return row[0] if row else None
+conn_alerts = lazy_connection("autoalert")
+c_alerts = lazy_cursor("autoalert")
 
 # --- Get all unique user IDs ---
 def get_all_user_ids():
     c_alerts.execute("SELECT DISTINCT user_id FROM alerts")
     return [row[0] for row in c_alerts.fetchall()]
 
-# --- Track price history for all timeframes ---
-price_history = {
-    '15m': {},
-    '1h': {},
-    '24h': {},
-    '7d': {},
-}
-
-# --- Analyze price changes and return message list ---
-def check_price_change(symbol, current_price):
-    now = datetime.now()
-    messages = []
-
-    timeframes = {
-        '15m': timedelta(minutes=15),
-        '1h': timedelta(hours=1),
-        '24h': timedelta(hours=24),
-        '7d': timedelta(days=7)
-    }
-
-    for tf, delta in timeframes.items():
-        old = price_history[tf].get(symbol)
-        if not old:
-            price_history[tf][symbol] = (now, current_price)
-            continue
-
-        old_time, old_price = old
-        if now - old_time >= delta:
-            price_history[tf][symbol] = (now, current_price)
-            continue
-
-        change = ((current_price - old_price) / old_price) * 100
-        change = round(change, 2)
-
-        for level in [5, 10, 20]:
-            if abs(change) >= level and level not in sent_alerts[tf][symbol]:
-                direction = "⬆️ Pumped" if change > 0 else "⬇️ Crashed"
-                msg = (
-                    f"*{symbol.upper()}* {direction} by {abs(change)}% in the last {tf}!\n"
-                    f"Current Price: ${current_price}"
-                )
-                messages.append((tf, level, msg))
-
-    return messages
+# --- Move detection over every symbol in timeseries.SYMBOL_LIST ---
+TIMEFRAMES = {'15m': 15 * 60, '1h': 3600, '24h': 24 * 3600, '7d': 7 * 24 * 3600}
+TF_NAMES = list(TIMEFRAMES)
+TF_SECONDS = np.array(list(TIMEFRAMES.values()), dtype=np.float64)
+LEVELS = np.array([5.0, 10.0, 20.0])  # percent
+HYSTERESIS = 0.3  # a level re-arms once the move falls back below 70% of it
+COOLDOWN = np.maximum(TF_SECONDS, 30 * 60)  # min seconds between alerts per symbol/timeframe
+
+# Per (timeframe, symbol): highest level alerted and not yet re-armed, its sign,
+# the level of the last alert and when its cooldown ends
+_alerted = np.zeros((len(TF_NAMES), len(SYMBOL_LIST)), dtype=np.int64)
+_alerted_sign = np.zeros((len(TF_NAMES), len(SYMBOL_LIST)), dtype=np.int64)
+_fired_level = np.zeros((len(TF_NAMES), len(SYMBOL_LIST)), dtype=np.int64)
+_next_allowed = np.zeros((len(TF_NAMES), len(SYMBOL_LIST)))
+
+def _fit(n):
+    """Pad the per-symbol state for symbols timeseries picked up from a registry reload."""
+    global _alerted, _alerted_sign, _fired_level, _next_allowed
+    if _alerted.shape[1] < n:
+        _alerted, _alerted_sign, _fired_level, _next_allowed = (
+            timeseries.pad_symbols(a, n, 0) for a in (_alerted, _alerted_sign, _fired_level, _next_allowed)
+        )
+
+def detect_moves(now=None):
+    """[(tf, level, symbol, change_pct, price)] for moves that crossed a new level this tick."""
+    now = time.time() if now is None else now
+    current = timeseries.prices_ago(0, now)
+    _fit(len(current))
+    past = np.vstack([timeseries.prices_ago(seconds, now) for seconds in TF_SECONDS])  # (tf, symbol)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - past) / past * 100.0
+    valid = np.isfinite(change)
+    magnitude = np.where(valid, np.abs(change), 0.0)
+    sign = np.where(valid, np.sign(change), 0).astype(np.int64)
+
+    reached = np.searchsorted(LEVELS, magnitude, side='right')  # 0 = below every level
+    # A move in the other direction starts from scratch
+    flipped = (sign != _alerted_sign) & (reached > 0)
+    _alerted[flipped] = 0
+    # Hysteresis: fall back below the re-arm band and the lower levels can fire again
+    rearm = np.searchsorted(LEVELS * (1 - HYSTERESIS), magnitude, side='right')
+    np.minimum(_alerted, rearm, out=_alerted)
+
+    # Within the cooldown only an escalation past the last alerted level fires
+    fire = valid & (reached > _alerted) & ((now >= _next_allowed) | (reached > _fired_level))
+    _alerted[fire] = reached[fire]
+    _fired_level[fire] = reached[fire]
+    _alerted_sign[fire] = sign[fire]
+    _next_allowed[fire] = np.broadcast_to(now + COOLDOWN[:, None], _next_allowed.shape)[fire]
+
+    moves = []
+    for tf_i, sym_i in zip(*np.nonzero(fire)):
+        moves.append((TF_NAMES[tf_i], float(LEVELS[reached[tf_i, sym_i] - 1]), SYMBOL_LIST[sym_i],
+                      round(float(change[tf_i, sym_i]), 2), float(current[sym_i])))
+    return moves
+
+MAX_MOVES_PER_MESSAGE = 20  # keeps a market-wide move under Telegram's message size limit
+
+def format_moves(moves):
+    """One message for every move of a tick, biggest first."""
+    moves = sorted(moves, key=lambda m: -abs(m[3]))
+    lines = []
+    for tf, level, symbol, change, price in moves[:MAX_MOVES_PER_MESSAGE]:
+        direction = "⬆️ Pumped" if change > 0 else "⬇️ Crashed"
+        lines.append(f"*{symbol.upper()}* {direction} by {abs(change)}% in the last {tf}!\nCurrent Price: ${price}")
+    if len(moves) > MAX_MOVES_PER_MESSAGE:
+        lines.append(f"…and {len(moves) - MAX_MOVES_PER_MESSAGE} more moves.")
+    return "\n\n".join(lines)
 
 # --- Main auto alert loop ---
 async def auto_price_watcher(app):
     while True:
         try:
-            for symbol in TRACKED_SYMBOLS:
-                current_price = get_cached_price(symbol)
-                if not current_price:
-                    continue
-
-                alerts = check_price_change(symbol, current_price)
-
-                for tf, level, message in alerts:
-                    sent_alerts[tf][symbol].add(level)
-                    for user_id in get_all_user_ids():
-                        await app.bot.send_message(chat_id=user_id, text=message, parse_mode="Markdown")
-
+            moves = detect_moves()
+            if moves:
+                await broadcast_text(app.bot, get_all_user_ids(), format_moves(moves), parse_mode="Markdown")
         except Exception as e:
             logger.error(f"Alert loop error: {e}")
 
@@ -1,6 +1,12 @@
+# Imported first so every other import is timed
+import lifecycle
+lifecycle.install_import_profiler()
+
 import os
+import sys
 import logging
 import psycopg2
+from db import lazy_connection, lazy_cursor
 import requests
 import asyncio
 from telegram import BotCommand
@@ -10,13 +16,24 @@ from telegram import Update
 from pay import register_payment_handlers, check_expirations
 from UI import menu, button_handler, pcu_info_callback
 from referral import register_referral_handlers
-from fetch_prices import SYMBOLS, DEX_URLS, fetch_prices
+import tokens
+from fetch_prices import fetch_prices
 from fetch_prices import get_cached_price
+from refresh_scheduler import note_query, register_refresh_jobs
 from walletui import register_swap_handlers, import_wallet
 from UI import receive_wallet_address
 from airdrop_alert import register_airdrop_handlers
-from news import register_news_scheduler
+from news import register_news_jobs
+from candles import register_candle_jobs, flush as flush_candles
+from history_store import register_history_jobs
+from indicators import register_indicator_handlers
 from limits import can_send_message, increment_message_count, can_add_alert
+from http_client import close_session
+from db import close_all as close_db_connections
+from news_routing import invalidate_routing_index
+from payment_watcher import payment_watcher
+from jobs import schedule_repeating, make_jobs_command
+from migrations import run_migrations
 
 from telegram.ext import MessageHandler, filters, CommandHandler, ApplicationBuilder, ContextTypes, CallbackQueryHandler
 
@@ -30,16 +47,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # PostgreSQL database setup
-conn = psycopg2.connect(os.environ["DATABASE_URL"])
-c = conn.cursor()
-c.execute("""
-    CREATE TABLE IF NOT EXISTS alerts (
-        user_id INTEGER,
-        symbol TEXT,
-        threshold REAL
-    )
-""")
-conn.commit()
+conn = lazy_connection("bot")
+c = lazy_cursor("bot")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -141,6 +150,7 @@ async def set_bot_commands(app):
         BotCommand("start", "Start the bot"),
         BotCommand("price", "Get current token price"),
         BotCommand("add", "Set price alert"),
+        BotCommand("indicator", "RSI, MA cross and breakout alerts"),
         BotCommand("help", "Help using the bot"),
     ]
     await app.bot.set_my_commands(commands)
@@ -157,14 +167,15 @@ async def price(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     symbol = context.args[0].lower()
-    if symbol not in SYMBOLS:
+    if not tokens.is_priced(symbol):
         await update.message.reply_text("Unsupported symbol. Try: btc, eth, bnb, pepe, sol")
         return
 
+    note_query(symbol)
     try:
         price = get_cached_price(symbol)
         if price is None:
-            prices = await fetch_prices()
+            prices = await fetch_prices([symbol])
             price = prices.get(symbol)
 
         if price is None:
@@ -191,7 +202,7 @@ async def add_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     symbol, threshold = context.args[0].lower(), context.args[1]
-    if symbol not in SYMBOLS:
+    if not tokens.is_priced(symbol):
         await update.message.reply_text("Invalid symbol. Try btc, eth, etc.")
         return
 
@@ -200,6 +211,7 @@ async def add_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
         c.execute("INSERT INTO alerts (user_id, symbol, threshold) VALUES (%s, %s, %s)",
                   (user_id, symbol, threshold))
         conn.commit()
+        invalidate_routing_index()
         await update.message.reply_text(f"Alert added for {symbol.upper()} at ${threshold}.")
     except ValueError:
         await update.message.reply_text("Threshold must be a number.")
@@ -219,6 +231,7 @@ async def remove_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
     c.execute("DELETE FROM alerts WHERE user_id=%s AND symbol=%s",
               (user_id, symbol))
     conn.commit()
+    invalidate_routing_index()
     await update.message.reply_text(f"Alert removed for {symbol.upper()}.")
 
 async def track_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -250,7 +263,7 @@ async def alert_checker(app):
                 await asyncio.sleep(60)
                 continue
 
-            prices = await fetch_prices()
+            prices = await fetch_prices(symbols)
 
             c.execute("SELECT user_id, symbol, threshold FROM alerts")
             alerts = c.fetchall()
@@ -276,10 +289,53 @@ async def alert_checker(app):
 
         await asyncio.sleep(60)
 
-async def on_startup(app):
+# --- Lifecycle ---
+def _has_in_flight_withdrawals():
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM withdrawals WHERE status IN ('queued', 'sent'))")
+            return cur.fetchone()[0]
+
+async def resume_withdrawals_if_any(app):
+    # Only load the trading stack when a previous process left work behind
+    if _has_in_flight_withdrawals():
+        from withdrawals import resume_withdrawals
+        await resume_withdrawals(app)
+
+async def stop_solana_ws(app):
+    solana_ws = sys.modules.get("solana_ws")
+    if solana_ws is not None:
+        await solana_ws.stop()
+
+def start_background_tasks(app):
     app.create_task(alert_checker(app))
     app.create_task(auto_price_watcher(app))
-    await set_bot_commands(app)
+    app.create_task(payment_watcher(app))
+
+lifecycle.add_startup_hook("migrations", lambda app: run_migrations())
+lifecycle.add_startup_hook("background_tasks", start_background_tasks)
+lifecycle.add_startup_hook("resume_withdrawals", resume_withdrawals_if_any)
+lifecycle.add_startup_hook("bot_commands", set_bot_commands)
+lifecycle.add_shutdown_hook("db", lambda app: close_db_connections())
+lifecycle.add_shutdown_hook("http_session", lambda app: close_session())
+lifecycle.add_shutdown_hook("candles", lambda app: flush_candles(final=True))
+lifecycle.add_shutdown_hook("solana_ws", stop_solana_ws)
+
+async def startup_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+    await update.message.reply_text(lifecycle.startup_report(), parse_mode="Markdown")
+
+async def price_sources_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+    import circuit
+    import price_sources
+    import refresh_scheduler
+    text = "\n\n".join([price_sources.format_health(), circuit.format_status(), refresh_scheduler.format_tiers()])
+    await update.message.reply_text(text, parse_mode="Markdown")
 
 async def handle_user_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get('awaiting_import_key'):
@@ -289,18 +345,24 @@ async def handle_user_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await receive_wallet_address(update, context)
 
-async def main():
+def main():
     application = (
         ApplicationBuilder()
         .token(BOT_TOKEN)
-        .post_init(on_startup)
+        .post_init(lifecycle.run_startup)
+        .post_shutdown(lifecycle.run_shutdown)
         .build()
     )
 
     register_payment_handlers(application)
     register_referral_handlers(application)
     register_swap_handlers(application)
-    register_news_scheduler(application)
+    register_news_jobs(application)
+    register_candle_jobs(application)
+    register_history_jobs(application)
+    register_indicator_handlers(application)
+    tokens.register_token_registry_job(application)
+    register_refresh_jobs(application)
     register_airdrop_handlers(application)
 
     application.add_handler(CommandHandler("import_wallet", import_wallet))
@@ -316,17 +378,16 @@ async def main():
     application.add_handler(CommandHandler("add", add_alert))
     application.add_handler(CommandHandler("remove", remove_alert))
     application.add_handler(CommandHandler("track", track_alerts))
-    daily_time = time(hour=0, minute=0)
-    print(f"Scheduling check_expirations at {daily_time}")
-    application.job_queue.run_daily(check_expirations, time=daily_time)
+    application.add_handler(CommandHandler("jobs", make_jobs_command(ADMIN_ID)))
+    application.add_handler(CommandHandler("startup", startup_profile))
+    application.add_handler(CommandHandler("sources", price_sources_status))
+    schedule_repeating(application, "check_expirations", check_expirations, interval=3600, first=60, jitter=30)
     application.add_error_handler(lambda update, context: logger.error(f"Error: {context.error}"))
 
     print("Bot is running...")
-    await application.run_polling()
+    application.run_polling()
 
 if __name__ == "__main__":
-    import nest_asyncio
-    nest_asyncio.apply()
     print(f"datetime module: {datetime}, time class: {time}")
-    asyncio.run(main())
+    main()
     
@@ -0,0 +1,230 @@
+import datetime
+import logging
+import os
+import threading
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from db import lazy_connection, lazy_cursor
+from jobs import schedule_repeating, schedule_daily
+
+logger = logging.getLogger(__name__)
+
+# Persistent OHLC history built from the price feed. Ticks are folded into 1m
+# candles in memory; closed 1m candles are written in one batch per flush and
+# merged into the 15m, 1h and 1d tables in the same transaction. Each interval
+# has its own table, range-partitioned by bucket (migration 7), so retention
+# drops whole partitions instead of deleting rows.
+
+INTERVALS = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}
+PARTITION_PERIOD = {"1m": "day", "15m": "month", "1h": "month", "1d": "year"}
+RETENTION_DAYS = {"1m": 7, "15m": 90, "1h": 730, "1d": None}  # None keeps forever
+SUFFIX_FORMAT = {"day": "%Y%m%d", "month": "%Y%m", "year": "%Y"}
+FLUSH_SECONDS = 60
+
+# Writer and reader use separate connections: flushes run in a worker thread
+conn = lazy_connection("candles")
+c = lazy_cursor("candles")
+read_conn = lazy_connection("candles_read")
+read_c = lazy_cursor("candles_read")
+
+_lock = threading.Lock()
+_open = {}          # {symbol: [bucket, open, high, low, close, ticks]} for the current minute
+_closed = []        # closed 1m candles waiting for the next flush
+_partitions = set() # partitions known to exist
+
+UPSERT = """
+    INSERT INTO {table} (symbol, bucket, open, high, low, close, ticks) VALUES %s
+    ON CONFLICT (symbol, bucket) DO UPDATE SET
+        high = GREATEST({table}.high, EXCLUDED.high),
+        low = LEAST({table}.low, EXCLUDED.low),
+        close = EXCLUDED.close,
+        ticks = {table}.ticks + EXCLUDED.ticks
+"""
+
+def _bucket(ts, seconds):
+    return int(ts) // seconds * seconds
+
+def _utc(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None)
+
+# --- Partitions ---
+def _period_start(dt, period):
+    dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "month":
+        return dt.replace(day=1)
+    if period == "year":
+        return dt.replace(month=1, day=1)
+    return dt
+
+def _period_end(start, period):
+    if period == "month":
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    if period == "year":
+        return start.replace(year=start.year + 1)
+    return start + datetime.timedelta(days=1)
+
+def _partition_name(interval, start):
+    return f"candles_{interval}_p{start.strftime(SUFFIX_FORMAT[PARTITION_PERIOD[interval]])}"
+
+def _ensure_partition(cur, interval, dt):
+    """Create the partition holding dt if needed; returns its name."""
+    period = PARTITION_PERIOD[interval]
+    start = _period_start(dt, period)
+    name = _partition_name(interval, start)
+    if name not in _partitions:
+        end = _period_end(start, period)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF candles_{interval} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"
+        )
+    return name
+
+# --- Producer ---
+def record(prices: dict, ts=None):
+    """Fold {symbol: price} observed at ts (default now) into the open 1m candles."""
+    ts = time.time() if ts is None else ts
+    bucket = _bucket(ts, 60)
+    with _lock:
+        for symbol, price in prices.items():
+            if price is None:
+                continue
+            price = float(price)
+            candle = _open.get(symbol)
+            if candle is not None and candle[0] != bucket:
+                if bucket < candle[0]:
+                    continue  # late tick for a minute we've moved past
+                _closed.append((symbol, *candle))
+                candle = None
+            if candle is None:
+                _open[symbol] = [bucket, price, price, price, price, 1]
+            else:
+                candle[2] = max(candle[2], price)
+                candle[3] = min(candle[3], price)
+                candle[4] = price
+                candle[5] += 1
+
+def _downsample(batch, seconds):
+    """Merge 1m candles into `seconds`-wide candles: [(symbol, bucket, o, h, l, c, ticks)]."""
+    merged = {}
+    for symbol, bucket, o, h, l, cl, ticks in sorted(batch, key=lambda row: (row[0], row[1])):
+        key = (symbol, _bucket(bucket, seconds))
+        row = merged.get(key)
+        if row is None:
+            merged[key] = [o, h, l, cl, ticks]
+        else:
+            row[1] = max(row[1], h)
+            row[2] = min(row[2], l)
+            row[3] = cl
+            row[4] += ticks
+    return [(symbol, _utc(bucket), *values) for (symbol, bucket), values in merged.items()]
+
+def flush(final=False):
+    """Write closed 1m candles and merge them into every coarser interval.
+
+    With final=True the still-open minute is written too (used at shutdown).
+    """
+    now_bucket = _bucket(time.time(), 60)
+    with _lock:
+        for symbol, candle in list(_open.items()):
+            if final or candle[0] < now_bucket:
+                _closed.append((symbol, *candle))
+                del _open[symbol]
+        batch = _closed[:]
+        _closed.clear()
+    if not batch:
+        return 0
+
+    created = set()
+    try:
+        for interval, seconds in INTERVALS.items():
+            rows = _downsample(batch, seconds)
+            for dt in {row[1] for row in rows}:
+                created.add(_ensure_partition(c, interval, dt))
+            execute_values(c, UPSERT.format(table=f"candles_{interval}"), rows, page_size=1000)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        with _lock:
+            _closed[:0] = batch  # keep them for the next flush
+        logger.error(f"Candle flush failed, {len(batch)} candles kept for retry: {e}")
+        return 0
+    _partitions.update(created)
+    return len(batch)
+
+# --- Retention ---
+def apply_retention(now=None):
+    """Drop partitions that lie entirely before each interval's retention window."""
+    now = _utc(time.time() if now is None else now)
+    dropped = []
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as rconn:
+        with rconn.cursor() as cur:
+            for interval, days in RETENTION_DAYS.items():
+                if days is None:
+                    continue
+                period = PARTITION_PERIOD[interval]
+                prefix = f"candles_{interval}_p"
+                cutoff = now - datetime.timedelta(days=days)
+                cur.execute("""
+                    SELECT child.relname FROM pg_inherits
+                    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE parent.relname = %s
+                """, (f"candles_{interval}",))
+                for (name,) in cur.fetchall():
+                    if not name.startswith(prefix):
+                        continue
+                    start = datetime.datetime.strptime(name[len(prefix):], SUFFIX_FORMAT[period])
+                    if _period_end(start, period) <= cutoff:
+                        cur.execute(f"DROP TABLE IF EXISTS {name}")
+                        dropped.append(name)
+    rconn.close()
+    _partitions.difference_update(dropped)
+    if dropped:
+        logger.info(f"🧹 Dropped candle partitions: {', '.join(dropped)}")
+    return dropped
+
+# --- Reads ---
+def get_candles(symbol, interval="1h", start=None, end=None, limit=500):
+    """[(bucket, open, high, low, close, ticks)] oldest first; start/end are epoch seconds.
+
+    At most the `limit` most recent candles of the range. Served by the
+    (symbol, bucket) primary key of the partitions covering the range.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown candle interval: {interval}")
+    end = time.time() if end is None else end
+    start = end - INTERVALS[interval] * limit if start is None else start
+    try:
+        read_c.execute(
+            f"SELECT bucket, open, high, low, close, ticks FROM candles_{interval} "
+            "WHERE symbol = %s AND bucket >= %s AND bucket <= %s ORDER BY bucket DESC LIMIT %s",
+            (symbol, _utc(_bucket(start, INTERVALS[interval])), _utc(end), limit),
+        )
+        return read_c.fetchall()[::-1]
+    finally:
+        # Don't sit idle in a transaction: that would block partition drops
+        read_conn.rollback()
+
+def get_closes(interval, start, end):
+    """[(symbol, bucket_ts, close)] for every symbol with start <= bucket < end, oldest first."""
+    try:
+        read_c.execute(
+            f"SELECT symbol, EXTRACT(EPOCH FROM bucket)::BIGINT, close FROM candles_{interval} "
+            "WHERE bucket >= %s AND bucket < %s ORDER BY bucket",
+            (_utc(start), _utc(end)),
+        )
+        return read_c.fetchall()
+    finally:
+        read_conn.rollback()
+
+# --- Jobs ---
+def candle_flush_job(context):
+    flush()
+
+def candle_retention_job(context):
+    apply_retention()
+
+def register_candle_jobs(application):
+    schedule_repeating(application, "candle_flush", candle_flush_job, interval=FLUSH_SECONDS, first=FLUSH_SECONDS + 5)
+    schedule_daily(application, "candle_retention", candle_retention_job, at=datetime.time(0, 15))
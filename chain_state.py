@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+import os
+import aiohttp
+from solana.rpc.async_api import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+RPC_URL = os.environ.get("RPC_URL") or "https://api.mainnet-beta.solana.com"
+
+BLOCKHASH_REFRESH_INTERVAL = 0.5  # seconds
+MAX_BLOCKHASH_AGE = 5  # older than this and callers fetch their own
+FEE_REFRESH_INTERVAL = 5
+MAX_FEE_AGE = 60
+PRIORITY_FEE_PERCENTILE = 75
+MIN_PRIORITY_FEE = 1_000  # micro-lamports per compute unit
+MAX_PRIORITY_FEE = int(os.environ.get("MAX_PRIORITY_FEE", "1000000"))
+
+# --- In-memory state, refreshed in the background ---
+_blockhash = None  # (Hash, last_valid_block_height, fetched_at)
+_fees = None       # (sorted list of recent prioritization fees, fetched_at)
+_refresher = None  # background task, started by the first trading call
+
+async def _refresh_blockhash(client: AsyncClient):
+    global _blockhash
+    resp = await client.get_latest_blockhash()
+    _blockhash = (resp.value.blockhash, resp.value.last_valid_block_height, time.monotonic())
+
+async def _refresh_fees(session: aiohttp.ClientSession):
+    global _fees
+    payload = {"jsonrpc": "2.0", "id": 1, "method": "getRecentPrioritizationFees", "params": []}
+    async with session.post(RPC_URL, json=payload, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+        data = await resp.json()
+    samples = sorted(entry["prioritizationFee"] for entry in data.get("result") or [])
+    if samples:
+        _fees = (samples, time.monotonic())
+
+def ensure_refresher():
+    """Start the background refresher the first time chain state is needed."""
+    global _refresher
+    if _refresher is not None and not _refresher.done():
+        return
+    try:
+        _refresher = asyncio.get_running_loop().create_task(run_chain_state_refresher())
+    except RuntimeError:
+        pass  # no running loop; callers fall back to direct RPC
+
+async def get_blockhash(client: AsyncClient | None = None):
+    """(blockhash, last_valid_block_height) from memory; falls back to one RPC call if stale."""
+    ensure_refresher()
+    if _blockhash and time.monotonic() - _blockhash[2] < MAX_BLOCKHASH_AGE:
+        return _blockhash[0], _blockhash[1]
+    if client is None:
+        async with AsyncClient(RPC_URL) as own_client:
+            await _refresh_blockhash(own_client)
+    else:
+        await _refresh_blockhash(client)
+    return _blockhash[0], _blockhash[1]
+
+def get_priority_fee(percentile: int = PRIORITY_FEE_PERCENTILE) -> int | None:
+    """Compute-unit price (micro-lamports) at the given percentile of recent fees, or None if unknown."""
+    ensure_refresher()
+    if not _fees or time.monotonic() - _fees[1] > MAX_FEE_AGE:
+        return None
+    samples = _fees[0]
+    index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return max(MIN_PRIORITY_FEE, min(samples[index], MAX_PRIORITY_FEE))
+
+async def run_chain_state_refresher():
+    """Keep the latest blockhash and recent prioritization fees warm."""
+    last_fee_refresh = 0.0
+    async with AsyncClient(RPC_URL) as client, aiohttp.ClientSession() as session:
+        while True:
+            try:
+                await _refresh_blockhash(client)
+            except Exception as e:
+                logger.warning(f"Blockhash refresh failed: {e}")
+            if time.monotonic() - last_fee_refresh >= FEE_REFRESH_INTERVAL:
+                last_fee_refresh = time.monotonic()
+                try:
+                    await _refresh_fees(session)
+                except Exception as e:
+                    logger.warning(f"Prioritization fee refresh failed: {e}")
+            await asyncio.sleep(BLOCKHASH_REFRESH_INTERVAL)
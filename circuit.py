@@ -0,0 +1,134 @@
+import email.utils
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Circuit breakers and negative caching for upstream HTTP APIs, keyed by upstream
+# name ("coingecko", "binance", "dexscreener"), so every module calling the same
+# API shares one view of whether it is up.
+#
+# closed -> open after FAILURE_THRESHOLD consecutive failures, or at once on a
+# 429/Retry-After. While open, callers skip the upstream. When the wait is over
+# one probe is let through (half-open): success closes the breaker, failure
+# reopens it with the backoff doubled. Waits carry jitter so restarts and
+# several workers don't all retry on the same second.
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF_SECONDS = 15
+MAX_BACKOFF_SECONDS = 15 * 60
+JITTER = 0.2  # +/- fraction applied to every wait
+PROBE_TIMEOUT_SECONDS = 60  # a half-open probe that never reported back frees the slot
+
+NEGATIVE_BASE_SECONDS = 60
+NEGATIVE_MAX_SECONDS = 6 * 3600
+
+class UpstreamError(RuntimeError):
+    """Non-2xx answer from an upstream; retry_after in seconds when the server sent one."""
+
+    def __init__(self, upstream, status, retry_after=None):
+        super().__init__(f"{upstream}: HTTP {status}")
+        self.upstream = upstream
+        self.status = status
+        self.retry_after = retry_after
+
+def _jittered(seconds):
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def check_response(upstream, resp):
+    """Raise UpstreamError (with Retry-After) unless resp is a 200."""
+    if resp.status != 200:
+        raise UpstreamError(upstream, resp.status, parse_retry_after(resp.headers.get("Retry-After")))
+
+# --- Breakers: {upstream: {...}} ---
+BREAKERS = {}
+
+def _breaker(upstream):
+    return BREAKERS.setdefault(upstream, {
+        "state": "closed", "failures": 0, "open_until": 0.0, "backoff": BASE_BACKOFF_SECONDS,
+        "opened": 0, "rejected": 0, "last_error": None,
+    })
+
+def allow(upstream):
+    """Whether a request may go out now. Moving to half-open lets exactly one through."""
+    b = _breaker(upstream)
+    if b["state"] == "closed":
+        return True
+    now = time.time()
+    if (b["state"] == "open" and now >= b["open_until"]) or \
+            (b["state"] == "half_open" and now - b["open_until"] >= PROBE_TIMEOUT_SECONDS):
+        b.update(state="half_open", open_until=now)
+        return True
+    b["rejected"] += 1
+    return False
+
+def is_open(upstream):
+    """True while requests must not go out (unlike allow(), never starts a probe)."""
+    b = _breaker(upstream)
+    return b["state"] == "open" and time.time() < b["open_until"]
+
+def retry_in(upstream):
+    """Seconds until the breaker lets a probe through (0 when closed)."""
+    b = _breaker(upstream)
+    return max(0.0, b["open_until"] - time.time()) if b["state"] == "open" else 0.0
+
+def record_success(upstream):
+    b = _breaker(upstream)
+    if b["state"] != "closed":
+        logger.info(f"✅ {upstream} recovered, circuit closed")
+    b.update(state="closed", failures=0, backoff=BASE_BACKOFF_SECONDS)
+
+def record_failure(upstream, error=None, retry_after=None):
+    b = _breaker(upstream)
+    b["failures"] += 1
+    b["last_error"] = str(error) if error else None
+    if retry_after is None and isinstance(error, UpstreamError):
+        retry_after = error.retry_after
+    rate_limited = isinstance(error, UpstreamError) and error.status == 429
+    if not (rate_limited or retry_after is not None or b["state"] == "half_open" or b["failures"] >= FAILURE_THRESHOLD):
+        return
+    wait = retry_after if retry_after is not None else b["backoff"]
+    wait = _jittered(max(wait, BASE_BACKOFF_SECONDS))
+    b.update(state="open", open_until=time.time() + wait, backoff=min(b["backoff"] * 2, MAX_BACKOFF_SECONDS))
+    b["opened"] += 1
+    logger.warning(f"⛔ {upstream} circuit open for {wait:.0f}s ({b['last_error']})")
+
+# --- Negative cache: {(upstream, key): {"until": ts, "failures": n}} ---
+_negative = {}
+
+def is_suppressed(upstream, key):
+    entry = _negative.get((upstream, key))
+    return entry is not None and time.time() < entry["until"]
+
+def mark_failed(upstream, key):
+    """Skip key on this upstream for a while; the wait doubles with each repeat."""
+    entry = _negative.setdefault((upstream, key), {"until": 0.0, "failures": 0})
+    entry["failures"] += 1
+    ttl = min(NEGATIVE_BASE_SECONDS * 2 ** (entry["failures"] - 1), NEGATIVE_MAX_SECONDS)
+    entry["until"] = time.time() + _jittered(ttl)
+
+def mark_ok(upstream, key):
+    _negative.pop((upstream, key), None)
+
+def format_status():
+    lines = ["🔌 *Upstreams*"]
+    for upstream, b in sorted(BREAKERS.items()):
+        state = b["state"] + (f" ({retry_in(upstream):.0f}s left)" if is_open(upstream) else "")
+        lines.append(f"`{upstream}`: {state}, opened {b['opened']}x, skipped {b['rejected']} calls")
+    suppressed = sorted(f"{u}:{k}" for (u, k), e in _negative.items() if time.time() < e["until"])
+    if suppressed:
+        lines.append("Negative-cached: " + ", ".join(suppressed))
+    return "\n".join(lines)
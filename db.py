@@ -0,0 +1,42 @@
+import logging
+import os
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Several modules keep one long-lived connection/cursor at module level. They used to
+# connect at import time; these stand-ins only connect on first use (and reconnect
+# if the connection was closed), so importing a module never touches the database.
+
+_connections = {}
+
+def get_connection(name: str = "default"):
+    conn = _connections.get(name)
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ["DATABASE_URL"])
+        _connections[name] = conn
+    return conn
+
+class _Lazy:
+    def __init__(self, factory):
+        self._factory = factory
+        self._obj = None
+
+    def __getattr__(self, attr):
+        if self._obj is None or self._obj.closed:
+            self._obj = self._factory()
+        return getattr(self._obj, attr)
+
+def lazy_connection(name: str):
+    """Module-level `conn` replacement: connects on first attribute access."""
+    return _Lazy(lambda: get_connection(name))
+
+def lazy_cursor(name: str):
+    """Module-level `c` replacement: a cursor on the named lazy connection."""
+    return _Lazy(lambda: get_connection(name).cursor())
+
+def close_all():
+    for name, conn in list(_connections.items()):
+        if not conn.closed:
+            conn.close()
+    _connections.clear()
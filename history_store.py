@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+import numpy as np
+import circuit
+import tokens
+from http_client import get_session
+from jobs import schedule_daily
+
+logger = logging.getLogger(__name__)
+
+# Long price history for analytics, stored column by column on local disk.
+#
+# Each symbol gets a directory under HISTORY_DIR with one raw little-endian file
+# per column (ts.i8, price.f8, volume.f8). Appends add bytes to the end of every
+# file; readers np.memmap them read-only, so years of history load without
+# parsing rows or copying. Timestamps are epoch seconds and strictly increasing.
+# If a crash interrupts an append, the columns can differ in length; readers use
+# the shortest one and the next append trims the rest.
+
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history"))
+COLUMNS = {"ts": np.dtype("<i8"), "price": np.dtype("<f8"), "volume": np.dtype("<f8")}
+COINGECKO_CHART_URL = "https://api.coingecko.com/api/v3/coins/{id}/market_chart"
+BACKFILL_DAYS = 365  # the free CoinGecko tier serves at most a year
+BACKFILL_PAUSE_SECONDS = 2.5  # between CoinGecko calls, to stay under the free-tier limit
+SECONDS_PER_YEAR = 365 * 86400
+
+def _path(symbol, column):
+    return os.path.join(HISTORY_DIR, symbol, f"{column}.{COLUMNS[column].kind}{COLUMNS[column].itemsize}")
+
+def _length(symbol):
+    """Rows present in every column."""
+    sizes = []
+    for column, dtype in COLUMNS.items():
+        try:
+            sizes.append(os.path.getsize(_path(symbol, column)) // dtype.itemsize)
+        except FileNotFoundError:
+            return 0
+    return min(sizes)
+
+# --- Reads: views into the files, no copies ---
+def load(symbol):
+    """{column: read-only array} for the whole history of symbol (empty arrays if none)."""
+    n = _length(symbol)
+    if n == 0:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+    return {column: np.memmap(_path(symbol, column), dtype=dtype, mode="r", shape=(n,))
+            for column, dtype in COLUMNS.items()}
+
+def window(symbol, start=None, end=None):
+    """load() sliced to start <= ts <= end (epoch seconds) by binary search."""
+    data = load(symbol)
+    ts = data["ts"]
+    lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="right"))
+    return {column: values[lo:hi] for column, values in data.items()}
+
+def last_ts(symbol):
+    n = _length(symbol)
+    if n == 0:
+        return None
+    return int(np.memmap(_path(symbol, "ts"), dtype=COLUMNS["ts"], mode="r", shape=(n,))[-1])
+
+# --- Append ---
+def append(symbol, ts, price, volume=None):
+    """Append rows; anything not newer than the stored history is dropped. Returns rows written."""
+    ts = np.atleast_1d(np.asarray(ts, dtype=COLUMNS["ts"]))
+    price = np.atleast_1d(np.asarray(price, dtype=COLUMNS["price"]))
+    volume = np.full(len(ts), np.nan) if volume is None else np.atleast_1d(np.asarray(volume, dtype=COLUMNS["volume"]))
+    if not (len(ts) == len(price) == len(volume)):
+        raise ValueError("ts, price and volume must have the same length")
+
+    order = np.argsort(ts, kind="stable")
+    ts, price, volume = ts[order], price[order], volume[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[1:] = ts[1:] > ts[:-1]  # drop duplicate timestamps
+    previous = last_ts(symbol)
+    if previous is not None:
+        keep &= ts > previous
+    if not keep.any():
+        return 0
+
+    os.makedirs(os.path.join(HISTORY_DIR, symbol), exist_ok=True)
+    n = _length(symbol)
+    for column, values in (("ts", ts), ("price", price), ("volume", volume)):
+        path = _path(symbol, column)
+        with open(path, "ab") as f:
+            f.truncate(n * COLUMNS[column].itemsize)  # drop a torn tail from an interrupted append
+            f.write(values[keep].astype(COLUMNS[column], copy=False).tobytes())
+    return int(keep.sum())
+
+# --- Analytics ---
+def resample(symbol, step, start, end):
+    """Last known price at each grid point start, start+step, ... <= end (NaN before history)."""
+    grid = np.arange(int(start), int(end) + 1, int(step), dtype=COLUMNS["ts"])
+    data = load(symbol)
+    idx = np.searchsorted(data["ts"], grid, side="right") - 1
+    result = np.full(len(grid), np.nan)
+    has = idx >= 0
+    result[has] = data["price"][idx[has]]
+    return grid, result
+
+def log_returns(symbol, step, start, end):
+    _, prices = resample(symbol, step, start, end)
+    return np.diff(np.log(prices))
+
+def volatility(symbol, days=30, step=86400, end=None):
+    """Annualized standard deviation of step-sized log returns over the last `days`."""
+    end = last_ts(symbol) if end is None else end
+    if end is None:
+        return None
+    returns = log_returns(symbol, step, end - days * 86400, end)
+    returns = returns[~np.isnan(returns)]
+    if len(returns) < 2:
+        return None
+    return float(np.std(returns, ddof=1) * np.sqrt(SECONDS_PER_YEAR / step))
+
+def correlation(symbols, days=90, step=86400, end=None):
+    """Correlation matrix of log returns for symbols over a shared grid (rows/cols follow symbols)."""
+    if end is None:
+        end = max((last_ts(symbol) or 0) for symbol in symbols)
+    returns = np.vstack([log_returns(symbol, step, end - days * 86400, end) for symbol in symbols])
+    complete = ~np.isnan(returns).any(axis=0)
+    if complete.sum() < 2:
+        return None
+    return np.corrcoef(returns[:, complete])
+
+# --- Backfill from CoinGecko ---
+async def backfill(symbol, days=BACKFILL_DAYS):
+    """Append CoinGecko market_chart history for symbol; returns rows written."""
+    if not circuit.allow("coingecko"):
+        return 0
+    url = COINGECKO_CHART_URL.format(id=tokens.coingecko_id(symbol))
+    params = {"vs_currency": "usd", "days": str(days)}
+    try:
+        async with get_session().get(url, params=params) as resp:
+            circuit.check_response("coingecko", resp)
+            data = await resp.json()
+    except Exception as e:
+        circuit.record_failure("coingecko", e)
+        logger.warning(f"❌ market_chart for {symbol}: {e}")
+        return 0
+    circuit.record_success("coingecko")
+
+    prices = np.asarray(data.get("prices") or [], dtype=float).reshape(-1, 2)
+    if len(prices) == 0:
+        return 0
+    volumes = dict((int(ms), vol) for ms, vol in data.get("total_volumes") or [])
+    ts_ms = prices[:, 0].astype(np.int64)
+    volume = [volumes.get(int(ms), np.nan) for ms in ts_ms]
+    return await asyncio.to_thread(append, symbol, ts_ms // 1000, prices[:, 1], volume)
+
+async def _pace():
+    # Shares the price feed's CoinGecko breaker: while it is open, wait it out
+    await asyncio.sleep(max(BACKFILL_PAUSE_SECONDS, circuit.retry_in("coingecko")))
+
+async def backfill_all(days=BACKFILL_DAYS, symbols=None):
+    written = {}
+    for symbol in symbols or tokens.symbols():
+        try:
+            written[symbol] = await backfill(symbol, days)
+        except Exception as e:
+            logger.warning(f"❌ History backfill failed for {symbol}: {e}")
+        await _pace()
+    logger.info(f"📚 History backfill wrote {sum(written.values())} rows for {len(written)} symbols")
+    return written
+
+async def history_sync_job(context):
+    # Top up each symbol with what it's missing; days <= 90 returns hourly points
+    now = time.time()
+    for symbol in tokens.symbols():
+        previous = last_ts(symbol)
+        days = BACKFILL_DAYS if previous is None else max(1, min(90, int((now - previous) // 86400) + 1))
+        try:
+            await backfill(symbol, days)
+        except Exception as e:
+            logger.warning(f"❌ History sync failed for {symbol}: {e}")
+        await _pace()
+
+def register_history_jobs(application):
+    schedule_daily(application, "history_sync", history_sync_job, at=datetime.time(1, 0))
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    from http_client import close_session
+
+    async def main(days):
+        try:
+            await backfill_all(days)
+        finally:
+            await close_session()
+
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else BACKFILL_DAYS))
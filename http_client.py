@@ -0,0 +1,23 @@
+import aiohttp
+
+# One aiohttp session for the whole process: connection pooling and keep-alive
+# across jobs instead of a new TCP/TLS handshake per request.
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+_session = None
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared session; must be called from inside the running event loop."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=DEFAULT_TIMEOUT,
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=20, ttl_dns_cache=300),
+        )
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
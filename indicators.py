@@ -0,0 +1,278 @@
+import logging
+import time
+import numpy as np
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from db import lazy_connection, lazy_cursor
+import timeseries
+from timeseries import SYMBOL_LIST, SYMBOL_INDEX
+from notify import send_bulk
+from jobs import schedule_repeating
+from limits import can_send_message, increment_message_count, can_add_alert
+
+logger = logging.getLogger(__name__)
+
+# Technical-indicator alerts on BAR_SECONDS bars for every symbol in SYMBOL_LIST.
+#
+# Indicator state is one vector per quantity, shared by every subscriber, and a
+# closed bar advances all symbols at once with O(1) work each: RSI uses Wilder
+# smoothing, MA crosses use EMAs, and breakouts compare the bar's log return to
+# an exponentially weighted volatility. Nothing is recomputed over a window.
+# On startup the state is warmed from the 15m candles table.
+
+BAR_SECONDS = 15 * 60
+RSI_PERIOD = 14
+EMA_FAST, EMA_SLOW = 20, 50
+VOL_LAMBDA = 0.94       # decay of the squared-return average (RiskMetrics)
+VOL_WARMUP = 20         # bars before breakouts are trusted
+BREAKOUT_SIGMAS = 3.0
+SEED_BARS = 3 * EMA_SLOW
+MAX_CATCH_UP_BARS = 4   # bars replayed when the job was late; older closes are gone anyway
+KINDS = ("rsi", "cross", "breakout")
+
+conn = lazy_connection("indicators")
+c = lazy_cursor("indicators")
+
+# --- Shared state: one entry per symbol in SYMBOL_LIST (grows with it) ---
+_n = len(SYMBOL_LIST)
+_FILL = {"returns": 0, "close": np.nan, "avg_gain": 0.0, "avg_loss": 0.0, "rsi": np.nan,
+         "ema_fast": np.nan, "ema_slow": np.nan, "var": 0.0}
+_state = {
+    "returns": np.zeros(_n, dtype=np.int64),  # bar-to-bar changes seen
+    "close": np.full(_n, np.nan),
+    "avg_gain": np.zeros(_n),
+    "avg_loss": np.zeros(_n),
+    "rsi": np.full(_n, np.nan),
+    "ema_fast": np.full(_n, np.nan),
+    "ema_slow": np.full(_n, np.nan),
+    "var": np.zeros(_n),                       # EWMA of squared log returns
+}
+_last_bar = None
+
+def _fit(n):
+    """Pad the state for symbols timeseries picked up from a registry reload."""
+    for key, fill in _FILL.items():
+        _state[key] = timeseries.pad_symbols(_state[key], n, fill)
+
+def update(close):
+    """Advance every indicator by one closed bar.
+
+    close: vector over SYMBOL_LIST, NaN where a symbol has no bar. Returns the
+    signals of this bar: previous/current RSI, MA cross (+1 golden, -1 death)
+    and breakout (+1 up, -1 down), all vectors over SYMBOL_LIST.
+    """
+    _fit(len(close))
+    s = _state
+    has = ~np.isnan(close)
+    first = has & np.isnan(s["close"])
+    step = has & ~first
+    n = s["returns"] + step
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(step, close - s["close"], 0.0)
+        ret = np.where(step, np.log(close / s["close"]), 0.0)
+
+    # RSI: plain mean over the first RSI_PERIOD changes, then Wilder smoothing
+    weight = np.where(step, 1.0 / np.clip(n, 1, RSI_PERIOD), 0.0)
+    s["avg_gain"] += weight * (np.maximum(delta, 0.0) - s["avg_gain"])
+    s["avg_loss"] += weight * (np.maximum(-delta, 0.0) - s["avg_loss"])
+    prev_rsi = s["rsi"].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(s["avg_loss"] > 0, 100.0 - 100.0 / (1.0 + s["avg_gain"] / s["avg_loss"]),
+                       np.where(s["avg_gain"] > 0, 100.0, 50.0))  # a flat series is neutral, not overbought
+    ready = step & (n >= RSI_PERIOD)
+    s["rsi"] = np.where(ready, rsi, s["rsi"])
+
+    # EMAs, seeded with the running mean until enough bars exist
+    prev_diff = s["ema_fast"] - s["ema_slow"]
+    for key, period in (("ema_fast", EMA_FAST), ("ema_slow", EMA_SLOW)):
+        alpha = np.maximum(2.0 / (period + 1), 1.0 / (n + 1))
+        s[key] = np.where(first, close, np.where(step, s[key] + alpha * (close - s[key]), s[key]))
+    diff = s["ema_fast"] - s["ema_slow"]
+    crossed = step & (n >= EMA_SLOW)
+    cross = np.where(crossed & (prev_diff <= 0) & (diff > 0), 1, np.where(crossed & (prev_diff >= 0) & (diff < 0), -1, 0))
+
+    # Breakout against the volatility known before this bar, then fold the bar in
+    sigma = np.sqrt(s["var"])
+    breakout = step & (n > VOL_WARMUP) & (sigma > 0) & (np.abs(ret) > BREAKOUT_SIGMAS * sigma)
+    breakout = np.where(breakout, np.sign(ret), 0).astype(np.int64)
+    var_weight = np.where(n <= VOL_WARMUP, 1.0 / np.maximum(n, 1), 1.0 - VOL_LAMBDA)
+    s["var"] = np.where(step, s["var"] + var_weight * (ret * ret - s["var"]), s["var"])
+
+    s["close"] = np.where(has, close, s["close"])
+    s["returns"] = n
+    return {"prev_rsi": prev_rsi, "rsi": s["rsi"].copy(), "cross": cross, "breakout": breakout, "ret": ret}
+
+# --- Matching subscriptions ---
+def _rsi_crossed(prev, current, threshold):
+    if np.isnan(prev) or np.isnan(current):
+        return False
+    if threshold >= 50:
+        return prev < threshold <= current
+    return prev > threshold >= current
+
+def match(signals, subscriptions, prices):
+    """{user_id: [line, ...]} for the subscriptions that fired on this bar."""
+    hits = {}
+    for user_id, symbol, kind, threshold in subscriptions:
+        i = SYMBOL_INDEX.get(symbol)
+        if i is None or i >= len(signals["rsi"]):
+            continue
+        line = None
+        if kind == "rsi" and _rsi_crossed(signals["prev_rsi"][i], signals["rsi"][i], threshold):
+            side = "above" if threshold >= 50 else "below"
+            line = f"📈 *{symbol.upper()}* RSI({RSI_PERIOD}) crossed {side} {threshold:g}: {signals['rsi'][i]:.1f}"
+        elif kind == "cross" and signals["cross"][i]:
+            name = "Golden cross" if signals["cross"][i] > 0 else "Death cross"
+            line = f"✂️ *{symbol.upper()}* {name}: EMA{EMA_FAST} crossed {'above' if signals['cross'][i] > 0 else 'below'} EMA{EMA_SLOW}"
+        elif kind == "breakout" and signals["breakout"][i]:
+            move = (np.exp(signals["ret"][i]) - 1) * 100
+            line = f"💥 *{symbol.upper()}* volatility breakout: {move:+.2f}% in {BAR_SECONDS // 60}m (>{BREAKOUT_SIGMAS:g}σ)"
+        if line:
+            price = prices[i]
+            if not np.isnan(price):
+                line += f"\nCurrent Price: ${price:g}"
+            hits.setdefault(user_id, []).append(line)
+    return hits
+
+def get_subscriptions():
+    c.execute("SELECT user_id, symbol, kind, threshold FROM indicator_alerts")
+    rows = c.fetchall()
+    conn.commit()
+    return rows
+
+# --- Warm start from stored candles ---
+def seed(until):
+    """Replay the 15m candle closes before `until` so indicators are ready right away."""
+    import candles
+    rows = candles.get_closes("15m", until - SEED_BARS * BAR_SECONDS, until)
+    by_bar = {}
+    for symbol, bucket, close in rows:
+        i = SYMBOL_INDEX.get(symbol)
+        if i is not None:
+            by_bar.setdefault(bucket, np.full(len(SYMBOL_LIST), np.nan))[i] = close
+    for bucket in sorted(by_bar):
+        update(by_bar[bucket])
+    logger.info(f"Indicators seeded from {len(by_bar)} candles per symbol")
+
+# --- Job ---
+async def indicator_job(context: ContextTypes.DEFAULT_TYPE):
+    global _last_bar
+    now = time.time()
+    bar = int(now) // BAR_SECONDS * BAR_SECONDS  # start of the bar in progress
+    if _last_bar is None:
+        try:
+            seed(bar)
+        except Exception as e:
+            logger.warning(f"Indicator seeding failed, warming up from live bars: {e}")
+        _last_bar = bar
+        return
+    if bar == _last_bar:
+        return
+
+    replayed = [update(timeseries.prices_at(start + BAR_SECONDS - 1, now))
+                for start in range(max(_last_bar, bar - MAX_CATCH_UP_BARS * BAR_SECONDS), bar, BAR_SECONDS)]
+    _last_bar = bar
+
+    subscriptions = get_subscriptions()
+    if not subscriptions:
+        return
+    # Every replayed bar is matched, so a late job still reports crosses from earlier bars
+    prices = timeseries.latest_prices()
+    hits = {}
+    for signals in replayed:
+        for user_id, lines in match(signals, subscriptions, prices).items():
+            hits.setdefault(user_id, []).extend(lines)
+    if hits:
+        await send_bulk(context.bot, [(user_id, "\n\n".join(lines)) for user_id, lines in hits.items()],
+                        parse_mode="Markdown")
+
+# --- Command ---
+USAGE = (
+    "Usage:\n"
+    "/indicator <symbol> rsi <level> - RSI crosses a level (e.g. 70 or 30)\n"
+    "/indicator <symbol> cross - EMA20/EMA50 golden and death crosses\n"
+    "/indicator <symbol> breakout - moves over 3σ of recent volatility\n"
+    "/indicator <symbol> - current indicator values\n"
+    "/indicator remove <id>\n"
+    "/indicator - list your indicator alerts"
+)
+
+def _describe(symbol):
+    i = SYMBOL_INDEX[symbol]
+    s = _state
+    bars = s["returns"][i] if i < len(s["returns"]) else 0
+    if bars < RSI_PERIOD:
+        return f"{symbol.upper()}: warming up ({bars} of {RSI_PERIOD} bars)."
+    vol = np.sqrt(s["var"][i] * 365 * 86400 / BAR_SECONDS) * 100
+    return (
+        f"{symbol.upper()} ({BAR_SECONDS // 60}m bars)\n"
+        f"RSI({RSI_PERIOD}): {s['rsi'][i]:.1f}\n"
+        f"EMA{EMA_FAST}: {s['ema_fast'][i]:g}\nEMA{EMA_SLOW}: {s['ema_slow'][i]:g}\n"
+        f"Volatility (annualized): {vol:.0f}%"
+    )
+
+async def indicator_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not can_send_message(user_id):
+        await update.message.reply_text("❌ Monthly message limit reached. Upgrade to Plus or Pro to continue.")
+        return
+    increment_message_count(user_id)
+    args = [arg.lower() for arg in context.args]
+
+    if not args:
+        c.execute("SELECT id, symbol, kind, threshold FROM indicator_alerts WHERE user_id = %s ORDER BY id", (user_id,))
+        rows = c.fetchall()
+        conn.commit()
+        if not rows:
+            await update.message.reply_text("You have no indicator alerts.\n\n" + USAGE)
+            return
+        msg = "Your indicator alerts:\n"
+        for alert_id, symbol, kind, threshold in rows:
+            msg += f"#{alert_id} {symbol.upper()} {kind}" + (f" {threshold:g}" if threshold is not None else "") + "\n"
+        await update.message.reply_text(msg)
+        return
+
+    if args[0] == "remove":
+        if len(args) != 2 or not args[1].lstrip("#").isdigit():
+            await update.message.reply_text("Usage: /indicator remove <id>")
+            return
+        c.execute("DELETE FROM indicator_alerts WHERE id = %s AND user_id = %s", (int(args[1].lstrip("#")), user_id))
+        removed = c.rowcount
+        conn.commit()
+        await update.message.reply_text("Indicator alert removed." if removed else "No such indicator alert.")
+        return
+
+    symbol = args[0]
+    if symbol not in SYMBOL_INDEX:
+        await update.message.reply_text("Invalid symbol. Try btc, eth, etc.")
+        return
+    if len(args) == 1:
+        await update.message.reply_text(_describe(symbol))
+        return
+
+    kind, threshold = args[1], None
+    if kind not in KINDS:
+        await update.message.reply_text(USAGE)
+        return
+    if kind == "rsi":
+        try:
+            threshold = float(args[2])
+        except (IndexError, ValueError):
+            await update.message.reply_text("Usage: /indicator <symbol> rsi <level>")
+            return
+        if not 0 < threshold < 100:
+            await update.message.reply_text("RSI level must be between 0 and 100.")
+            return
+    if not can_add_alert(user_id):
+        await update.message.reply_text("⚠️ Alert limit reached. Upgrade your package for more alerts.")
+        return
+
+    c.execute("INSERT INTO indicator_alerts (user_id, symbol, kind, threshold) VALUES (%s, %s, %s, %s)",
+              (user_id, symbol, kind, threshold))
+    conn.commit()
+    await update.message.reply_text(f"Indicator alert added: {symbol.upper()} {kind}" + (f" {threshold:g}" if threshold is not None else "") + ".")
+
+def register_indicator_handlers(application):
+    application.add_handler(CommandHandler("indicator", indicator_command))
+    schedule_repeating(application, "indicators", indicator_job, interval=60, first=20)
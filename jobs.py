@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Every periodic job runs as a coroutine on the bot's own event loop through the
+# PTB JobQueue. Jobs are wrapped so a slow run is never overlapped by the next
+# tick, blocking work goes to a thread, and each run is timed.
+
+# --- Per-job metrics: {name: {...}} ---
+JOB_STATS = {}
+
+def _stats(name):
+    return JOB_STATS.setdefault(name, {
+        "runs": 0, "failures": 0, "skipped": 0, "running": False,
+        "last_started": None, "last_duration": None, "max_duration": 0.0, "total_duration": 0.0,
+        "last_error": None,
+    })
+
+def _wrap(name, callback):
+    stats = _stats(name)
+
+    async def run(context: ContextTypes.DEFAULT_TYPE):
+        if stats["running"]:
+            stats["skipped"] += 1
+            logger.warning(f"Job {name} still running, skipping this tick")
+            return
+        stats["running"] = True
+        stats["last_started"] = time.time()
+        started = time.monotonic()
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                await callback(context)
+            else:
+                await asyncio.to_thread(callback, context)
+        except Exception as e:
+            stats["failures"] += 1
+            stats["last_error"] = str(e)
+            logger.error(f"Job {name} failed: {e}", exc_info=True)
+        finally:
+            duration = time.monotonic() - started
+            stats["running"] = False
+            stats["runs"] += 1
+            stats["last_duration"] = duration
+            stats["max_duration"] = max(stats["max_duration"], duration)
+            stats["total_duration"] += duration
+
+    return run
+
+def schedule_repeating(application, name, callback, interval, first=None, jitter=0):
+    """Run callback(context) every interval seconds; jitter spreads ticks by up to that many seconds."""
+    job_kwargs = {"jitter": jitter} if jitter else {}
+    return application.job_queue.run_repeating(_wrap(name, callback), interval=interval, first=first,
+                                               name=name, job_kwargs=job_kwargs)
+
+def schedule_daily(application, name, callback, at, days=tuple(range(7)), jitter=0):
+    """Run callback(context) at the given datetime.time; days use 0 = Sunday."""
+    job_kwargs = {"jitter": jitter} if jitter else {}
+    return application.job_queue.run_daily(_wrap(name, callback), time=at, days=days,
+                                           name=name, job_kwargs=job_kwargs)
+
+def format_job_stats():
+    if not JOB_STATS:
+        return "No jobs registered."
+    lines = ["🕒 *Jobs*"]
+    for name, s in sorted(JOB_STATS.items()):
+        avg = s["total_duration"] / s["runs"] if s["runs"] else 0.0
+        last = f"{s['last_duration']:.2f}s" if s["last_duration"] is not None else "-"
+        state = " (running)" if s["running"] else ""
+        lines.append(
+            f"`{name}`{state}: {s['runs']} runs, {s['failures']} failed, {s['skipped']} skipped, "
+            f"last {last}, avg {avg:.2f}s, max {s['max_duration']:.2f}s"
+        )
+    return "\n".join(lines)
+
+def make_jobs_command(admin_id):
+    async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id != admin_id:
+            await update.message.reply_text("❌ You are not authorized to use this command.")
+            return
+        await update.message.reply_text(format_job_stats(), parse_mode="Markdown")
+    return jobs_command
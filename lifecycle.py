@@ -0,0 +1,138 @@
+import asyncio
+import importlib.machinery
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Startup/shutdown hooks replace work modules used to do at import time, and the
+# import profiler records how long each module takes to load so cold start can be
+# kept under STARTUP_BUDGET_SECONDS. Import this module before anything else.
+
+PROCESS_START = time.perf_counter()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "5"))
+
+# --- Import profile: {module: [inclusive_seconds, self_seconds]} ---
+IMPORT_TIMES = {}
+_import_stack = []
+
+# --- Hook profile: {name: seconds} ---
+HOOK_TIMES = {}
+_startup_hooks = []
+_shutdown_hooks = []
+_ready_at = None
+
+class _ImportProfiler:
+    """Meta path finder that times exec_module of everything PathFinder would load."""
+
+    def find_spec(self, fullname, path=None, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is None or spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return None
+        exec_module = spec.loader.exec_module
+
+        def timed_exec_module(module):
+            started = time.perf_counter()
+            _import_stack.append(0.0)
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - started
+                children = _import_stack.pop()
+                IMPORT_TIMES[fullname] = [elapsed, elapsed - children]
+                if _import_stack:
+                    _import_stack[-1] += elapsed
+
+        spec.loader.exec_module = timed_exec_module
+        return spec
+
+def install_import_profiler():
+    if any(isinstance(finder, _ImportProfiler) for finder in sys.meta_path):
+        return
+    # Right before PathFinder, so finders that normally win still do
+    index = next((i for i, f in enumerate(sys.meta_path) if f is importlib.machinery.PathFinder), len(sys.meta_path))
+    sys.meta_path.insert(index, _ImportProfiler())
+
+# --- Hooks ---
+def add_startup_hook(name, fn):
+    """fn(app) runs once in post_init, in registration order; may be async."""
+    _startup_hooks.append((name, fn))
+
+def add_shutdown_hook(name, fn):
+    """fn(app) runs in post_shutdown, in reverse registration order; may be async."""
+    _shutdown_hooks.append((name, fn))
+
+async def _run_hook(name, fn, app):
+    started = time.perf_counter()
+    try:
+        result = fn(app)
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        logger.error(f"Lifecycle hook {name} failed: {e}", exc_info=True)
+    finally:
+        HOOK_TIMES[name] = time.perf_counter() - started
+
+async def run_startup(app):
+    global _ready_at
+    for name, fn in _startup_hooks:
+        await _run_hook(name, fn, app)
+    _ready_at = time.perf_counter()
+    total = _ready_at - PROCESS_START
+    if total > STARTUP_BUDGET_SECONDS:
+        logger.warning(f"⚠️ Startup took {total:.2f}s, over the {STARTUP_BUDGET_SECONDS:.1f}s budget")
+    else:
+        logger.info(f"Startup took {total:.2f}s (budget {STARTUP_BUDGET_SECONDS:.1f}s)")
+
+async def run_shutdown(app):
+    for name, fn in reversed(_shutdown_hooks):
+        await _run_hook(name, fn, app)
+
+# --- Report ---
+def _is_project_module(name):
+    module = sys.modules.get(name)
+    origin = getattr(module, "__file__", None) or ""
+    return os.path.dirname(os.path.abspath(origin)) == PROJECT_DIR if origin else False
+
+def startup_report(limit=10):
+    project = sorted(((name, times) for name, times in IMPORT_TIMES.items() if _is_project_module(name)),
+                     key=lambda item: item[1][1], reverse=True)
+    packages = {}
+    for name, (_, self_time) in IMPORT_TIMES.items():
+        if not _is_project_module(name):
+            top = name.split(".")[0]
+            packages[top] = packages.get(top, 0.0) + self_time
+
+    imports_total = sum(self_time for _, self_time in IMPORT_TIMES.values())
+    ready = (_ready_at - PROCESS_START) if _ready_at else None
+    lines = ["🚀 *Startup profile*"]
+    lines.append(f"Ready: {ready:.2f}s" if ready is not None else "Ready: not yet")
+    lines.append(f"Budget: {STARTUP_BUDGET_SECONDS:.1f}s" + (" ⚠️ over" if ready and ready > STARTUP_BUDGET_SECONDS else ""))
+    lines.append(f"Imports: {imports_total:.2f}s")
+    lines.append("\n*Project modules (self / total)*")
+    for name, (total, self_time) in project[:limit]:
+        lines.append(f"`{name}`: {self_time:.3f}s / {total:.3f}s")
+    lines.append("\n*Libraries*")
+    for name, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]:
+        lines.append(f"`{name}`: {seconds:.3f}s")
+    if HOOK_TIMES:
+        lines.append("\n*Startup hooks*")
+        for name, seconds in HOOK_TIMES.items():
+            lines.append(f"`{name}`: {seconds:.3f}s")
+    return "\n".join(lines)
+
+def is_over_budget():
+    elapsed = (_ready_at or time.perf_counter()) - PROCESS_START
+    return elapsed > STARTUP_BUDGET_SECONDS
+
+if __name__ == "__main__":
+    # Cold-import check for deploys: `python lifecycle.py` exits non-zero when
+    # importing bot.py alone already blows the startup budget.
+    import lifecycle  # the instance bot.py imports, not this __main__ copy
+    lifecycle.install_import_profiler()
+    import bot  # noqa: F401
+    print(lifecycle.startup_report(limit=20).replace("*", "").replace("`", ""))
+    sys.exit(1 if lifecycle.is_over_budget() else 0)
@@ -79,12 +79,16 @@ def get_alert_limit(package: str) -> int:
     }
     return limits.get(package, 1)
 
-# --- Get current alert count from alerts table
+# --- Get current alert count: price alerts plus indicator alerts
 def get_user_alert_count(user_id: int) -> int:
     try:
         with psycopg2.connect(DATABASE_URL) as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM alerts WHERE user_id = %s", (user_id,))
+                cur.execute(
+                    "SELECT (SELECT COUNT(*) FROM alerts WHERE user_id = %s) "
+                    "+ (SELECT COUNT(*) FROM indicator_alerts WHERE user_id = %s)",
+                    (user_id, user_id)
+                )
                 row = cur.fetchone()
                 return row[0] if row else 0
     except psycopg2.Error as e:
@@ -97,19 +101,21 @@ def can_add_alert(user_id: int) -> bool:
     current_alerts = get_user_alert_count(user_id)
     return current_alerts < get_alert_limit(package)
 
+# --- Which packages may use a service
+ACCESS_RULES = {
+    "buy_sell": ["plus", "pro"],
+    "auto_snipe": ["pro"],
+    "airdrop": ["pro"],
+    "news": ["pro"]
+}
+
+def allowed_packages(service: str) -> list:
+    return ACCESS_RULES.get(service, ["free", "plus", "pro"])
+
 # --- Check if user has permission to access a given service
 def check_access(user_id: int, service: str) -> bool:
     package = get_user_package(user_id)
-
-    access_rules = {
-        "buy_sell": ["plus", "pro"],
-        "auto_snipe": ["pro"],
-        "airdrop": ["pro"],
-        "news": ["pro"]
-    }
-
-    allowed_packages = access_rules.get(service, ["free", "plus", "pro"])
-    return package in allowed_packages
+    return package in allowed_packages(service)
 
 # --- Optional: Reset message counters monthly (run this once a month)
 def reset_message_counters():
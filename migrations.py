@@ -0,0 +1,287 @@
+import logging
+import os
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# The one place that owns the database schema. Each migration runs exactly once,
+# in order, inside its own transaction, and is recorded in schema_migrations.
+# Modules no longer create or alter tables at import time.
+#
+# The baseline is written with IF NOT EXISTS so it applies cleanly both to a
+# fresh database and to deployments whose tables were created by the old
+# per-module DDL. Add new changes as new entries at the end; never edit one
+# that has shipped.
+
+MIGRATION_LOCK_ID = 7_314_001  # pg_advisory_lock key, so concurrent starts don't race
+
+BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        region TEXT,
+        package TEXT DEFAULT 'free',
+        price REAL,
+        start_date TEXT,
+        duration TEXT,
+        wallet_address TEXT,
+        last_airdrop_sent TIMESTAMP,
+        messages_sent INTEGER DEFAULT 0,
+        messages INTEGER DEFAULT 0,
+        referrer_id BIGINT,
+        auto_news INTEGER DEFAULT 1,
+        paid INTEGER DEFAULT 0,
+        expires_at TIMESTAMP
+    )
+    """,
+    # Older deployments created users with only some of these columns
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS region TEXT",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS package TEXT DEFAULT 'free'",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS price REAL",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS start_date TEXT",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS duration TEXT",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS wallet_address TEXT",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS messages_sent INTEGER DEFAULT 0",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS messages INTEGER DEFAULT 0",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS referrer_id BIGINT",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS auto_news INTEGER DEFAULT 1",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS paid INTEGER DEFAULT 0",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP",
+    "ALTER TABLE users ALTER COLUMN package SET DEFAULT 'free'",
+    "CREATE TABLE IF NOT EXISTS alerts (user_id BIGINT, symbol TEXT, threshold REAL)",
+    "CREATE TABLE IF NOT EXISTS referrals (referrer_id BIGINT, referred_id BIGINT PRIMARY KEY)",
+    """
+    CREATE TABLE IF NOT EXISTS referral_data (
+        user_id BIGINT PRIMARY KEY,
+        messages_remaining INTEGER DEFAULT 0,
+        expiry TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS referral_tracking (
+        referee_id BIGINT PRIMARY KEY,
+        referrer_id BIGINT,
+        timestamp TIMESTAMP
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS swap_users (user_id BIGINT PRIMARY KEY, encrypted_privkey BYTEA, wallet_address TEXT)",
+    "CREATE TABLE IF NOT EXISTS price_cache (symbol TEXT PRIMARY KEY, price REAL, timestamp BIGINT)",
+    "CREATE TABLE IF NOT EXISTS token_prices (symbol TEXT PRIMARY KEY, price REAL, last_updated TEXT)",
+    # News
+    "CREATE TABLE IF NOT EXISTS sent_news (tweet_id TEXT PRIMARY KEY, tweet TEXT, date_sent TEXT)",
+    "ALTER TABLE sent_news ADD COLUMN IF NOT EXISTS source TEXT",
+    "ALTER TABLE sent_news ADD COLUMN IF NOT EXISTS symbols TEXT",
+    "ALTER TABLE sent_news ADD COLUMN IF NOT EXISTS content_hash TEXT",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_sent_news_hash ON sent_news (content_hash)",
+    "CREATE TABLE IF NOT EXISTS last_tweet (id INTEGER PRIMARY KEY, tweet_id TEXT)",
+    "CREATE TABLE IF NOT EXISTS news_cursors (source TEXT PRIMARY KEY, cursor TEXT)",
+    # Airdrops
+    """
+    CREATE TABLE IF NOT EXISTS airdrops (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        network TEXT,
+        category TEXT,
+        description TEXT,
+        url TEXT
+    )
+    """,
+    "ALTER TABLE airdrops ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "ALTER TABLE airdrops ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "ALTER TABLE airdrops ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "ALTER TABLE airdrops ADD COLUMN IF NOT EXISTS content_hash TEXT",
+    "CREATE INDEX IF NOT EXISTS idx_airdrops_created_at ON airdrops (created_at)",
+    # Payments and orders
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        signature TEXT PRIMARY KEY,
+        sender TEXT NOT NULL,
+        receiver TEXT NOT NULL,
+        mint TEXT NOT NULL,
+        amount NUMERIC NOT NULL,
+        block_time BIGINT NOT NULL,
+        claimed_by BIGINT,
+        claimed_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_payments_sender ON payments (sender, block_time)",
+    "CREATE TABLE IF NOT EXISTS payment_index_cursor (id INTEGER PRIMARY KEY, last_signature TEXT)",
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        package TEXT NOT NULL,
+        duration TEXT NOT NULL,
+        price NUMERIC NOT NULL,
+        wallet_address TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        payment_signature TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_orders_pending ON orders (wallet_address) WHERE status = 'pending'",
+    # Withdrawals
+    """
+    CREATE TABLE IF NOT EXISTS withdrawals (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        source_address TEXT NOT NULL,
+        dest_address TEXT NOT NULL,
+        lamports BIGINT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        signature TEXT,
+        last_valid_block_height BIGINT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_withdrawals_in_flight ON withdrawals (status) WHERE status IN ('queued', 'sent')",
+]
+
+def _column_type(c, table, column):
+    c.execute("SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s", (table, column))
+    row = c.fetchone()
+    return row[0] if row else None
+
+def _bigint_ids(c):
+    # Telegram ids no longer fit in INTEGER; several tables were created that way
+    for table, column in [
+        ("users", "user_id"), ("users", "referrer_id"), ("alerts", "user_id"),
+        ("referrals", "referrer_id"), ("referrals", "referred_id"), ("swap_users", "user_id"),
+        ("price_cache", "timestamp"),
+    ]:
+        if _column_type(c, table, column) == "integer":
+            c.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT")
+
+def _airdrop_sent_timestamp(c):
+    if _column_type(c, "users", "last_airdrop_sent") is None:
+        c.execute("ALTER TABLE users ADD COLUMN last_airdrop_sent TIMESTAMP")
+    elif _column_type(c, "users", "last_airdrop_sent") == "text":
+        c.execute("""
+            ALTER TABLE users ALTER COLUMN last_airdrop_sent TYPE TIMESTAMP
+            USING NULLIF(last_airdrop_sent, '')::timestamp
+        """)
+
+# The single-account cursor becomes the cursor of the default Twitter source
+CARRY_OVER_NEWS_CURSOR = """
+    INSERT INTO news_cursors (source, cursor)
+    SELECT 'twitter:Ashcryptoreal', tweet_id FROM last_tweet WHERE id = 1 AND tweet_id IS NOT NULL
+    ON CONFLICT (source) DO NOTHING
+"""
+
+# Subscriptions activated before expires_at existed
+BACKFILL_EXPIRES_AT = """
+    UPDATE users
+    SET expires_at = start_date::date
+        + CASE duration WHEN 'yearly' THEN 365 ELSE 30 END * INTERVAL '1 day'
+    WHERE paid = 1 AND expires_at IS NULL AND start_date ~ '^\\d{4}-\\d{2}-\\d{2}$'
+"""
+
+HOT_PATH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_alerts_symbol ON alerts (symbol)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_user_id ON alerts (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_package_auto_news ON users (package, auto_news)",
+    "CREATE INDEX IF NOT EXISTS idx_users_package_airdrop ON users (package, last_airdrop_sent)",
+    "CREATE INDEX IF NOT EXISTS idx_users_expires_at ON users (expires_at) WHERE paid = 1",
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id ON referrals (referrer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_swap_users_wallet_address ON swap_users (wallet_address)",
+]
+
+# OHLC candles: one table per interval, range-partitioned by bucket. Partitions
+# are created on demand and dropped by retention in candles.py.
+CANDLE_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS candles_{interval} (
+        symbol TEXT NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        open DOUBLE PRECISION NOT NULL,
+        high DOUBLE PRECISION NOT NULL,
+        low DOUBLE PRECISION NOT NULL,
+        close DOUBLE PRECISION NOT NULL,
+        ticks INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (symbol, bucket)
+    ) PARTITION BY RANGE (bucket)
+    """
+    for interval in ("1m", "15m", "1h", "1d")
+]
+
+INDICATOR_ALERTS = [
+    """
+    CREATE TABLE IF NOT EXISTS indicator_alerts (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        symbol TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        threshold REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_indicator_alerts_user_id ON indicator_alerts (user_id)",
+]
+
+# orders.created_at was a local-time TIMESTAMP compared against UTC epoch block
+# times; existing values are read in the session time zone they were written in
+ORDERS_CREATED_AT_TZ = [
+    """
+    ALTER TABLE orders ALTER COLUMN created_at TYPE TIMESTAMPTZ
+    USING created_at AT TIME ZONE current_setting('TimeZone')
+    """,
+    "ALTER TABLE orders ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP",
+]
+
+# (version, name, steps); a step is SQL text or a function taking a cursor
+MIGRATIONS = [
+    (1, "baseline", BASELINE),
+    (2, "bigint_user_ids", [_bigint_ids]),
+    (3, "last_airdrop_sent_timestamp", [_airdrop_sent_timestamp]),
+    (4, "backfill_expires_at", [BACKFILL_EXPIRES_AT]),
+    (5, "news_cursors_from_last_tweet", [CARRY_OVER_NEWS_CURSOR]),
+    (6, "hot_path_indexes", HOT_PATH_INDEXES),
+    (7, "candles", CANDLE_TABLES),
+    (8, "indicator_alerts", INDICATOR_ALERTS),
+    (9, "orders_created_at_timestamptz", ORDERS_CREATED_AT_TZ),
+]
+
+def run_migrations():
+    """Apply every pending migration. Safe to call from several processes at once."""
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    c = conn.cursor()
+    try:
+        c.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+        c.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in c.fetchall()}
+
+        for version, name, steps in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(c)
+                    else:
+                        c.execute(step)
+                c.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {version} ({name}) failed", exc_info=True)
+                raise
+    finally:
+        c.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
+    print("Migrations applied.")
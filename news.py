@@ -1,13 +1,14 @@
-import requests
 import psycopg2
+from psycopg2.extras import execute_values
 from telegram import Update
-from telegram.ext import ContextTypes, Application
+from telegram.ext import ContextTypes
 import datetime
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import asyncio
 import logging
-import re
+import news_sources
 from promo import send_weekly_promo
+from jobs import schedule_repeating, schedule_daily
+from notify import send_bulk
+from news_routing import route_news
 from telegram.helpers import escape_markdown
 import os
 
@@ -15,84 +16,55 @@ import os
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# === TwitterAPI.io Config ===
-API_KEY = os.environ.get("TWITTER_API_KEY")
-if not API_KEY:
-    print("i needTWITTER_API_KEY")
-else:
-    print("i have TWITTER_API_KEY")
-BASE_URL = "https://api.twitterapi.io"
-HEADERS = {"X-API-Key": API_KEY}
-
-# === Clean tweet text (remove URLs) ===
-def clean_text(text):
-    return re.sub(r'https?://\S+', '', text).strip()
-
-# === Get Recent Tweets from API ===
-def get_all_recent_tweets():
-    logger.info("Fetching tweets from API...")
-    try:
-        conn = psycopg2.connect(os.environ["DATABASE_URL"])
-        c = conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS last_tweet (id INTEGER PRIMARY KEY, tweet_id TEXT)")
-        c.execute("SELECT tweet_id FROM last_tweet WHERE id = 1")
-        result = c.fetchone()
-        latest_tweet_id = result[0] if result else None
-
-        params = {"userName": "Ashcryptoreal", "count": 2}
-        response = requests.get(f"{BASE_URL}/twitter/user/last_tweets", headers=HEADERS, params=params)
-        response.raise_for_status()
-        tweets_data = response.json()
-
-        tweet_list = tweets_data.get("data", {}).get("tweets", [])
-        if not tweet_list:
-            logger.info("🚫 API returned empty tweet list.")
-            return []
-
-        filtered = []
-        KEYWORDS = ["BREAKING"]
-
-        for tweet in tweet_list:
-            if tweet.get("retweeted_tweet") or tweet.get("quoted_tweet"):
-                continue
-            tweet_id = tweet["id"]
-            text = clean_text(tweet["text"])
-            if any(keyword.lower() in text.lower() for keyword in KEYWORDS):
-                filtered.append((tweet_id, text))
-
-        if filtered:
-            latest_tweet_id = filtered[0][0]
-            c.execute("INSERT INTO last_tweet (id, tweet_id) VALUES (1, %s) ON CONFLICT (id) DO UPDATE SET tweet_id = EXCLUDED.tweet_id", (str(latest_tweet_id),))
-            conn.commit()
-
-        conn.close()
-        return filtered
-    except Exception as e:
-        logger.error(f"❌ Failed to fetch tweets: {e}")
-        return []
-
-# === DB Init ===
-def init_news_db():
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
+# === Ingestion: every configured source, deduplicated and symbol-tagged ===
+NEWS_POLL_MINUTES = 10
 
-    # sent_news, last_tweet, and last_sent_tweet tables
-    c.execute("CREATE TABLE IF NOT EXISTS sent_news (tweet_id TEXT PRIMARY KEY, tweet TEXT, date_sent TEXT)")
-    c.execute("CREATE TABLE IF NOT EXISTS last_tweet (id INTEGER PRIMARY KEY, tweet_id TEXT)")
-    c.execute("CREATE TABLE IF NOT EXISTS last_sent_tweet (id INTEGER PRIMARY KEY, tweet_id TEXT)")
+def _seed_dedup_index(c):
+    """Load today's items so a restart doesn't resend near-duplicates."""
+    if news_sources.is_seeded():
+        return
+    c.execute("SELECT tweet_id, tweet FROM sent_news WHERE date_sent = %s", (datetime.date.today().isoformat(),))
+    news_sources.seed_index(c.fetchall())
 
-    # Check and add columns to users table
-    c.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'users'")
-    columns = [row[0] for row in c.fetchall()]
+async def ingest_news():
+    """Poll all sources, bulk-insert unseen items and refresh the digest.
 
-    if 'auto_news' not in columns:
-        c.execute("ALTER TABLE users ADD COLUMN auto_news INTEGER DEFAULT 1")
+    Returns only new items as dicts with id, text, url, source and symbols.
+    """
+    logger.info("Fetching news from all sources...")
+    items = await news_sources.fetch_all_sources()
 
-    if 'package' not in columns:
-        c.execute("ALTER TABLE users ADD COLUMN package TEXT DEFAULT 'free'")
+    today = datetime.date.today().isoformat()
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    c = conn.cursor()
+    _seed_dedup_index(c)
+    items = news_sources.dedupe(items)
+    new_items = []
+    try:
+        if items:
+            for item in items:
+                item["symbols"] = news_sources.tag_symbols(item["text"])
+            inserted = execute_values(c, """
+                INSERT INTO sent_news (tweet_id, tweet, date_sent, source, symbols, content_hash) VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING tweet_id
+            """, [(i["id"], i["text"], today, i["source"], ",".join(i["symbols"]), i["content_hash"]) for i in items], fetch=True)
+            inserted_ids = {row[0] for row in inserted}
+            new_items = [item for item in items if item["id"] in inserted_ids]
+        # Source cursors only move once the items they cover are stored
+        news_sources.save_cursors(c)
+        conn.commit()
+    except Exception:
+        # The items were indexed as seen but not stored: forget them so the refetch isn't deduped away
+        news_sources.reset_index()
+        raise
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+    if new_items:
+        invalidate_news_digest()
+        logger.info(f"📰 Ingested {len(new_items)} new news items")
+    return new_items
 
 # === Daily Cleanup ===
 def clear_old_news(days=1):
@@ -102,22 +74,11 @@ def clear_old_news(days=1):
     c.execute("DELETE FROM sent_news WHERE date_sent < %s", (cutoff,))
     conn.commit()
     conn.close()
+    invalidate_news_digest()
 
 # === Manual Trigger ===
 async def manual_news_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Manual news triggered...")
-    all_tweets = get_all_recent_tweets()
-    today = datetime.date.today().isoformat()
-
-    if all_tweets:
-        conn = psycopg2.connect(os.environ["DATABASE_URL"])
-        c = conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS sent_news (tweet_id TEXT PRIMARY KEY, tweet TEXT, date_sent TEXT)")
-        for tweet_id, text in all_tweets:
-            c.execute("INSERT INTO sent_news (tweet_id, tweet, date_sent) VALUES (%s, %s, %s) ON CONFLICT (tweet_id) DO NOTHING", (tweet_id, text, today))
-        conn.commit()
-        conn.close()
-
     msg = get_latest_news()
     try:
         await context.bot.send_message(chat_id=update.effective_chat.id, text=msg, parse_mode="Markdown")
@@ -125,100 +86,63 @@ async def manual_news_button(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except Exception as e:
         logger.error(f"❌ Failed to send manual news: {e}")
 
-# === Get Saved News ===
+# === Cached digest, rebuilt only when news changes or the day rolls over ===
+_digest = {"date": None, "text": None}
+
+def invalidate_news_digest():
+    _digest["text"] = None
+
 def get_latest_news():
+    today = datetime.date.today().isoformat()
+    if _digest["text"] is not None and _digest["date"] == today:
+        return _digest["text"]
+
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    today = datetime.date.today().isoformat()
     c.execute("SELECT tweet FROM sent_news WHERE date_sent = %s", (today,))
     saved_tweets = [row[0] for row in c.fetchall()]
     conn.close()
 
     if not saved_tweets:
-        return "🚫 No news available in the database."
-
-    msg = "📰 *Crypto News (last 24h):*\n\n"
-    for t in saved_tweets:
-        msg += f"🔹 {t}\n\n"
+        msg = "🚫 No news available in the database."
+    else:
+        msg = "📰 *Crypto News (last 24h):*\n\n"
+        for t in saved_tweets:
+            msg += f"🔹 {t}\n\n"
+    _digest["date"], _digest["text"] = today, msg
     return msg
 
-# === Get Users ===
-def get_all_users():
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, auto_news INTEGER DEFAULT 1, package TEXT DEFAULT 'free')")
-    c.execute("SELECT user_id FROM users WHERE auto_news = 1 AND package = 'pro'")
-    users = [row[0] for row in c.fetchall()]
-    conn.close()
-    return users
-
 # === Auto News Alert ===
 async def send_auto_news_alerts(context: ContextTypes.DEFAULT_TYPE):
     logger.info("🔁 Running auto news alert...")
-    all_tweets = get_all_recent_tweets()
-    today = datetime.date.today().isoformat()
-    if not all_tweets:
-        logger.info("No new tweets found.")
-        return
-
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS sent_news (tweet_id TEXT PRIMARY KEY, tweet TEXT, date_sent TEXT)")
-    c.execute("CREATE TABLE IF NOT EXISTS last_sent_tweet (id INTEGER PRIMARY KEY, tweet_id TEXT)")
-    c.execute("SELECT tweet_id FROM last_sent_tweet WHERE id = 1")
-    result = c.fetchone()
-    last_sent_tweet_id = result[0] if result else None
-
-    # Filter only new tweets compared to the last sent tweet
-    new_tweets = []
-    if all_tweets:
-        latest_tweet_id = all_tweets[0][0]
-        if last_sent_tweet_id is None or latest_tweet_id != last_sent_tweet_id:
-            new_tweets = all_tweets
-            c.execute("INSERT INTO last_sent_tweet (id, tweet_id) VALUES (1, %s) ON CONFLICT (id) DO UPDATE SET tweet_id = EXCLUDED.tweet_id", (str(latest_tweet_id),))
-
-    if not new_tweets:
-        conn.close()
-        logger.info("No new tweets to send.")
+    new_items = await ingest_news()
+    if not new_items:
+        logger.info("No new news to send.")
         return
 
-    for tweet_id, text in new_tweets:
-        c.execute("INSERT INTO sent_news (tweet_id, tweet, date_sent) VALUES (%s, %s, %s) ON CONFLICT (tweet_id) DO NOTHING", (tweet_id, text, today))
-    conn.commit()
-    conn.close()
-
-    msg = "📰 *New Crypto News:*\n\n"
-    for _, text in new_tweets:
-        msg += f"🔹 {text}\n\n"
-    escaped_msg = escape_markdown(msg, version=2)
-
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM users WHERE auto_news = 1 AND package = 'pro'")
-    users = [row[0] for row in c.fetchall()]
-    conn.close()
-
-    for user_id in users:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=escaped_msg, parse_mode="MarkdownV2")
-            logger.info(f"✅ News sent to user {user_id}")
-        except Exception as e:
-            logger.error(f"❌ Failed to send news to {user_id}: {e}")
-
-# === Scheduler ===
-def register_news_scheduler(application):
-    logger.info("🕒 Registering news scheduler...")
-    init_news_db()
-    scheduler = AsyncIOScheduler()
-
-    # Use a function to run the async task with the application context
-    async def run_send_auto_news_alerts(app):
-        await send_auto_news_alerts(app)
-
-    scheduler.add_job(lambda: asyncio.run(run_send_auto_news_alerts(application)), "interval", hours=1)
-    scheduler.add_job(clear_old_news, "cron", hour=0)
-    scheduler.add_job(lambda: asyncio.run(send_weekly_promo(application)), "cron", day_of_week='sun', hour=10)
-    scheduler.start()
-    logger.info("✅ News scheduler started.")
-    # Initial run
-    asyncio.run(run_send_auto_news_alerts(application))
\ No newline at end of file
+    # Users with the same set of routed items share one rendered message
+    routed = route_news(new_items)
+    rendered = {}
+    messages = []
+    for user_id, items in routed.items():
+        key = tuple(item["id"] for item in items)
+        if key not in rendered:
+            msg = "📰 *New Crypto News:*\n\n"
+            for item in items:
+                msg += f"🔹 {item['text']}\n\n"
+            rendered[key] = escape_markdown(msg, version=2)
+        messages.append((user_id, rendered[key]))
+
+    sent, failed = await send_bulk(context.bot, messages, parse_mode="MarkdownV2")
+    logger.info(f"✅ News sent to {len(sent)} users ({len(failed)} failed, {len(rendered)} distinct digests)")
+
+# === Scheduled jobs ===
+def clear_old_news_job(context: ContextTypes.DEFAULT_TYPE):
+    clear_old_news()
+
+def register_news_jobs(application):
+    logger.info("🕒 Registering news jobs...")
+    # First poll shortly after startup instead of blocking it
+    schedule_repeating(application, "auto_news", send_auto_news_alerts, interval=NEWS_POLL_MINUTES * 60, first=10, jitter=30)
+    schedule_daily(application, "clear_old_news", clear_old_news_job, at=datetime.time(0, 0))
+    schedule_daily(application, "weekly_promo", send_weekly_promo, at=datetime.time(10, 0), days=(0,))
@@ -0,0 +1,94 @@
+import logging
+import os
+import sys
+import time
+import psycopg2
+import tokens
+from wallet_directory import get_wallet_addresses
+
+logger = logging.getLogger(__name__)
+
+# Inverted index {symbol: {user_id}} built from what each user has shown interest in:
+# price alerts, snipe subscriptions and cached wallet holdings. Tagged news goes only
+# to users indexed under one of its symbols; untagged news and users with no signals
+# at all keep getting everything, as before.
+ROUTING_TTL = 300  # seconds
+
+_routing = {"built_at": 0.0, "eligible": set(), "index": {}, "interested": set()}
+
+def _eligible_users(c):
+    c.execute("SELECT user_id FROM users WHERE auto_news = 1 AND package = 'pro'")
+    return {row[0] for row in c.fetchall()}
+
+def _alert_interests(c, users):
+    c.execute("SELECT DISTINCT symbol, user_id FROM alerts WHERE user_id = ANY(%s)", (list(users),))
+    return [(symbol.lower(), user_id) for symbol, user_id in c.fetchall()]
+
+def _snipe_interests(users):
+    # In-memory only: if the trading stack isn't loaded nobody has a subscription,
+    # and routing news must never be the thing that imports it.
+    autosnip = sys.modules.get("autosnip")
+    if autosnip is None:
+        return []
+    with autosnip.SUBSCRIPTION_LOCK:
+        subscriptions = dict(autosnip.snipe_subscriptions)
+    pairs = []
+    for user_id, sub in subscriptions.items():
+        symbol = tokens.symbol_for_mint(sub["mint"])
+        if symbol and user_id in users:
+            pairs.append((symbol, user_id))
+    return pairs
+
+def _holding_interests(users):
+    # Only portfolios already cached by /balance; no RPC calls on the news path.
+    portfolio = sys.modules.get("portfolio")
+    if portfolio is None:
+        return []
+    by_address = {address: user_id for user_id, address in get_wallet_addresses(users).items()}
+    pairs = []
+    for address, (cached, _) in list(portfolio._portfolio_cache.items()):
+        user_id = by_address.get(address)
+        if user_id is None:
+            continue
+        pairs.append(("sol", user_id))
+        for token in cached["tokens"]:
+            if token["symbol"]:
+                pairs.append((token["symbol"].lower(), user_id))
+    return pairs
+
+def build_routing_index():
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    c = conn.cursor()
+    eligible = _eligible_users(c)
+    pairs = _alert_interests(c, eligible) if eligible else []
+    conn.close()
+    pairs += _snipe_interests(eligible) + _holding_interests(eligible)
+
+    index = {}
+    for symbol, user_id in pairs:
+        index.setdefault(symbol, set()).add(user_id)
+    _routing.update(built_at=time.time(), eligible=eligible, index=index,
+                    interested={user_id for _, user_id in pairs})
+    logger.info(f"News routing index: {len(eligible)} users, {len(index)} symbols")
+
+def invalidate_routing_index():
+    _routing["built_at"] = 0.0
+
+def route_news(items):
+    """{user_id: [item, ...]} for items tagged with "symbols"."""
+    if time.time() - _routing["built_at"] > ROUTING_TTL:
+        build_routing_index()
+    index, eligible = _routing["index"], _routing["eligible"]
+    unfiltered = eligible - _routing["interested"]
+
+    routed = {}
+    for item in items:
+        if item.get("symbols"):
+            recipients = set(unfiltered)
+            for symbol in item["symbols"]:
+                recipients |= index.get(symbol, set())
+        else:
+            recipients = eligible
+        for user_id in recipients:
+            routed.setdefault(user_id, []).append(item)
+    return routed
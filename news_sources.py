@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import deque
+import psycopg2
+import tokens
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# === Source config ===
+# NEWS_SOURCES is a JSON list, e.g.
+#   [{"type": "twitter", "account": "Ashcryptoreal", "keywords": ["BREAKING"]},
+#    {"type": "rss", "name": "coindesk", "url": "https://www.coindesk.com/arc/outboundfeeds/rss/"},
+#    {"type": "json", "name": "feed", "url": "https://example.com/feed.json"}]
+DEFAULT_NEWS_SOURCES = [{"type": "twitter", "account": "Ashcryptoreal", "keywords": ["BREAKING"]}]
+
+def load_sources():
+    raw = os.environ.get("NEWS_SOURCES")
+    if not raw:
+        return DEFAULT_NEWS_SOURCES
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Invalid NEWS_SOURCES, using defaults: {e}")
+        return DEFAULT_NEWS_SOURCES
+
+def source_name(source):
+    return source.get("name") or f"{source['type']}:{source.get('account') or source.get('url')}"
+
+TWITTER_BASE_URL = "https://api.twitterapi.io"
+TWITTER_HEADERS = {"X-API-Key": os.environ.get("TWITTER_API_KEY") or ""}
+
+def clean_text(text):
+    return re.sub(r'https?://\S+', '', text or '').strip()
+
+# === Per-source cursors ===
+def _get_cursor(name):
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    c = conn.cursor()
+    c.execute("SELECT cursor FROM news_cursors WHERE source = %s", (name,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+# Advanced cursors wait here until ingest_news stores the items they cover
+_pending_cursors = {}
+
+def save_cursors(c):
+    """Write advanced cursors on the caller's cursor, in the same transaction as the items."""
+    for name, cursor in list(_pending_cursors.items()):
+        c.execute("INSERT INTO news_cursors (source, cursor) VALUES (%s, %s) ON CONFLICT (source) DO UPDATE SET cursor = EXCLUDED.cursor", (name, cursor))
+    _pending_cursors.clear()
+
+# === Fetchers: each returns [{"id", "text", "url"}] ===
+async def fetch_twitter(source):
+    name = source_name(source)
+    since_id = _get_cursor(name)
+    query = f"from:{source['account']}"
+    if since_id:
+        query += f" since_id:{since_id}"
+    async with get_session().get(f"{TWITTER_BASE_URL}/twitter/tweet/advanced_search",
+                                 params={"query": query, "queryType": "Latest"},
+                                 headers=TWITTER_HEADERS) as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    items, newest_id = [], since_id
+    for tweet in data.get("tweets") or []:
+        tweet_id = str(tweet["id"])
+        if newest_id is None or int(tweet_id) > int(newest_id):
+            newest_id = tweet_id
+        if tweet.get("retweeted_tweet") or tweet.get("quoted_tweet"):
+            continue
+        items.append({"id": tweet_id, "text": clean_text(tweet["text"]), "url": tweet.get("url")})
+    if newest_id and newest_id != since_id:
+        _pending_cursors[name] = newest_id
+    return items
+
+async def fetch_rss(source):
+    async with get_session().get(source["url"]) as response:
+        response.raise_for_status()
+        body = await response.text()
+    root = ET.fromstring(body)
+    items = []
+    # RSS <item> and Atom <entry>
+    for node in root.iter():
+        tag = node.tag.rsplit("}", 1)[-1]
+        if tag not in ("item", "entry"):
+            continue
+        fields = {child.tag.rsplit("}", 1)[-1]: child for child in node}
+        title = (fields["title"].text if "title" in fields else "") or ""
+        link = fields.get("link")
+        url = (link.text or link.get("href")) if link is not None else None
+        guid = fields.get("guid") if "guid" in fields else fields.get("id")
+        item_id = (guid.text if guid is not None else None) or url or title
+        items.append({"id": item_id, "text": clean_text(title), "url": url})
+    return items
+
+async def fetch_json(source):
+    async with get_session().get(source["url"]) as response:
+        response.raise_for_status()
+        data = await response.json(content_type=None)
+    entries = data.get(source.get("items_key", "items"), []) if isinstance(data, dict) else data
+    text_field = source.get("text_field", "title")
+    items = []
+    for entry in entries:
+        text = entry.get(text_field) or entry.get("content_text") or ""
+        url = entry.get(source.get("url_field", "url"))
+        items.append({"id": str(entry.get(source.get("id_field", "id")) or url or text), "text": clean_text(text), "url": url})
+    return items
+
+SOURCE_FETCHERS = {
+    "twitter": fetch_twitter,
+    "rss": fetch_rss,
+    "json": fetch_json,
+}
+
+async def _fetch_source(source):
+    name = source_name(source)
+    fetcher = SOURCE_FETCHERS.get(source.get("type"))
+    if fetcher is None:
+        logger.error(f"Unknown news source type for {name}")
+        return []
+    try:
+        items = await fetcher(source)
+    except Exception as e:
+        logger.error(f"❌ News source {name} failed: {e}")
+        return []
+    keywords = source.get("keywords")
+    result = []
+    for item in items:
+        if not item["text"]:
+            continue
+        if keywords and not any(k.lower() in item["text"].lower() for k in keywords):
+            continue
+        item["id"] = f"{name}:{item['id']}" if source.get("type") != "twitter" else item["id"]
+        item["source"] = name
+        result.append(item)
+    return result
+
+async def fetch_all_sources():
+    """All configured sources concurrently, as one list."""
+    results = await asyncio.gather(*(_fetch_source(source) for source in load_sources()))
+    return [item for items in results for item in items]
+
+# === Near-duplicate index ===
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.6  # Jaccard similarity of word shingles
+INDEX_WINDOW = 2000        # most recent items kept in the in-memory index
+
+def normalize(text):
+    text = re.sub(r'https?://\S+', ' ', text.lower())
+    text = re.sub(r'[^a-z0-9$% ]+', ' ', text)
+    return " ".join(w for w in text.split() if w not in ("breaking", "rt"))
+
+def content_hash(text):
+    return hashlib.sha1(normalize(text).encode()).hexdigest()
+
+def _shingles(text):
+    words = normalize(text).split()
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {hash(" ".join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+_recent = deque()        # (item_key, shingles, content_hash)
+_shingle_index = {}      # shingle -> set(item_key)
+_sizes = {}              # item_key -> number of shingles
+_hashes = set()
+_seeded = False
+
+def _index(key, shingles, digest):
+    _recent.append((key, shingles, digest))
+    _sizes[key] = len(shingles)
+    _hashes.add(digest)
+    for s in shingles:
+        _shingle_index.setdefault(s, set()).add(key)
+    while len(_recent) > INDEX_WINDOW:
+        old_key, old_shingles, old_digest = _recent.popleft()
+        _sizes.pop(old_key, None)
+        _hashes.discard(old_digest)
+        for s in old_shingles:
+            keys = _shingle_index.get(s)
+            if keys:
+                keys.discard(old_key)
+                if not keys:
+                    del _shingle_index[s]
+
+def is_duplicate(text):
+    """True if an exact (hash) or near (shingle Jaccard) duplicate is already indexed."""
+    if content_hash(text) in _hashes:
+        return True
+    shingles = _shingles(text)
+    if not shingles:
+        return True
+    overlap = {}
+    for s in shingles:
+        for key in _shingle_index.get(s, ()):
+            overlap[key] = overlap.get(key, 0) + 1
+    return any(count / (len(shingles) + _sizes[key] - count) >= DUPLICATE_THRESHOLD for key, count in overlap.items())
+
+def seed_index(texts):
+    global _seeded
+    for key, text in texts:
+        _index(key, _shingles(text), content_hash(text))
+    _seeded = True
+
+def dedupe(items):
+    """Drop items that duplicate each other or anything already indexed; index the survivors."""
+    unique = []
+    for item in items:
+        if is_duplicate(item["text"]):
+            continue
+        item["content_hash"] = content_hash(item["text"])
+        _index(item["id"], _shingles(item["text"]), item["content_hash"])
+        unique.append(item)
+    return unique
+
+def is_seeded():
+    return _seeded
+
+def reset_index():
+    """Forget everything indexed; the next ingest re-seeds from the database."""
+    global _seeded
+    _recent.clear()
+    _shingle_index.clear()
+    _sizes.clear()
+    _hashes.clear()
+    _seeded = False
+
+# === Symbol tagging ===
+# Cashtags ($SOL) match any symbol; bare tickers only when upper-case and 3+ chars;
+# CoinGecko ids only when they are a distinctive single word.
+AMBIGUOUS_NAMES = {"near", "story", "syrup", "sky", "sonic", "gala", "quant", "flare", "mantle", "render", "floki"}
+_ticker_re = re.compile(r'\$([A-Za-z0-9]{1,10})\b|\b([A-Z0-9]{3,10})\b')
+
+_name_index = {"version": None, "names": {}, "re": None}  # rebuilt when the token registry reloads
+
+def _build_name_index():
+    names = {}
+    for symbol in tokens.symbols():
+        cg_id = tokens.coingecko_id(symbol)
+        if "-" not in cg_id and len(cg_id) >= 5 and cg_id not in AMBIGUOUS_NAMES:
+            names[cg_id] = symbol
+    pattern = re.compile(r'\b(' + '|'.join(map(re.escape, sorted(names, key=len, reverse=True))) + r')\b', re.IGNORECASE)
+    _name_index.update(version=tokens.version(), names=names, re=pattern)
+
+def tag_symbols(text):
+    """Sorted list of priced token symbols mentioned in the text."""
+    if _name_index["version"] != tokens.version():
+        _build_name_index()
+    found = set()
+    for cashtag, ticker in _ticker_re.findall(text):
+        symbol = (cashtag or ticker).lower()
+        if tokens.is_priced(symbol):
+            found.add(symbol)
+    for name in _name_index["re"].findall(text):
+        found.add(_name_index["names"][name.lower()])
+    return sorted(found)
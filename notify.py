@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_SENDS = 20
+MESSAGES_PER_SECOND = 25  # stay under Telegram's ~30 msg/s bot limit
+
+_next_slot = 0.0
+_slot_lock = asyncio.Lock()
+
+async def _wait_for_slot():
+    global _next_slot
+    async with _slot_lock:
+        now = time.monotonic()
+        wait = _next_slot - now
+        _next_slot = max(now, _next_slot) + 1 / MESSAGES_PER_SECOND
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+async def send_bulk(bot, messages, parse_mode=None, **kwargs):
+    """Send [(user_id, text), ...] concurrently under the global rate limit.
+
+    Returns (sent_user_ids, failed_user_ids).
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+    sent, failed = [], []
+
+    async def send_one(user_id, text):
+        async with semaphore:
+            await _wait_for_slot()
+            try:
+                await bot.send_message(chat_id=user_id, text=text, parse_mode=parse_mode, **kwargs)
+                sent.append(user_id)
+            except Exception as e:
+                logger.error(f"Failed to send to {user_id}: {e}")
+                failed.append(user_id)
+
+    await asyncio.gather(*(send_one(user_id, text) for user_id, text in messages))
+    return sent, failed
+
+async def broadcast_text(bot, user_ids, text, parse_mode=None, **kwargs):
+    """Same text to many users; see send_bulk."""
+    return await send_bulk(bot, [(user_id, text) for user_id in user_ids], parse_mode=parse_mode, **kwargs)
@@ -1,6 +1,6 @@
-import psycopg2
+from db import lazy_connection, lazy_cursor
 import datetime
-import requests
+import logging
 import time
 from decimal import Decimal
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -11,11 +11,22 @@ from telegram.ext import (
 )
 from telegram.helpers import escape_markdown
 import os
+import psycopg2
+
+from notify import broadcast_text
+from payment_indexer import (
+    BOT_PAYMENT_WALLET_SOLANA,
+    PAYMENT_MAX_AGE,
+    sync_payments,
+    fetch_payment,
+    get_payment,
+    find_unclaimed_payment,
+    claim_payment,
+)
+
+logger = logging.getLogger(__name__)
 
 # --- Config ---
-  # Replace with your Telegram bot token
-BOT_PAYMENT_WALLET_SOLANA = "7BSUBgKUF3Ju735r24BLvmES2gDeZnP6ukPJbno3PkyN"  # Solana wallet
-USDT_SOLANA_MINT = "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"
  # 🔁 Replace with your real Helius API key
 HELIUS_API_KEY = os.environ.get("HELIUS_API_KEY")
 if not HELIUS_API_KEY:
@@ -23,27 +34,76 @@ if not HELIUS_API_KEY:
 else:
     print("i have HELIUS_API_KEY")
 
-# --- Database setup ---
-conn = psycopg2.connect(os.environ["DATABASE_URL"])
-c = conn.cursor()
-try:
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        region TEXT,
-        package TEXT,
-        price REAL,
-        start_date TEXT,
-        duration TEXT,
-        wallet_address TEXT,
-        paid INTEGER DEFAULT 0
+# --- Database ---
+conn = lazy_connection("pay")
+c = lazy_cursor("pay")
+
+# --- Package prices (server-side; never taken from the client) ---
+PACKAGE_PRICES = {
+    "asia": {"plus_monthly": 5, "pro_monthly": 15},
+    "other": {"plus_monthly": 10, "pro_monthly": 25, "plus_yearly": 100, "pro_yearly": 180},
+}
+ORDER_TTL_HOURS = 24
+DURATION_DAYS = {"monthly": 30, "yearly": 365}
+
+def get_package_prices(region):
+    return PACKAGE_PRICES["asia"] if region == "asia" else PACKAGE_PRICES["other"]
+
+# --- Orders ---
+def create_order(user_id, package, duration, price, wallet_address):
+    """Replace any pending order of the user with a new one."""
+    c.execute("UPDATE orders SET status = 'cancelled' WHERE user_id = %s AND status = 'pending'", (user_id,))
+    c.execute(
+        "INSERT INTO orders (user_id, package, duration, price, wallet_address) "
+        "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+        (user_id, package, duration, price, wallet_address)
     )
-    """)
+    order_id = c.fetchone()[0]
     conn.commit()
-except psycopg2.ProgrammingError as e:
-    if "already exists" not in str(e):
-        print(f"[ERROR] Database setup failed: {e}")
-    conn.rollback()
+    return order_id
+
+_ORDER_COLUMNS = ("id", "user_id", "package", "duration", "price", "wallet_address", "status")
+
+def get_latest_order(user_id):
+    c.execute(
+        f"SELECT {', '.join(_ORDER_COLUMNS)} FROM orders WHERE user_id = %s AND status IN ('pending', 'paid') "
+        "ORDER BY id DESC LIMIT 1",
+        (user_id,)
+    )
+    row = c.fetchone()
+    return dict(zip(_ORDER_COLUMNS, row)) if row else None
+
+def activate_subscription(cur, user_id, package, duration, price):
+    """Upgrade the user within the caller's transaction."""
+    start_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    # Renewals extend from the current expiry instead of resetting it
+    cur.execute("""
+        UPDATE users SET package=%s, price=%s, start_date=%s, duration=%s, paid=1,
+            expires_at = GREATEST(COALESCE(expires_at, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+                         + %s * INTERVAL '1 day'
+        WHERE user_id=%s
+    """, (package, price, start_date, duration, DURATION_DAYS.get(duration, 30), user_id))
+
+def complete_order(order, signature):
+    """Claim the payment for the order and activate it. False if the payment or the order was already used.
+
+    Claim, order update and activation commit together or not at all.
+    """
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as tx:
+        with tx.cursor() as cur:
+            if not claim_payment(cur, signature, order["user_id"]):
+                return False
+            cur.execute(
+                "UPDATE orders SET status = 'paid', payment_signature = %s "
+                "WHERE id = %s AND status IN ('pending', 'expired') RETURNING id",
+                (signature, order["id"])
+            )
+            if cur.fetchone() is None:
+                # Paid concurrently with another payment: give this one back
+                tx.rollback()
+                return False
+            activate_subscription(cur, order["user_id"], order["package"], order["duration"], order["price"])
+    return True
 
 # --- /upgrade ---
 async def start_upgrade(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -63,15 +123,7 @@ async def select_region(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
 
     region = query.data.replace("region_", "")
-    context.user_data['region'] = region
-
-    prices = {
-        "plus_monthly": 5, "pro_monthly": 15
-    } if region == "asia" else {
-        "plus_monthly": 10, "pro_monthly": 25,
-        "plus_yearly": 100, "pro_yearly": 180
-    }
-    context.user_data['prices'] = prices
+    prices = get_package_prices(region)
 
     c.execute("INSERT INTO users (user_id, region) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET region = EXCLUDED.region", (user_id, region))
     conn.commit()
@@ -97,21 +149,19 @@ async def select_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
     parts = query.data.split("_")  # e.g. ['package', 'plus', 'monthly']
     package, duration = parts[1], parts[2]
 
-    prices = context.user_data.get("prices", {})
-    price_key = f"{package}_{duration}"
-    price = prices.get(price_key)
+    c.execute("SELECT region, wallet_address FROM users WHERE user_id=%s", (user_id,))
+    row = c.fetchone()
+    region = row[0] if row else None
+    wallet_address = row[1] if row and row[1] else None
+
+    price = get_package_prices(region).get(f"{package}_{duration}")
     if price is None:
         await query.edit_message_text("Invalid selection. Please try again.")
         return
 
-    # Save selection temporarily
-    context.user_data['selected_package'] = package
-    context.user_data['selected_duration'] = duration
-    context.user_data['selected_price'] = price
-
-    c.execute("SELECT wallet_address FROM users WHERE user_id=%s", (user_id,))
-    row = c.fetchone()
-    wallet_address = row[0] if row and row[0] else "Not set"
+    # The order is stored server-side; the payment watcher matches incoming transfers to it
+    create_order(user_id, package, duration, price, wallet_address)
+    wallet_address = wallet_address or "Not set"
 
     # Escape wallet address for Markdown
     wallet_address_display = escape_markdown(wallet_address) if wallet_address else "Not set"
@@ -123,7 +173,7 @@ async def select_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"💵 Amount to pay: *${price} USDT*\n\n"
         f"🔸 *Pay Here Solana USDT*: `{escape_markdown(BOT_PAYMENT_WALLET_SOLANA)}`\n\n"
         f"Your wallet: `{wallet_address_display}`\n\n"
-        f"After payment, send `/i_paid` with the TX ID(Signature) to confirm\n\n"
+        f"Your payment is detected automatically within a minute. You can also send `/i_paid` with the TX ID(Signature) to confirm\n\n"
         f"Click to get TX ID easily: ({tx_id})\n\n"
         "Example, `/i_paid` 2nkcFPTtRbbQA8jBughSDgghy47kjhkh",
         parse_mode="Markdown",
@@ -131,94 +181,36 @@ async def select_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 # --- Check Solana payment ---
-def check_solana_payment(from_wallet, to_wallet, amount_usdt, tx_id=None):
-    import time
-    import requests
-    from decimal import Decimal
-
-    USDT_MINT = "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"
-    all_transactions = []
-    before = None
-    while True:
-        url = f"https://api.helius.xyz/v0/addresses/{to_wallet}/transactions?api-key={HELIUS_API_KEY}"
-        if before:
-            url += f"&before={before}"
-        try:
-            res = requests.get(url, timeout=10)
-            print("[DEBUG] Helius Status:", res.status_code)
-            if res.status_code != 200:
-                print("[Helius API ERROR]", res.status_code, res.text)
-                break
-            transactions = res.json()
-            if not transactions:
-                break
-            all_transactions.extend(transactions)
-            before = transactions[-1].get("signature") if transactions else None
-            if len(transactions) < 100:  # Assuming 100 is the default limit
-                break
-        except Exception as e:
-            print("[Helius Error]", e)
-            print("URL:", url)
-            break
+async def check_solana_payment(from_wallet, amount_usdt, tx_id=None):
+    """Find an unclaimed USDT payment from the user's wallet in the payments index.
 
+    Returns (payment, reason) where reason is "ok", "used", "mismatch" or "not_found".
+    """
+    now = time.time()
     if tx_id:
-        url = f"https://api.helius.xyz/v0/transactions?api-key={HELIUS_API_KEY}"
-        payload = {"transactions": [tx_id]}
-        try:
-            res = requests.post(url, json=payload, timeout=10)
-            print("[DEBUG] Helius Transaction API Status:", res.status_code)
-            if res.status_code != 200:
-                print("[Helius API ERROR]", res.status_code, res.text)
-                return False
-            all_transactions = res.json()
-        except Exception as e:
-            print("[Helius Error]", e)
-            print("URL:", url)
-            return False
-
-    print(f"[DEBUG] Found {len(all_transactions)} transactions")
-    for tx in all_transactions:
-        if not isinstance(tx, dict):
-            print("[DEBUG] Skipping invalid transaction format")
-            continue
-        if tx.get("type") != "TRANSFER":
-            print("[DEBUG] Skipping non-TRANSFER transaction")
-            continue
-
-        token_transfers = tx.get("tokenTransfers", [])
-        if not token_transfers:
-            print("[DEBUG] No tokenTransfers found, checking nativeTransfers...")
-            continue
-
-        for token in token_transfers:
-            print("[DEBUG] Token Transfer:", token)
-            mint = token.get("mint")
-            sender = token.get("fromUserAccount", "").lower()
-            receiver = token.get("toUserAccount", "").lower()
-            amount = Decimal(str(token.get("tokenAmount", "0")))
-            timestamp = tx.get("timestamp", 0)
-
-            if timestamp > 1e12:
-                timestamp = timestamp / 1000
-
-            if (
-                mint == USDT_MINT and
-                sender == from_wallet.lower() and
-                receiver == to_wallet.lower()
-            ):
-                print(f"[MATCH] USDT Tx match: {amount} USDT at {timestamp}")
-                current_time = time.time()
-                if amount >= Decimal(str(amount_usdt)):
-                    if current_time - timestamp <= 86400:
-                        print("[DEBUG] Payment valid: Amount sufficient and within 24 hours")
-                        return True
-                    else:
-                        print(f"[DEBUG] Payment invalid: Transaction too old (age: {current_time - timestamp} seconds)")
-                else:
-                    print(f"[DEBUG] Payment invalid: Amount {amount} < {amount_usdt}")
-
-    print("[DEBUG] No valid payment transaction found")
-    return False
+        payment = get_payment(tx_id)
+        if payment is None:
+            await sync_payments()
+            payment = get_payment(tx_id) or await fetch_payment(tx_id)
+        if payment is None:
+            return None, "not_found"
+        if payment["claimed_by"] is not None:
+            return None, "used"
+        if (
+            payment["sender"] != from_wallet
+            or payment["amount"] < Decimal(str(amount_usdt))
+            or now - payment["block_time"] > PAYMENT_MAX_AGE
+        ):
+            logger.debug(f"Payment {tx_id} does not match: {payment}")
+            return None, "mismatch"
+    else:
+        await sync_payments()
+        payment = find_unclaimed_payment(from_wallet, amount_usdt, int(now - PAYMENT_MAX_AGE))
+        if payment is None:
+            return None, "not_found"
+
+    logger.info(f"USDT payment {payment['signature']}: {payment['amount']} USDT from {from_wallet}")
+    return payment, "ok"
 
 def test_tx(amount, price, tx_timestamp):
     # timestamp check - if millis, convert to seconds
@@ -246,31 +238,31 @@ async def i_paid(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     tx_id = context.args[0] if context.args else None  # Get transaction ID if provided
 
-    c.execute("SELECT wallet_address FROM users WHERE user_id=%s", (user_id,))
-    row = c.fetchone()
-    if not row or not row[0]:
+    order = get_latest_order(user_id)
+    if order is None:
+        await update.message.reply_text("No package info found. Please start with /upgrade.")
+        return
+    if order["status"] == "paid":
+        await update.message.reply_text("✅ Your payment was already detected. You are subscribed.")
+        return
+    if not order["wallet_address"]:
         await update.message.reply_text("You have not set a wallet. Use /wallet to set it.")
         return
 
-    wallet_address = row[0]
-    package = context.user_data.get("selected_package")
-    duration = context.user_data.get("selected_duration")
-    price = context.user_data.get("selected_price")
-
-    if not all([package, duration, price]):
-        await update.message.reply_text("No package info found. Please start with /upgrade.")
+    try:
+        payment, reason = await check_solana_payment(order["wallet_address"], order["price"], tx_id)
+    except Exception as e:
+        logger.error(f"Payment index lookup failed: {e}", exc_info=True)
+        await update.message.reply_text("⚠️ Could not reach the payment index right now. Please try again in a minute.")
         return
 
-    paid = check_solana_payment(wallet_address, BOT_PAYMENT_WALLET_SOLANA, price, tx_id)
-
-    if paid:
-        start_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        c.execute("""
-            UPDATE users SET package=%s, price=%s, start_date=%s, duration=%s, paid=1
-            WHERE user_id=%s
-        """, (package, price, start_date, duration, user_id))
-        conn.commit()
+    if payment and complete_order(order, payment["signature"]):
         await update.message.reply_text("✅ Payment confirmed! You are now subscribed.")
+    elif payment and (get_latest_order(user_id) or {}).get("status") == "paid":
+        # The payment watcher completed the order first; this payment stays unclaimed
+        await update.message.reply_text("✅ Your payment was already detected. You are subscribed.")
+    elif payment or reason == "used":
+        await update.message.reply_text("❌ This payment has already been used.")
     else:
         await update.message.reply_text("❌ Payment not detected. Please check your transaction and try again.")
 
@@ -283,13 +275,30 @@ def register_payment_handlers(application):
 
 # --- Check expirations ---
 async def check_expirations(context: ContextTypes.DEFAULT_TYPE):
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-    c.execute("SELECT user_id, start_date, duration FROM users WHERE paid = 1")
-    for row in c.fetchall():
-        user_id, start_date, duration = row
-        start = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-        end = start + datetime.timedelta(days=int(duration))
-        if end.strftime("%Y-%m-%d") == current_date:
-            c.execute("UPDATE users SET paid = 0 WHERE user_id = %s", (user_id,))
-            conn.commit()
-            await context.bot.send_message(chat_id=user_id, text="⚠️ Your subscription has expired!")
+    # Paid users without expires_at (legacy rows whose start_date the backfill
+    # couldn't parse) would never match the range below: give them a full period
+    # from now, the same rule the backfill uses for a known start_date
+    c.execute("""
+        UPDATE users
+        SET expires_at = CASE WHEN start_date ~ '^\\d{4}-\\d{2}-\\d{2}$' THEN start_date::date ELSE CURRENT_TIMESTAMP END
+            + CASE duration WHEN 'yearly' THEN 365 ELSE 30 END * INTERVAL '1 day'
+        WHERE paid = 1 AND expires_at IS NULL
+        RETURNING user_id
+    """)
+    backfilled = c.fetchall()
+    conn.commit()
+    if backfilled:
+        logger.warning(f"Set missing expires_at for {len(backfilled)} paid users")
+
+    # Range scan on idx_users_expires_at; downgrade every expired user in one statement
+    c.execute("""
+        UPDATE users SET paid = 0, package = 'free'
+        WHERE paid = 1 AND expires_at <= CURRENT_TIMESTAMP
+        RETURNING user_id
+    """)
+    expired = [row[0] for row in c.fetchall()]
+    conn.commit()
+    if not expired:
+        return
+    sent, failed = await broadcast_text(context.bot, expired, "⚠️ Your subscription has expired!")
+    logger.info(f"Expired {len(expired)} subscriptions ({len(failed)} notifications failed)")
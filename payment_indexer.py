@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+import os
+from decimal import Decimal
+import aiohttp
+import psycopg2
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+HELIUS_API_KEY = os.environ.get("HELIUS_API_KEY")
+HELIUS_BASE_URL = "https://api.helius.xyz/v0"
+BOT_PAYMENT_WALLET_SOLANA = "7BSUBgKUF3Ju735r24BLvmES2gDeZnP6ukPJbno3PkyN"
+USDT_SOLANA_MINT = "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"
+
+PAYMENT_MAX_AGE = 86400  # seconds; older transfers are not accepted as payment
+MIN_SYNC_INTERVAL = 5  # seconds between incremental syncs
+
+# Only transfers *into* the payment wallet are indexed. The cursor is the newest
+# signature already ingested, so each sync only pages through what is new.
+
+_sync_lock = asyncio.Lock()
+_last_sync = 0.0
+
+# --- DB ---
+def _get_cursor():
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT last_signature FROM payment_index_cursor WHERE id = 1")
+            row = cur.fetchone()
+            return row[0] if row else None
+
+def _store(rows, new_cursor):
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            if rows:
+                execute_values(cur, """
+                    INSERT INTO payments (signature, sender, receiver, mint, amount, block_time)
+                    VALUES %s
+                    ON CONFLICT (signature) DO NOTHING
+                """, rows)
+            if new_cursor:
+                cur.execute(
+                    "INSERT INTO payment_index_cursor (id, last_signature) VALUES (1, %s) "
+                    "ON CONFLICT (id) DO UPDATE SET last_signature = EXCLUDED.last_signature",
+                    (new_cursor,)
+                )
+
+# --- Parsing ---
+def _extract_payment(tx: dict, receiver: str = BOT_PAYMENT_WALLET_SOLANA):
+    """(signature, sender, receiver, mint, amount, block_time) for a USDT transfer into receiver, else None."""
+    if not isinstance(tx, dict) or tx.get("type") != "TRANSFER":
+        return None
+    sender, amount = None, Decimal("0")
+    for token in tx.get("tokenTransfers") or []:
+        if token.get("mint") == USDT_SOLANA_MINT and token.get("toUserAccount") == receiver:
+            sender = sender or token.get("fromUserAccount")
+            amount += Decimal(str(token.get("tokenAmount", "0")))
+    if not sender or amount <= 0:
+        return None
+    timestamp = tx.get("timestamp", 0)
+    if timestamp > 1e12:
+        timestamp = timestamp / 1000
+    return (tx["signature"], sender, receiver, USDT_SOLANA_MINT, amount, int(timestamp))
+
+# --- Ingestion ---
+async def _fetch_page(session, before=None, until=None):
+    params = {"api-key": HELIUS_API_KEY}
+    if before:
+        params["before"] = before
+    if until:
+        params["until"] = until
+    url = f"{HELIUS_BASE_URL}/addresses/{BOT_PAYMENT_WALLET_SOLANA}/transactions"
+    async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as res:
+        if res.status != 200:
+            raise Exception(f"Helius HTTP {res.status}: {await res.text()}")
+        return await res.json()
+
+async def sync_payments(force: bool = False) -> int:
+    """Ingest transfers newer than the stored cursor. Returns the number of new payments."""
+    global _last_sync
+    async with _sync_lock:
+        if not force and time.time() - _last_sync < MIN_SYNC_INTERVAL:
+            return 0
+        cursor = _get_cursor()
+        rows, newest, before = [], None, None
+        oldest_allowed = time.time() - PAYMENT_MAX_AGE
+        async with aiohttp.ClientSession() as session:
+            while True:
+                page = await _fetch_page(session, before=before, until=cursor)
+                if not page:
+                    break
+                newest = newest or page[0].get("signature")
+                for tx in page:
+                    payment = _extract_payment(tx)
+                    if payment:
+                        rows.append(payment)
+                before = page[-1].get("signature")
+                # Without a cursor only backfill the window in which payments are still valid
+                if cursor is None and (page[-1].get("timestamp") or 0) < oldest_allowed:
+                    break
+        _store(rows, newest)
+        _last_sync = time.time()
+        if rows:
+            logger.info(f"Indexed {len(rows)} new payments")
+        return len(rows)
+
+async def fetch_payment(signature: str):
+    """Look up one signature directly and index it if it is a payment to the bot wallet."""
+    url = f"{HELIUS_BASE_URL}/transactions"
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, params={"api-key": HELIUS_API_KEY}, json={"transactions": [signature]},
+                                timeout=aiohttp.ClientTimeout(total=10)) as res:
+            if res.status != 200:
+                logger.error(f"Helius HTTP {res.status} for {signature}")
+                return None
+            txs = await res.json()
+    payments = [p for p in (_extract_payment(tx) for tx in txs) if p]
+    if payments:
+        _store(payments, None)
+    return get_payment(signature)
+
+# --- Lookups ---
+_COLUMNS = ("signature", "sender", "receiver", "mint", "amount", "block_time", "claimed_by")
+
+def get_payment(signature: str):
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(_COLUMNS)} FROM payments WHERE signature = %s", (signature,))
+            row = cur.fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+def find_unclaimed_payment(sender: str, min_amount, since: int):
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {', '.join(_COLUMNS)} FROM payments
+                WHERE sender = %s AND block_time >= %s AND amount >= %s AND claimed_by IS NULL
+                ORDER BY block_time DESC LIMIT 1
+            """, (sender, since, Decimal(str(min_amount))))
+            row = cur.fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+def claim_payment(cur, signature: str, user_id: int) -> bool:
+    """Mark a payment as used within the caller's transaction. False if someone already claimed it."""
+    cur.execute(
+        "UPDATE payments SET claimed_by = %s, claimed_at = CURRENT_TIMESTAMP "
+        "WHERE signature = %s AND claimed_by IS NULL RETURNING signature",
+        (user_id, signature)
+    )
+    return cur.fetchone() is not None
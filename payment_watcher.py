@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+import psycopg2
+from pay import complete_order, ORDER_TTL_HOURS
+from payment_indexer import sync_payments, PAYMENT_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+WATCH_INTERVAL = 20  # seconds between payment index syncs
+PAYMENT_SLACK = 3600  # accept transfers made up to an hour before the order was created
+
+# --- Match unclaimed payments to pending orders in one query ---
+def _expire_orders():
+    """Expire stale orders. Returns whether any order is still pending."""
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE orders SET status = 'expired' "
+                "WHERE status = 'pending' AND created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'",
+                (ORDER_TTL_HOURS,)
+            )
+            cur.execute("SELECT EXISTS (SELECT 1 FROM orders WHERE status = 'pending')")
+            return cur.fetchone()[0]
+
+def _find_matches():
+    # created_at is TIMESTAMPTZ, so its epoch is UTC like block_time
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT o.id, o.user_id, o.package, o.duration, o.price, o.wallet_address, p.signature
+                FROM orders o
+                JOIN payments p
+                  ON p.sender = o.wallet_address
+                 AND p.claimed_by IS NULL
+                 AND p.amount >= o.price
+                 AND p.block_time >= EXTRACT(EPOCH FROM o.created_at) - %s
+                 AND p.block_time >= EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) - %s
+                WHERE o.status = 'pending'
+                ORDER BY o.id, p.block_time
+            """, (PAYMENT_SLACK, PAYMENT_MAX_AGE))
+            return cur.fetchall()
+
+async def process_pending_orders(bot):
+    """Activate every pending order that has a matching payment. Returns the number activated."""
+    # Blocking DB work runs in a thread so the event loop keeps serving updates
+    if not await asyncio.to_thread(_expire_orders):
+        return 0  # nothing to match: don't poll the payment index
+    await sync_payments(force=True)
+    used_orders, used_payments = set(), set()
+    activated = 0
+    for order_id, user_id, package, duration, price, wallet_address, signature in await asyncio.to_thread(_find_matches):
+        if order_id in used_orders or signature in used_payments:
+            continue
+        order = {"id": order_id, "user_id": user_id, "package": package, "duration": duration, "price": price}
+        if not await asyncio.to_thread(complete_order, order, signature):
+            continue
+        used_orders.add(order_id)
+        used_payments.add(signature)
+        activated += 1
+        logger.info(f"Order {order_id} paid by {signature}: user {user_id} upgraded to {package} ({duration})")
+        try:
+            await bot.send_message(
+                chat_id=user_id,
+                text=f"✅ Payment received! Your *{package.title()}* ({duration}) subscription is now active.",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify user {user_id} about order {order_id}: {e}")
+    return activated
+
+async def payment_watcher(app):
+    while True:
+        try:
+            await process_pending_orders(app.bot)
+        except Exception as e:
+            logger.error(f"Payment watcher error: {e}")
+        await asyncio.sleep(WATCH_INTERVAL)
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+import os
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.types import TokenAccountOpts
+from solders.pubkey import Pubkey
+from tokens import is_priced, symbol_for_mint
+from fetch_prices import get_cached_prices
+import solana_ws
+
+logger = logging.getLogger(__name__)
+
+RPC_URL = os.environ.get("RPC_URL") or "https://api.mainnet-beta.solana.com"
+
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_2022_PROGRAM_ID = "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"
+
+PORTFOLIO_TTL = 10  # seconds
+WATCHED_PORTFOLIO_TTL = 120  # wallets whose SOL and token accounts are all subscribed are invalidated by push
+MAX_WATCHED_WALLETS = 200    # three subscriptions each
+STABLECOINS = {"USDC", "USDT"}  # valued at $1 when no cached price exists
+
+# --- Per-wallet cache: {address: (portfolio, fetched_at)} ---
+_portfolio_cache = {}
+# --- In-flight fetches, so concurrent presses share one round of RPC calls ---
+_inflight = {}
+# --- Bumped on invalidation so a fetch started before a swap is never cached ---
+_generation = {}
+# --- Wallets with account + token subscriptions, oldest access first: {address: last_access} ---
+_watched = {}
+# --- Running _watch tasks (kept referenced so they are not garbage collected) ---
+_watch_tasks = set()
+
+def _price_symbol(symbol: str) -> str | None:
+    key = symbol.lower()
+    return key if is_priced(key) else None
+
+async def _fetch_token_accounts(client: AsyncClient, owner: Pubkey, program_id: str):
+    opts = TokenAccountOpts(program_id=Pubkey.from_string(program_id))
+    resp = await client.get_token_accounts_by_owner_json_parsed(owner=owner, opts=opts)
+    holdings = []
+    for acc in resp.value:
+        parsed = acc.account.data.parsed
+        if not isinstance(parsed, dict):
+            continue
+        info = parsed["info"]
+        raw_amount = int(info["tokenAmount"]["amount"])
+        if raw_amount <= 0:
+            continue
+        decimals = int(info["tokenAmount"]["decimals"])
+        holdings.append((info["mint"], raw_amount / (10 ** decimals)))
+    return holdings
+
+async def _fetch_portfolio(address: str) -> dict:
+    owner = Pubkey.from_string(address)
+    async with AsyncClient(RPC_URL) as client:
+        sol_resp, spl, spl_2022 = await asyncio.gather(
+            client.get_balance(owner),
+            _fetch_token_accounts(client, owner, TOKEN_PROGRAM_ID),
+            _fetch_token_accounts(client, owner, TOKEN_2022_PROGRAM_ID),
+        )
+
+    solana_ws.note_lamports(address, sol_resp.value, sol_resp.context.slot)
+    sol = sol_resp.value / 1_000_000_000
+    tokens = []
+    for mint, amount in spl + spl_2022:
+        symbol = symbol_for_mint(mint)
+        symbol = symbol.upper() if symbol else None
+        tokens.append({"mint": mint, "symbol": symbol, "amount": amount})
+
+    # One bulk read of the price cache for SOL and every held token
+    wanted = {"sol"}
+    for token in tokens:
+        if token["symbol"] and _price_symbol(token["symbol"]):
+            wanted.add(_price_symbol(token["symbol"]))
+    prices = get_cached_prices(wanted)
+
+    sol_price = prices.get("sol")
+    sol_usd = sol * sol_price if sol_price is not None else None
+    total_usd = sol_usd or 0.0
+    for token in tokens:
+        price = None
+        if token["symbol"]:
+            price = prices.get(_price_symbol(token["symbol"]) or "")
+            if price is None and token["symbol"] in STABLECOINS:
+                price = 1.0
+        token["usd"] = token["amount"] * price if price is not None else None
+        total_usd += token["usd"] or 0.0
+
+    tokens.sort(key=lambda t: t["usd"] or 0.0, reverse=True)
+    return {
+        "address": address,
+        "sol": sol,
+        "sol_usd": sol_usd,
+        "tokens": tokens,
+        "total_usd": total_usd,
+        "fetched_at": time.time(),
+    }
+
+def _on_account_change(address, value):
+    invalidate_portfolio(address)
+
+def _is_push_fresh(address: str) -> bool:
+    """SOL balance and both token programs' accounts are all pushed for this wallet."""
+    return solana_ws.is_watched(address) and all(
+        solana_ws.is_watching_tokens(address, program_id) for program_id in (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID)
+    )
+
+async def _unwatch(address: str):
+    await solana_ws.unwatch_account(address, _on_account_change)
+    for program_id in (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID):
+        await solana_ws.unwatch_token_accounts(address, program_id, _on_account_change)
+
+async def _watch(address: str):
+    _watched[address] = time.time()
+    ok = await solana_ws.watch_account(address, _on_account_change)
+    if ok:
+        ok = all(await asyncio.gather(*(
+            solana_ws.watch_token_accounts(address, program_id, _on_account_change)
+            for program_id in (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID)
+        )))
+    if not ok:
+        _watched.pop(address, None)
+        await _unwatch(address)
+        return
+    while len(_watched) > MAX_WATCHED_WALLETS:
+        oldest = min(_watched, key=_watched.get)
+        del _watched[oldest]
+        await _unwatch(oldest)
+
+def _watch_done(task):
+    _watch_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Portfolio watch failed: {task.exception()}")
+
+async def get_portfolio(address: str) -> dict:
+    """SOL + SPL (Token and Token-2022) balances with USD values, cached per wallet."""
+    cached = _portfolio_cache.get(address)
+    ttl = WATCHED_PORTFOLIO_TTL if _is_push_fresh(address) else PORTFOLIO_TTL
+    if cached and time.time() - cached[1] < ttl:
+        _watched[address] = time.time()
+        return cached[0]
+
+    generation = _generation.get(address, 0)
+    task = _inflight.get(address)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_portfolio(address))
+        _inflight[address] = task
+    try:
+        portfolio = await task
+    finally:
+        if _inflight.get(address) is task:
+            del _inflight[address]
+
+    if _generation.get(address, 0) == generation:
+        _portfolio_cache[address] = (portfolio, portfolio["fetched_at"])
+    if address not in _watched:
+        task = asyncio.ensure_future(_watch(address))
+        _watch_tasks.add(task)
+        task.add_done_callback(_watch_done)
+    else:
+        _watched[address] = time.time()
+    return portfolio
+
+def invalidate_portfolio(address: str | None):
+    """Drop the cached portfolio, e.g. after a swap or withdrawal."""
+    if address:
+        _portfolio_cache.pop(address, None)
+        _inflight.pop(address, None)
+        _generation[address] = _generation.get(address, 0) + 1
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import statistics
+import time
+import circuit
+import tokens
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# Price providers behind one interface. Each provider's latency and error rate
+# are tracked (score()), and every symbol is routed to the best-scoring healthy
+# provider that covers it, so a round is one concurrent hop with one request per
+# provider in use. Other providers are asked only for misses and for quotes that
+# jump more than DISPUTE_PCT from the last price; their quotes are then cleaned
+# of outliers and reduced to a median.
+#
+# A provider is {"fetch": coroutine(symbols) -> {symbol: price}, "batch": bool,
+# "covers": symbol -> bool}.
+# Batch providers answer any number of symbols in one request. Per-symbol
+# providers (DexScreener) are asked only for symbols no batch provider covers, or
+# to settle a dispute - never as a fallback for a batch provider that is down.
+#
+# Availability is left to the circuit breakers in circuit.py: a provider whose
+# breaker is open is not asked, and DexScreener pairs that keep returning
+# nothing are negative-cached instead of being requested every round.
+
+COINGECKO_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+BINANCE_TICKER_URL = "https://api.binance.com/api/v3/ticker/price"
+COINGECKO_MAX_IDS = 250       # ids per /simple/price request
+COINGECKO_MAX_URL = 2000      # conservative URL length limit for proxies/CDNs
+DEX_CONCURRENCY = 10
+
+OUTLIER_PCT = 3.0          # quotes further than this from the median are dropped
+DISPUTE_PCT = 10.0         # a lone quote this far from the last price gets a second opinion
+HEALTH_DECAY = 0.2         # weight of the newest sample in latency/error averages
+UNHEALTHY_ERROR_RATE = 0.5
+PAIR_PENALTY_LIMIT = 0.5   # a source that is usually the outlier for a symbol stops being asked for it
+PAIR_RECOVERY = 0.98       # per round, so a muted pair gets re-checked every few rounds
+
+# --- Providers ---
+def pack_ids(ids, max_ids=COINGECKO_MAX_IDS, max_url=COINGECKO_MAX_URL):
+    """Split ids into as few query strings as the id and URL limits allow."""
+    budget = max_url - len(COINGECKO_PRICE_URL) - len("?ids=&vs_currencies=usd")
+    chunks, chunk, length = [], [], 0
+    for token_id in ids:
+        cost = len(token_id) + (3 if chunk else 0)  # "," is sent as %2C
+        if chunk and (len(chunk) >= max_ids or length + cost > budget):
+            chunks.append(chunk)
+            chunk, length, cost = [], 0, len(token_id)
+        chunk.append(token_id)
+        length += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+async def fetch_coingecko(symbols):
+    ids = {tokens.coingecko_id(s): s for s in symbols if tokens.is_priced(s)}
+
+    async def fetch_chunk(chunk):
+        params = {"ids": ",".join(chunk), "vs_currencies": "usd"}
+        async with get_session().get(COINGECKO_PRICE_URL, params=params) as resp:
+            circuit.check_response("coingecko", resp)
+            return await resp.json()
+
+    data = {}
+    for part in await asyncio.gather(*(fetch_chunk(chunk) for chunk in pack_ids(ids))):
+        data.update(part)
+    return {symbol: data[token_id]["usd"] for token_id, symbol in ids.items() if data.get(token_id, {}).get("usd") is not None}
+
+async def fetch_binance(symbols):
+    # One call returns every ticker; USDT pairs stand in for USD. Only the
+    # registry's binance_symbol is trusted: the same ticker can be another coin.
+    async with get_session().get(BINANCE_TICKER_URL) as resp:
+        circuit.check_response("binance", resp)
+        data = await resp.json()
+    tickers = {row["symbol"]: row["price"] for row in data}
+    prices = {}
+    for symbol in symbols:
+        ticker = tokens.binance_symbol(symbol)
+        price = tickers.get(ticker) if ticker else None
+        if price is not None and float(price) > 0:
+            prices[symbol] = float(price)
+    return prices
+
+async def fetch_dexscreener(symbols):
+    semaphore = asyncio.Semaphore(DEX_CONCURRENCY)
+    prices = {}
+
+    async def fetch_one(symbol):
+        async with semaphore:
+            if circuit.is_open("dexscreener"):
+                return  # rate limited mid-round: don't keep hammering it
+            try:
+                async with get_session().get(tokens.dex_url(symbol)) as resp:
+                    circuit.check_response("dexscreener", resp)
+                    data = await resp.json()
+            except circuit.UpstreamError as e:
+                if e.status == 429 or e.status >= 500:
+                    circuit.record_failure("dexscreener", e)
+                else:
+                    circuit.mark_failed("dexscreener", symbol)
+                logger.warning(f"DexScreener error for {symbol}: {e}")
+                return
+            except Exception as e:
+                logger.warning(f"DexScreener exception for {symbol}: {e}")
+                return
+        pair = data.get("pair")
+        if pair and pair.get("priceUsd"):
+            prices[symbol] = float(pair["priceUsd"])
+            circuit.mark_ok("dexscreener", symbol)
+        else:
+            circuit.mark_failed("dexscreener", symbol)  # pair gone or no data: stop asking for a while
+
+    await asyncio.gather(*(fetch_one(symbol) for symbol in symbols if tokens.dex_url(symbol)))
+    return prices
+
+PRICE_SOURCES = {
+    "coingecko": {"fetch": fetch_coingecko, "batch": True, "covers": tokens.is_priced},
+    "binance": {"fetch": fetch_binance, "batch": True, "covers": lambda symbol: tokens.binance_symbol(symbol) is not None},
+    "dexscreener": {"fetch": fetch_dexscreener, "batch": False, "covers": lambda symbol: tokens.dex_url(symbol) is not None and not circuit.is_suppressed("dexscreener", symbol)},
+}
+
+# --- Health: {source: {...}} and {(source, symbol): outlier rate} ---
+SOURCE_HEALTH = {}
+_pair_penalty = {}
+_missing = {}  # {batch source: symbols it was asked for and didn't return}
+_last_price = {}  # {symbol: last aggregated price}, the reference for disputes
+
+def _health(name):
+    return SOURCE_HEALTH.setdefault(name, {
+        "latency": None, "error_rate": 0.0, "requests": 0, "failures": 0, "last_error": None,
+    })
+
+def _record(name, latency, ok, error=None):
+    h = _health(name)
+    h["requests"] += 1
+    h["error_rate"] += HEALTH_DECAY * ((0.0 if ok else 1.0) - h["error_rate"])
+    if ok:
+        h["latency"] = latency if h["latency"] is None else h["latency"] + HEALTH_DECAY * (latency - h["latency"])
+    else:
+        h["failures"] += 1
+        h["last_error"] = error
+
+def is_healthy(name):
+    return _health(name)["error_rate"] < UNHEALTHY_ERROR_RATE
+
+def score(name):
+    """Lower is better: latency inflated by the recent error rate. Unmeasured sources go first."""
+    h = _health(name)
+    return (h["latency"] or 0.0) * (1.0 + 4.0 * h["error_rate"])
+
+def _pair_ok(name, symbol):
+    if not PRICE_SOURCES[name]["covers"](symbol):
+        return False
+    key = (name, symbol)
+    penalty = _pair_penalty.get(key, 0.0)
+    if penalty < PAIR_PENALTY_LIMIT:
+        return True
+    _pair_penalty[key] = penalty * PAIR_RECOVERY
+    return False
+
+# --- Routing and aggregation ---
+def _batch_covered(symbol):
+    """Some batch provider prices the symbol, whether or not it is up right now."""
+    return any(source["batch"] and source["covers"](symbol) and symbol not in _missing.get(name, ())
+               for name, source in PRICE_SOURCES.items())
+
+def plan(symbols, asked=None, verify=()):
+    """{source: [symbols]}: each symbol goes to the best-scoring source not yet asked for it.
+
+    asked: {symbol: sources already asked this round}. Symbols in verify may use
+    per-symbol providers even though a batch provider covers them.
+    """
+    asked = asked or {}
+    ranked = sorted((name for name, source in PRICE_SOURCES.items() if source["batch"] and not circuit.is_open(name)),
+                    key=lambda name: (not is_healthy(name), score(name)))
+    per_symbol = [name for name, source in PRICE_SOURCES.items() if not source["batch"] and not circuit.is_open(name)]
+    routes = {}
+    for symbol in symbols:
+        done = asked.get(symbol, ())
+        route = next((name for name in ranked
+                      if name not in done and symbol not in _missing.get(name, ()) and _pair_ok(name, symbol)), None)
+        if route is None and (symbol in verify or not _batch_covered(symbol)):
+            route = next((name for name in per_symbol if name not in done and _pair_ok(name, symbol)), None)
+        if route is not None:
+            routes.setdefault(route, []).append(symbol)
+    return {name: wanted for name, wanted in routes.items() if circuit.allow(name)}
+
+def aggregate(symbol, quotes, final=True):
+    """Median of {source: price} after dropping outliers.
+
+    Two quotes that disagree have no majority: returns None unless final, in
+    which case the source listed first in PRICE_SOURCES (the trust order) wins.
+    """
+    if not quotes:
+        return None
+    if len(quotes) == 1:
+        return next(iter(quotes.values()))
+    median = statistics.median(quotes.values())
+    if median <= 0:
+        return None
+    kept = {name: p for name, p in quotes.items() if abs(p - median) / median * 100 <= OUTLIER_PCT}
+    if len(quotes) == 2 and len(kept) < 2:
+        if not final:
+            return None
+        trusted = next(name for name in PRICE_SOURCES if name in quotes)
+        kept = {trusted: quotes[trusted]}
+    for name in quotes:
+        outlier = 0.0 if name in kept else 1.0
+        key = (name, symbol)
+        _pair_penalty[key] = _pair_penalty.get(key, 0.0) + HEALTH_DECAY * (outlier - _pair_penalty.get(key, 0.0))
+    return statistics.median(kept.values())
+
+async def _ask(name, symbols):
+    started = time.monotonic()
+    try:
+        prices = await PRICE_SOURCES[name]["fetch"](symbols)
+    except Exception as e:
+        _record(name, time.monotonic() - started, False, str(e))
+        circuit.record_failure(name, e)
+        logger.warning(f"❌ Price source {name} failed: {e}")
+        return name, {}
+    _record(name, time.monotonic() - started, True)
+    if not circuit.is_open(name):
+        circuit.record_success(name)
+    if PRICE_SOURCES[name]["batch"]:
+        _missing[name] = (_missing.get(name, set()) | set(symbols)) - set(prices)
+    return name, prices
+
+async def _round(routes, quotes, asked):
+    for name, prices in await asyncio.gather(*(_ask(name, wanted) for name, wanted in routes.items())):
+        for symbol, price in prices.items():
+            quotes.setdefault(symbol, {})[name] = float(price)
+    for name, wanted in routes.items():
+        for symbol in wanted:
+            asked.setdefault(symbol, set()).add(name)
+
+def _disputed(symbol, price):
+    last = _last_price.get(symbol)
+    return last is not None and last > 0 and abs(price - last) / last * 100 > DISPUTE_PCT
+
+async def get_prices(symbols):
+    """{symbol: price}, normally in one concurrent round to the best source per symbol.
+
+    A second round asks the next source only for symbols that are still missing
+    or whose quote is disputed (a large jump, or two sources that disagree).
+    """
+    symbols = list(symbols)
+    quotes, asked = {}, {}
+    await _round(plan(symbols), quotes, asked)
+
+    prices, retry, disputed = {}, [], set()
+    for symbol in symbols:
+        by_source = quotes.get(symbol, {})
+        price = aggregate(symbol, by_source, final=False)
+        if price is not None and len(by_source) == 1 and _disputed(symbol, price):
+            price = None
+        if price is None:
+            retry.append(symbol)
+            if by_source:
+                disputed.add(symbol)
+        else:
+            prices[symbol] = price
+    second = plan(retry, asked, disputed) if retry else {}
+    if second:
+        logger.info(f"Second price round for {len(retry)} missing or disputed symbols")
+        await _round(second, quotes, asked)
+    for symbol in retry:
+        price = aggregate(symbol, quotes.get(symbol, {}))
+        if price is not None:
+            prices[symbol] = price
+    _last_price.update(prices)
+    return prices
+
+def format_health():
+    lines = ["🩺 *Price sources*"]
+    for name in PRICE_SOURCES:
+        h = _health(name)
+        latency = f"{h['latency'] * 1000:.0f}ms" if h["latency"] is not None else "-"
+        state = "ok" if is_healthy(name) else "unhealthy"
+        lines.append(f"`{name}`: {state}, {latency}, errors {h['error_rate']:.0%}, {h['failures']}/{h['requests']} failed")
+    muted = sorted(f"{name}:{symbol}" for (name, symbol), p in _pair_penalty.items() if p >= PAIR_PENALTY_LIMIT)
+    if muted:
+        lines.append("Muted pairs: " + ", ".join(muted))
+    return "\n".join(lines)
@@ -1,21 +1,10 @@
-import psycopg2
+from db import lazy_connection, lazy_cursor
 from datetime import datetime
 from fetch_prices import fetch_prices  # ✅ centralized import
 import asyncio
-import os
 
-conn = psycopg2.connect(os.environ["DATABASE_URL"])
-c = conn.cursor()
-
-# Create table for cached prices
-c.execute("""
-CREATE TABLE IF NOT EXISTS token_prices (
-    symbol TEXT PRIMARY KEY,
-    price REAL,
-    last_updated TEXT
-)
-""")
-conn.commit()
+conn = lazy_connection("price_updater")
+c = lazy_cursor("price_updater")
 
 async def update_prices_loop():
     while True:
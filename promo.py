@@ -10,7 +10,6 @@ logger = logging.getLogger(__name__)
 def get_all_users():
     conn = psycopg2.connect(os.environ["DATABASE_URL"])
     c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY)")
     c.execute("SELECT user_id FROM users")
     users = [row[0] for row in c.fetchall()]
     conn.close()
@@ -6,26 +6,6 @@ import os
 DB = "users.db"
 BONUS_MESSAGES = 250
 
-def init_referral_db():
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    # Users table: add messages and referrer_id columns if missing
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            messages INTEGER DEFAULT 0,
-            referrer_id INTEGER
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS referrals (
-            referrer_id INTEGER,
-            referred_id INTEGER PRIMARY KEY
-        )
-    """)
-    conn.commit()
-    conn.close()
-
 async def handle_referral_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
@@ -98,6 +78,5 @@ async def referral(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 def register_referral_handlers(application):
-    init_referral_db()
     application.add_handler(CommandHandler("referral", referral))
 
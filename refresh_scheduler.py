@@ -0,0 +1,129 @@
+import logging
+import sys
+import time
+from db import lazy_connection, lazy_cursor
+import tokens
+from fetch_prices import fetch_prices
+from jobs import schedule_repeating
+
+logger = logging.getLogger(__name__)
+
+# Decides which symbols to re-price on each tick, instead of refreshing the whole
+# universe on one fixed interval.
+#
+# Demand per symbol = price alerts + indicator alerts + cached wallet holdings +
+# recent /price queries (decaying). The most demanded symbols are hot, anything
+# else with demand is warm, the long tail is cold. A tick re-prices what is due
+# for its tier. Because a CoinGecko call costs the same whatever it carries, a
+# due call is topped up with symbols that are nearly due anyway (see
+# price_sources for how ids are packed into requests).
+
+TICK_SECONDS = 5
+TIER_SECONDS = {"hot": 10, "warm": 60, "cold": 300}
+HOT_MAX = 20
+TOP_UP_FRACTION = 0.8     # a symbol this far into its interval rides along with a due call
+QUERY_HALF_LIFE = 3600    # seconds for a /price query's weight to halve
+DEMAND_WEIGHTS = {"alert": 3.0, "indicator": 2.0, "holding": 2.0, "query": 1.0}
+TIERS_REFRESH_SECONDS = 60
+CARRY_FORWARD_SECONDS = 60
+
+conn = lazy_connection("refresh_scheduler")
+c = lazy_cursor("refresh_scheduler")
+
+_queries = {}         # {symbol: (weight, as_of)}
+_last_refresh = {}    # {symbol: ts of the last attempt}
+_latest = {}          # {symbol: last price seen}
+_tiers = {}           # {symbol: tier}
+_tiers_at = 0.0
+_carried_at = 0.0
+
+# --- Demand ---
+def note_query(symbol):
+    """Count an on-demand lookup (e.g. /price) toward the symbol's demand."""
+    symbol = symbol.lower()
+    now = time.time()
+    weight, as_of = _queries.get(symbol, (0.0, now))
+    _queries[symbol] = (weight * 0.5 ** ((now - as_of) / QUERY_HALF_LIFE) + 1.0, now)
+    if _tiers.get(symbol) == "cold":
+        _tiers[symbol] = "warm"  # don't wait for the next tier pass
+
+def _standing_demand():
+    demand = {}
+    for table, kind in (("alerts", "alert"), ("indicator_alerts", "indicator")):
+        c.execute(f"SELECT LOWER(symbol), COUNT(*) FROM {table} GROUP BY LOWER(symbol)")
+        for symbol, count in c.fetchall():
+            demand[symbol] = demand.get(symbol, 0.0) + DEMAND_WEIGHTS[kind] * count
+    conn.commit()
+    # Only portfolios already cached by /balance; never an RPC call from here
+    portfolio = sys.modules.get("portfolio")
+    if portfolio is not None:
+        for cached, _ in list(portfolio._portfolio_cache.values()):
+            held = {"sol"} | {t["symbol"].lower() for t in cached["tokens"] if t["symbol"]}
+            for symbol in held:
+                demand[symbol] = demand.get(symbol, 0.0) + DEMAND_WEIGHTS["holding"]
+    return demand
+
+def compute_tiers(now=None):
+    global _tiers_at
+    now = time.time() if now is None else now
+    demand = _standing_demand()
+    for symbol, (weight, as_of) in _queries.items():
+        demand[symbol] = demand.get(symbol, 0.0) + DEMAND_WEIGHTS["query"] * weight * 0.5 ** ((now - as_of) / QUERY_HALF_LIFE)
+    wanted = [s for s in tokens.symbols() if demand.get(s, 0.0) > 0.05]
+    hot = set(sorted(wanted, key=lambda s: -demand[s])[:HOT_MAX])
+    _tiers.clear()
+    for symbol in tokens.symbols():
+        _tiers[symbol] = "hot" if symbol in hot else "warm" if symbol in wanted else "cold"
+    _tiers_at = now
+    return demand
+
+def _interval(symbol):
+    return TIER_SECONDS[_tiers.get(symbol, "cold")]
+
+def due_symbols(now=None):
+    """Symbols to re-price now: the due ones, topped up when a call goes out anyway."""
+    now = time.time() if now is None else now
+    progress = {s: (now - _last_refresh.get(s, 0.0)) / _interval(s) for s in tokens.symbols()}
+    due = [s for s, p in progress.items() if p >= 1.0]
+    if not due:
+        return []
+    ride_along = [s for s, p in progress.items() if TOP_UP_FRACTION <= p < 1.0]
+    return due + sorted(ride_along, key=lambda s: -progress[s])
+
+# --- Job ---
+async def price_refresh_job(context):
+    global _carried_at
+    now = time.time()
+    if now - _tiers_at >= TIERS_REFRESH_SECONDS:
+        try:
+            compute_tiers(now)
+        except Exception as e:
+            logger.warning(f"Refresh tiers not updated: {e}")
+
+    symbols = due_symbols(now)
+    if symbols:
+        for symbol in symbols:
+            _last_refresh[symbol] = now  # attempted; a failing symbol waits a full interval
+        _latest.update(await fetch_prices(symbols, max_age=None))
+
+    # The in-memory history wants a value per symbol every minute; slow tiers carry
+    # their last price forward so move detection and indicators never see gaps
+    if now - _carried_at >= CARRY_FORWARD_SECONDS:
+        import timeseries
+        timeseries.record({s: p for s, p in _latest.items() if now - _last_refresh.get(s, 0.0) >= CARRY_FORWARD_SECONDS}, now)
+        _carried_at = now
+
+def format_tiers():
+    counts = {tier: 0 for tier in TIER_SECONDS}
+    for tier in _tiers.values():
+        counts[tier] += 1
+    hot = sorted(s for s, tier in _tiers.items() if tier == "hot")
+    lines = ["🔥 *Refresh tiers*"]
+    for tier, seconds in TIER_SECONDS.items():
+        lines.append(f"{tier}: {counts[tier]} symbols every {seconds}s")
+    if hot:
+        lines.append("Hot: " + ", ".join(s.upper() for s in hot))
+    return "\n".join(lines)
+
+def register_refresh_jobs(application):
+    schedule_repeating(application, "price_refresh", price_refresh_job, interval=TICK_SECONDS, first=5)
@@ -0,0 +1,336 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import websockets
+from solders.signature import Signature
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+def _default_ws_url():
+    rpc_url = os.environ.get("RPC_URL") or "https://api.mainnet-beta.solana.com"
+    if rpc_url.startswith("https://"):
+        return "wss://" + rpc_url[len("https://"):]
+    if rpc_url.startswith("http://"):
+        return "ws://" + rpc_url[len("http://"):]
+    return rpc_url
+
+WS_URL = os.environ.get("RPC_WS_URL") or _default_ws_url()
+MAX_CONNECTIONS = 4
+MAX_SUBSCRIPTIONS_PER_CONNECTION = 200
+REQUEST_TIMEOUT = 10  # seconds to wait for a subscribe/unsubscribe reply
+RECONNECT_MAX_DELAY = 30
+
+_request_ids = itertools.count(1)
+
+class _Connection:
+    """One websocket carrying many account/signature subscriptions."""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.pending = {}        # request id -> Future(subscription id)
+        self.handlers = {}       # subscription id -> key
+        self.subscriptions = {}  # key -> (method, params, subscription id or None)
+        self.ready = asyncio.Event()
+        self.task = None
+
+    def load(self):
+        return len(self.subscriptions)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.ws:
+            await self.ws.close()
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, max_size=2 ** 22) as ws:
+                    self.ws = ws
+                    delay = 1
+                    reader = asyncio.create_task(self._read(ws))
+                    # Re-establish everything that was live before a reconnect
+                    for key, (method, params, _) in list(self.subscriptions.items()):
+                        asyncio.create_task(self._subscribe(key, method, params))
+                    self.ready.set()
+                    await reader
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Solana websocket error ({self.url}): {e}")
+            self.ready.clear()
+            self.ws = None
+            self.handlers.clear()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("websocket closed"))
+            self.pending.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _read(self, ws):
+        async for raw in ws:
+            msg = json.loads(raw)
+            if "id" in msg:
+                future = self.pending.pop(msg["id"], None)
+                if future and not future.done():
+                    if "error" in msg:
+                        future.set_exception(RuntimeError(msg["error"].get("message", msg["error"])))
+                    else:
+                        future.set_result(msg.get("result"))
+                continue
+            params = msg.get("params") or {}
+            key = self.handlers.get(params.get("subscription"))
+            if key is not None:
+                _dispatch(key, params.get("result") or {})
+
+    async def _request(self, method, params):
+        await asyncio.wait_for(self.ready.wait(), REQUEST_TIMEOUT)
+        request_id = next(_request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        await self.ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+        return await asyncio.wait_for(future, REQUEST_TIMEOUT)
+
+    async def _subscribe(self, key, method, params):
+        self.subscriptions[key] = (method, params, None)
+        sub_id = await self._request(method, params)
+        if key in self.subscriptions:
+            self.subscriptions[key] = (method, params, sub_id)
+            self.handlers[sub_id] = key
+        return sub_id
+
+    async def subscribe(self, key, method, params):
+        return await self._subscribe(key, method, params)
+
+    async def unsubscribe(self, key):
+        method, _, sub_id = self.subscriptions.pop(key, (None, None, None))
+        if sub_id is None:
+            return
+        self.handlers.pop(sub_id, None)
+        if self.ws is not None:
+            try:
+                await self._request(method.replace("Subscribe", "Unsubscribe"), [sub_id])
+            except Exception as e:
+                logger.debug(f"Unsubscribe {key} failed: {e}")
+
+    def forget(self, key):
+        """Drop a one-shot subscription the server already removed."""
+        _, _, sub_id = self.subscriptions.pop(key, (None, None, None))
+        self.handlers.pop(sub_id, None)
+
+# --- Shared state ---
+_connections = []
+_owners = {}            # key -> _Connection
+_account_watchers = {}  # address -> set(callbacks)
+_account_state = {}     # address -> (slot, lamports), newest slot wins
+_token_watchers = {}    # (program_id, owner) -> set(callbacks)
+_signature_waiters = {} # signature -> Future(result dict)
+
+def _pick_connection():
+    live = [conn for conn in _connections if conn.load() < MAX_SUBSCRIPTIONS_PER_CONNECTION]
+    if live:
+        return min(live, key=lambda conn: conn.load())
+    if len(_connections) < MAX_CONNECTIONS:
+        conn = _Connection(WS_URL)
+        conn.start()
+        _connections.append(conn)
+        return conn
+    return min(_connections, key=lambda conn: conn.load())
+
+def _dispatch(key, result):
+    kind, target = key
+    if kind == "account":
+        slot = (result.get("context") or {}).get("slot", 0)
+        value = result.get("value") or {}
+        if "lamports" in value:
+            note_lamports(target, value["lamports"], slot)
+        for callback in list(_account_watchers.get(target, ())):
+            try:
+                callback(target, value)
+            except Exception as e:
+                logger.error(f"Account watcher for {target} failed: {e}")
+    elif kind == "token":
+        for callback in list(_token_watchers.get(target, ())):
+            try:
+                callback(target[1], result.get("value") or {})
+            except Exception as e:
+                logger.error(f"Token account watcher for {target[1]} failed: {e}")
+    elif kind == "signature":
+        conn = _owners.pop(key, None)
+        if conn:
+            conn.forget(key)
+        future = _signature_waiters.pop(target, None)
+        if future and not future.done():
+            future.set_result(result.get("value") or {})
+
+# --- Account subscriptions ---
+def note_lamports(address: str, lamports: int, slot: int = 0):
+    """Record a balance observation; an older slot never overwrites a newer one."""
+    current = _account_state.get(address)
+    if current is None or slot >= current[0]:
+        _account_state[address] = (slot, lamports)
+
+def get_lamports(address: str) -> int | None:
+    """Last pushed/observed SOL balance of a watched account, or None."""
+    if address not in _account_watchers:
+        return None
+    state = _account_state.get(address)
+    return state[1] if state else None
+
+async def watch_account(address: str, callback) -> bool:
+    """Call callback(address, value) on every change of the account. Returns False if unavailable."""
+    watchers = _account_watchers.setdefault(address, set())
+    watchers.add(callback)
+    key = ("account", address)
+    if key in _owners:
+        return True
+    conn = _pick_connection()
+    _owners[key] = conn
+    try:
+        await conn.subscribe(key, "accountSubscribe", [address, {"encoding": "base64", "commitment": "confirmed"}])
+        return True
+    except Exception as e:
+        logger.warning(f"accountSubscribe failed for {address}: {e}")
+        _owners.pop(key, None)
+        conn.forget(key)
+        _account_watchers.pop(address, None)
+        return False
+
+async def unwatch_account(address: str, callback=None):
+    watchers = _account_watchers.get(address)
+    if watchers is not None and callback is not None:
+        watchers.discard(callback)
+        if watchers:
+            return
+    _account_watchers.pop(address, None)
+    _account_state.pop(address, None)
+    conn = _owners.pop(("account", address), None)
+    if conn:
+        await conn.unsubscribe(("account", address))
+
+def is_watched(address: str) -> bool:
+    return ("account", address) in _owners
+
+# --- Token account subscriptions (SPL Token and Token-2022) ---
+TOKEN_OWNER_OFFSET = 32  # owner pubkey in the token account layout, same for both programs
+
+async def watch_token_accounts(owner: str, program_id: str, callback) -> bool:
+    """Call callback(owner, value) when any of owner's token accounts under program_id changes."""
+    target = (program_id, owner)
+    _token_watchers.setdefault(target, set()).add(callback)
+    key = ("token", target)
+    if key in _owners:
+        return True
+    conn = _pick_connection()
+    _owners[key] = conn
+    params = [program_id, {
+        "encoding": "base64",
+        "commitment": "confirmed",
+        "filters": [{"memcmp": {"offset": TOKEN_OWNER_OFFSET, "bytes": owner}}],
+    }]
+    try:
+        await conn.subscribe(key, "programSubscribe", params)
+        return True
+    except Exception as e:
+        logger.warning(f"programSubscribe failed for {owner}: {e}")
+        _owners.pop(key, None)
+        conn.forget(key)
+        _token_watchers.pop(target, None)
+        return False
+
+async def unwatch_token_accounts(owner: str, program_id: str, callback=None):
+    target = (program_id, owner)
+    watchers = _token_watchers.get(target)
+    if watchers is not None and callback is not None:
+        watchers.discard(callback)
+        if watchers:
+            return
+    _token_watchers.pop(target, None)
+    conn = _owners.pop(("token", target), None)
+    if conn:
+        await conn.unsubscribe(("token", target))
+
+def is_watching_tokens(owner: str, program_id: str) -> bool:
+    return ("token", (program_id, owner)) in _owners
+
+# --- Signature subscriptions ---
+async def wait_for_signature(signature: str, timeout: float = 60, commitment: str = "confirmed") -> dict:
+    """Resolve when the cluster pushes a status for the signature. Raises TimeoutError."""
+    signature = str(signature)
+    future = _signature_waiters.get(signature)
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        _signature_waiters[signature] = future
+        key = ("signature", signature)
+        conn = _pick_connection()
+        _owners[key] = conn
+        try:
+            await conn.subscribe(key, "signatureSubscribe", [signature, {"commitment": commitment}])
+        except Exception:
+            _owners.pop(key, None)
+            conn.forget(key)
+            _signature_waiters.pop(signature, None)
+            raise
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        await cancel_signature_wait(signature)
+        raise
+
+async def cancel_signature_wait(signature: str):
+    """Drop the push subscription for a signature nobody waits on any more."""
+    signature = str(signature)
+    _signature_waiters.pop(signature, None)
+    conn = _owners.pop(("signature", signature), None)
+    if conn:
+        await conn.unsubscribe(("signature", signature))
+
+_COMMITMENT_RANKS = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+def commitment_rank(value) -> int:
+    """Rank 'confirmed' and TransactionConfirmationStatus.Confirmed alike; unknown is -1."""
+    if value is None:
+        return -1
+    return _COMMITMENT_RANKS.get(str(value).rsplit(".", 1)[-1].lower(), -1)
+
+async def confirm_signature(client, signature, commitment: str = "confirmed", timeout: float = 60):
+    """Wait for a transaction by push, falling back to RPC polling if the websocket is unavailable."""
+    sig_str = str(signature)
+    sig_obj = signature if isinstance(signature, Signature) else Signature.from_string(sig_str)
+    waiter = asyncio.create_task(wait_for_signature(sig_str, timeout, commitment))
+    try:
+        # The transaction may already have landed before the subscription was active
+        statuses = await client.get_signature_statuses([sig_obj])
+        status = statuses.value[0]
+        if status is not None and status.err is not None:
+            raise Exception(f"❌ Transaction {sig_str} failed: {status.err}")
+        if status is not None and commitment_rank(status.confirmation_status) >= commitment_rank(commitment):
+            return
+        result = await waiter
+        if result.get("err"):
+            raise Exception(f"❌ Transaction {sig_str} failed: {result['err']}")
+    except (asyncio.TimeoutError, ConnectionError, OSError, RuntimeError, websockets.exceptions.WebSocketException) as e:
+        logger.warning(f"Push confirmation unavailable for {sig_str} ({e!r}), polling instead")
+        await client.confirm_transaction(sig_obj, commitment=commitment)
+    finally:
+        if waiter.done():
+            if not waiter.cancelled():
+                waiter.exception()  # mark retrieved
+        else:
+            waiter.cancel()
+            await cancel_signature_wait(sig_str)
+
+async def stop():
+    for conn in _connections:
+        await conn.close()
+    _connections.clear()
+    _owners.clear()
@@ -18,6 +18,9 @@ from spl.token.async_client import AsyncToken
 from wallet import decrypt_private_key, get_encrypted_key, load_keypair
 from fee import create_fee_instruction
 from limits import check_access
+from portfolio import invalidate_portfolio
+import solana_ws
+import chain_state
 import os
 
 # Set up logging
@@ -43,7 +46,7 @@ if not TX_API:
 else:
     print("i have TX_API")
 
-SYSTEM_SOL = "So11111111111111111111111111111111111111112"
+from tokens import SYSTEM_SOL
 MINIMUM_SOL_BALANCE = 0.005  # Estimated transaction fees
 
 # --- Fetch Token Decimals ---
@@ -66,8 +69,12 @@ def deserialize_transaction_b64(b64_tx: str) -> VersionedTransaction:
 
 # --- Check Wallet Balance ---
 async def check_balance(client: AsyncClient, public_key: str) -> float:
+    pushed = solana_ws.get_lamports(public_key)
+    if pushed is not None:
+        return pushed / 1e9
     try:
         response = await client.get_balance(Pubkey.from_string(public_key))
+        solana_ws.note_lamports(public_key, response.value, response.context.slot)
         return response.value / 1e9
     except Exception as e:
         raise Exception(f"❌ Failed to check balance: {e}")
@@ -101,8 +108,7 @@ async def create_token_account(client: AsyncClient, payer: Keypair, owner: Pubke
     if account_info.value is None:
         logger.info(f"Creating ATA for mint {mint} at {ata}")
         try:
-            blockhash_resp = await client.get_latest_blockhash()
-            recent_blockhash = blockhash_resp.value.blockhash
+            recent_blockhash, _ = await chain_state.get_blockhash(client)
             logger.info(f"Using blockhash: {recent_blockhash}")
 
             instruction = create_associated_token_account(payer.pubkey(), owner, Pubkey.from_string(mint))
@@ -112,7 +118,7 @@ async def create_token_account(client: AsyncClient, payer: Keypair, owner: Pubke
 
             txid = await client.send_transaction(tx, opts=TxOpts(skip_preflight=True))
             logger.info(f"ATA creation transaction sent: {txid.value}")
-            await client.confirm_transaction(txid.value, commitment="finalized")
+            await solana_ws.confirm_signature(client, txid.value, commitment="finalized")
             logger.info(f"Created token account for {mint}: {ata}")
 
             sleep(1)
@@ -210,8 +216,12 @@ async def perform_swap(user_id: int, input_mint: str, output_mint: str, amount:
             "userPublicKey": public_key,
             "quoteResponse": quote_data,
             "dynamicComputeUnitLimit": True,
-            "prioritizationFeeLamports": "auto"
         }
+        priority_fee = chain_state.get_priority_fee()
+        if priority_fee is not None:
+            tx_payload["computeUnitPriceMicroLamports"] = priority_fee
+        else:
+            tx_payload["prioritizationFeeLamports"] = "auto"
         logger.info(f"Transaction Payload: {tx_payload}")
 
         try:
@@ -251,10 +261,11 @@ async def perform_swap(user_id: int, input_mint: str, output_mint: str, amount:
             raw_tx = bytes(tx)
             txid = await client.send_raw_transaction(raw_tx, opts=TxOpts(skip_preflight=True, max_retries=3))
             logger.info(f"Transaction ID: {txid.value}")
-            await client.confirm_transaction(txid.value, commitment="confirmed")
+            await solana_ws.confirm_signature(client, txid.value, commitment="confirmed")
             return str(txid.value)
 
         result = await send_transaction_with_retry(client, signed_tx)
+        invalidate_portfolio(public_key)
         return f"✅ Swap submitted: https://solscan.io/tx/{result}"
     except Exception as e:
         logger.error(f"Swap failed: {e}")
@@ -0,0 +1,220 @@
+import logging
+import math
+import time
+import numpy as np
+import tokens
+
+logger = logging.getLogger(__name__)
+
+# In-memory price history for every priced token, filled by fetch_prices.
+#
+# Each tier is a ring of fixed-width time buckets shared by all symbols: one
+# float64 column per bucket (NaN where a symbol had no tick) and one int64
+# bucket timestamp per column. Because every symbol lives at the same column
+# for a given time, "all prices N minutes ago" is a single column read, and
+# window min/max come from per-tier segment trees updated for all symbols at
+# once. Memory is allocated up front (see memory_bytes()) and only grows when a
+# token registry reload adds symbols: they get new rows at the end, existing
+# indexes never move, and symbols dropped from the registry keep their row.
+
+SYMBOL_LIST = list(tokens.symbols())  # grown in place by sync_symbols()
+SYMBOL_INDEX = {symbol: i for i, symbol in enumerate(SYMBOL_LIST)}
+_version = tokens.version()
+
+def pad_symbols(array, n, fill, axis=-1):
+    """array with its symbol axis padded to n entries of fill."""
+    missing = n - array.shape[axis]
+    if missing <= 0:
+        return array
+    shape = list(array.shape)
+    shape[axis] = missing
+    return np.concatenate([array, np.full(shape, fill, dtype=array.dtype)], axis=axis)
+
+# (bucket seconds, number of buckets): 24h at 1m, 8 days at 1h
+TIERS = [(60, 24 * 60), (3600, 8 * 24)]
+LOOKUP_TOLERANCE = 2  # buckets to step back when the exact bucket had no tick
+
+class _Ring:
+    def __init__(self, resolution, capacity, n_symbols):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.size = 1 << math.ceil(math.log2(capacity))
+        self.close = np.full((n_symbols, capacity), np.nan)
+        self.bucket = np.full(capacity, -1, dtype=np.int64)
+        # Segment trees over the ring columns; leaves hold the bucket's low/high
+        self.low = np.full((n_symbols, 2 * self.size), np.inf)
+        self.high = np.full((n_symbols, 2 * self.size), -np.inf)
+        self.last_bucket = None
+
+    def grow(self, n_symbols):
+        self.close = pad_symbols(self.close, n_symbols, np.nan, axis=0)
+        self.low = pad_symbols(self.low, n_symbols, np.inf, axis=0)
+        self.high = pad_symbols(self.high, n_symbols, -np.inf, axis=0)
+
+    def nbytes(self):
+        return self.close.nbytes + self.bucket.nbytes + self.low.nbytes + self.high.nbytes
+
+    def _clear(self, slots):
+        self.close[:, slots] = np.nan
+        self.bucket[slots] = -1
+        self.low[:, self.size + slots] = np.inf
+        self.high[:, self.size + slots] = -np.inf
+
+    def _rebuild(self):
+        for level_start in (self.size >> k for k in range(1, int(math.log2(self.size)) + 1)):
+            nodes = np.arange(level_start, 2 * level_start)
+            self.low[:, nodes] = np.minimum(self.low[:, 2 * nodes], self.low[:, 2 * nodes + 1])
+            self.high[:, nodes] = np.maximum(self.high[:, 2 * nodes], self.high[:, 2 * nodes + 1])
+
+    def write(self, ts, values):
+        """values: float64 vector over SYMBOL_LIST, NaN for symbols without a tick."""
+        bucket = int(ts) // self.resolution
+        if self.last_bucket is not None and bucket < self.last_bucket:
+            return  # late tick for a bucket we've moved past
+        if self.last_bucket is not None and bucket - self.last_bucket > 1:
+            # Drop buckets that were skipped, otherwise their slots keep data from a lap ago
+            gap = min(bucket - self.last_bucket - 1, self.capacity)
+            self._clear(np.arange(self.last_bucket + 1, self.last_bucket + 1 + gap) % self.capacity)
+            self._rebuild()
+
+        slot = bucket % self.capacity
+        leaf = self.size + slot
+        has = ~np.isnan(values)
+        if self.bucket[slot] != bucket:
+            self.bucket[slot] = bucket
+            self.close[:, slot] = values
+            self.low[:, leaf] = np.where(has, values, np.inf)
+            self.high[:, leaf] = np.where(has, values, -np.inf)
+        else:
+            self.close[has, slot] = values[has]
+            self.low[has, leaf] = np.minimum(self.low[has, leaf], values[has])
+            self.high[has, leaf] = np.maximum(self.high[has, leaf], values[has])
+        self.last_bucket = bucket
+
+        node = leaf >> 1
+        while node:
+            self.low[:, node] = np.minimum(self.low[:, 2 * node], self.low[:, 2 * node + 1])
+            self.high[:, node] = np.maximum(self.high[:, 2 * node], self.high[:, 2 * node + 1])
+            node >>= 1
+
+    def at(self, ts):
+        """Close of the bucket containing ts for every symbol (NaN if unknown)."""
+        bucket = int(ts) // self.resolution
+        result = np.full(self.close.shape[0], np.nan)
+        for back in range(LOOKUP_TOLERANCE + 1):
+            b = bucket - back
+            slot = b % self.capacity
+            if self.bucket[slot] == b:
+                column = self.close[:, slot]
+                missing = np.isnan(result)
+                result[missing] = column[missing]
+                if not np.isnan(result).any():
+                    break
+        return result
+
+    def _query(self, tree, op, fill, lo, hi):
+        result = np.full(tree.shape[0], fill)
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                result = op(result, tree[:, lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = op(result, tree[:, hi])
+            lo >>= 1
+            hi >>= 1
+        return result
+
+    def extremes(self, start_ts, end_ts):
+        """(low, high) vectors over buckets covering [start_ts, end_ts]; O(log capacity)."""
+        low = np.full(self.low.shape[0], np.inf)
+        high = np.full(self.high.shape[0], -np.inf)
+        # Slots past the last write still hold data from a lap ago (cleared on the next write)
+        last = int(end_ts) // self.resolution
+        if self.last_bucket is not None:
+            last = min(last, self.last_bucket)
+        first = max(int(start_ts) // self.resolution, last - self.capacity + 1)
+        if first > last:
+            ranges = []
+        else:
+            lo, hi = first % self.capacity, last % self.capacity + 1
+            ranges = [(lo, hi)] if lo < hi else [(lo, self.capacity), (0, hi)]
+        for a, b in ranges:
+            low = np.minimum(low, self._query(self.low, np.minimum, np.inf, a, b))
+            high = np.maximum(high, self._query(self.high, np.maximum, -np.inf, a, b))
+        low[np.isinf(low)] = np.nan
+        high[np.isinf(high)] = np.nan
+        return low, high
+
+_tiers = [_Ring(resolution, capacity, len(SYMBOL_LIST)) for resolution, capacity in TIERS]
+
+def _tier_for(seconds):
+    """Finest tier whose ring still covers `seconds` of history."""
+    for ring in _tiers:
+        if seconds < ring.resolution * (ring.capacity - LOOKUP_TOLERANCE):
+            return ring
+    return _tiers[-1]
+
+def sync_symbols():
+    """Add rows for symbols a registry reload added since the last call."""
+    global _version
+    if tokens.version() == _version:
+        return
+    _version = tokens.version()
+    added = [symbol for symbol in tokens.symbols() if symbol not in SYMBOL_INDEX]
+    if not added:
+        return
+    for symbol in added:
+        SYMBOL_INDEX[symbol] = len(SYMBOL_LIST)
+        SYMBOL_LIST.append(symbol)
+    for ring in _tiers:
+        ring.grow(len(SYMBOL_LIST))
+    logger.info(f"Price history now tracks {len(SYMBOL_LIST)} symbols (+{', '.join(added)})")
+
+# --- Producer ---
+def record(prices: dict, ts=None):
+    """Store {symbol: price} observed at ts (default now) in every tier."""
+    sync_symbols()
+    ts = time.time() if ts is None else ts
+    values = np.full(len(SYMBOL_LIST), np.nan)
+    for symbol, price in prices.items():
+        i = SYMBOL_INDEX.get(symbol)
+        if i is not None and price is not None:
+            values[i] = float(price)
+    for ring in _tiers:
+        ring.write(ts, values)
+
+# --- Queries: vectors are aligned with SYMBOL_LIST ---
+def latest_prices():
+    return prices_ago(0)
+
+def prices_ago(seconds, now=None):
+    now = time.time() if now is None else now
+    return prices_at(now - seconds, now)
+
+def prices_at(ts, now=None):
+    """Prices in the bucket containing ts, from the finest tier that still holds it."""
+    now = time.time() if now is None else now
+    return _tier_for(now - ts).at(ts)
+
+def price_ago(symbol, seconds, now=None):
+    value = prices_ago(seconds, now)[SYMBOL_INDEX[symbol]]
+    return None if np.isnan(value) else float(value)
+
+def window_extremes(seconds, now=None):
+    """(low, high) vectors over the last `seconds`."""
+    now = time.time() if now is None else now
+    return _tier_for(seconds).extremes(now - seconds, now)
+
+def window_min(symbol, seconds, now=None):
+    value = window_extremes(seconds, now)[0][SYMBOL_INDEX[symbol]]
+    return None if np.isnan(value) else float(value)
+
+def window_max(symbol, seconds, now=None):
+    value = window_extremes(seconds, now)[1][SYMBOL_INDEX[symbol]]
+    return None if np.isnan(value) else float(value)
+
+def memory_bytes():
+    return sum(ring.nbytes() for ring in _tiers)
@@ -1,44 +1,128 @@
 # tokens.py
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# The one token registry: symbol <-> CoinGecko id <-> Binance ticker <-> Solana
+# mint <-> DEX pair, loaded from tokens.json. binance_symbol is set only where
+# the Binance spot pair was checked to be the same asset, never derived. Symbols are lower-case everywhere; show them with
+# .upper(). Tokens with a coingecko_id make up the priced universe (symbols()).
+#
+# The file is re-read when it changes (reload(), run by the token_registry job),
+# and the indexes are swapped in as a whole, so lookups never see a half-built
+# registry. Newly added symbols are priced at once; timeseries appends rows for
+# them on its next record(), and indicators/autoalert pad their state to match.
 
 # SOL mint address
 SYSTEM_SOL = "So11111111111111111111111111111111111111112"
 
-# Mint → Symbol
-TOKEN_MINTS = {
-    SYSTEM_SOL: "SOL",
-    "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v": "USDC",
-    "9n4nbM75f5Ui33ZbPYXn59EwSgE8CGsHtAeTH5YFeJ9E": "BTC",
-    "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263": "BONK",
-    "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB": "USDT",
-    "2sXXcMa8UY7G28kH2r7SytRD8W7AqH4G9oZax1qsnURe": "SRM",
-    "4k3Dyjzvzp8eYbWwTfSPd7d7VndV1TJv8W1g2mVQHdqF": "RAY",
-    "2zMMhcVQEXDtdE6vsFS7S7D5oUodfJHE8vd1gnBouauv" : "PENGU",
-    "H3QSHQNPUR6ES36ZQYAy5UocxfH8A2GE2NvA9SEk46wq": "TRUMPUP",
-    "LinkhB3afbBKb2EQQu7s7umdZceV3wcvAUJhQAfQ23L"  : "Link",
-    "rndrizKT3MK1iimdxRdWabcF7Zg7AR5T4nud4EkHBof" : "RENDER",
-    "J3NKxxXZcnNiMjKw9hYb2K4LUxgwB6t1FtPtQVsv3KFr" : "SPX",
-    "JUPyiwrYJFskUPiHa7hkeR8VUtAeFoSYbKedZNsDvCN":  "JUP",
-    "EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzLHYxdM65zcjm" : "WIF",
-    "4qQeZ5LwSz6HuupUu8jCtgXyW1mYQcNbFAW1sWZp89HL" : "CAKE",
-    "3iQL8BFS2vE7mww4ehAqQHAsbmRNCrPxizWAT2Zfyr9y" : "VIRTUAL",
-    "2b1kV6DkPAnxd5ixfnxCpjxmKwqjjaYmCZfHsFu24GXo": "PYUSD",
-    "HZ1JovNiVvGrGNiiYvEozEVgZ58xaU3RKwX8eACQBCt3" : "PYTH",
-    "i7u4r16TcsJTgq1kAG8opmVZyVnAKBwLKu6ZPMwzxNc" : "OUSG",
-    "hntyVP6YFm1Hg25TN9WGLqM12b8TQmcknKrdu1oxWux" : "HNT",
-    "ZBCNpuD7YMXzTHB2fhGkGi78MNsHGLRXUhRewNRm9RU" : "ZBCN",
-    "vQoYWru2pbUdcVkUrRH74ktQDJgVjRcDvsoDbUzM5n9" : "REKT",
-    "85VBFQZC9TZkfaptBWjvUw7YbZjy52A6mjtPGjstQAmQ" : "W",
-    "Dm5BxyMetG3Aq5PaG1BrG7rBYqEMtnkjvPNMExfacVk7" : "ATH",
-    "6p6xgHyF7AeE6TZkSmFsko444wqoP15icUSqi2jfGiPN" : "TRUMP",
-    "7GCihgDB8fe6KNjn2MYtkzZcRjQy3t9GHdC8uHYmW2hr": "POPCAT",
-    "EPeUFDgHRxs9xxEPVaL6kfGQvCon7jmAWKVUHuux1Tpz":  "BAT",
-    "u9nmK5sQovm6ACVCQbbq8xUMpFqdPSYxdxVwXUX4sjY" : "ORDI",
-    "HeLp6NuQkmYB4pYWo2zYs22mESHXPQYzXbB8n4V98jwC" : "AI16Z",
-    "ukHH6c7mMyiWCf1b9pnWe25TSpkDDt3H5pQZgZ74J82"  :"BOME",
-    "BZLbGTNCSFfoth2GYDtwr7e4imWzpR5jqcUuGEwr646K" :"IO",
-
-}
-
-# Reverse: Symbol → Mint
-SYMBOL_TO_MINT = {v: k for k, v in TOKEN_MINTS.items()}
+TOKENS_FILE = os.environ.get("TOKENS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokens.json"))
+DEXSCREENER_PAIR_URL = "https://api.dexscreener.com/latest/dex/pairs/{chain}/{pair}"
+RELOAD_SECONDS = 30
+
+_registry = None  # {"tokens": [...], "by_symbol": {...}, "by_coingecko_id": {...}, "by_mint": {...}, "by_pair": {...}}
+_mtime = None
+_version = 0
+
+def _build(entries):
+    tokens, by_symbol, by_cg, by_mint, by_pair = [], {}, {}, {}, {}
+    for raw in entries:
+        token = dict(raw, symbol=raw["symbol"].lower())
+        if token["symbol"] in by_symbol:
+            raise ValueError(f"duplicate symbol {token['symbol']}")
+        if token.get("dex_chain") and token.get("dex_pair"):
+            token["dex_url"] = DEXSCREENER_PAIR_URL.format(chain=token["dex_chain"], pair=token["dex_pair"])
+        tokens.append(token)
+        by_symbol[token["symbol"]] = token
+        if token.get("coingecko_id"):
+            by_cg[token["coingecko_id"]] = token
+        if token.get("mint"):
+            by_mint[token["mint"]] = token
+        if token.get("dex_pair"):
+            by_pair[token["dex_pair"].lower()] = token
+    return {"tokens": tokens, "by_symbol": by_symbol, "by_coingecko_id": by_cg, "by_mint": by_mint, "by_pair": by_pair,
+            "priced": [t["symbol"] for t in tokens if t.get("coingecko_id")]}
+
+def reload(force=False):
+    """Re-read TOKENS_FILE if it changed. A broken file keeps the previous registry."""
+    global _registry, _mtime, _version
+    mtime = os.path.getmtime(TOKENS_FILE)
+    if not force and _registry is not None and mtime == _mtime:
+        return False
+    try:
+        with open(TOKENS_FILE, encoding="utf-8") as f:
+            registry = _build(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        if _registry is None:
+            raise
+        _mtime = mtime  # don't retry (and log) the same broken file every tick
+        logger.error(f"❌ Token registry reload failed, keeping the previous one: {e}")
+        return False
+    _registry, _mtime = registry, mtime
+    _version += 1
+    logger.info(f"🪙 Token registry loaded: {len(registry['tokens'])} tokens")
+    return True
+
+def _reg():
+    if _registry is None:
+        reload()
+    return _registry
+
+def version():
+    """Bumped on every reload, for callers that cache something derived from the registry."""
+    _reg()
+    return _version
+
+# --- Lookups (O(1)) ---
+def get(symbol):
+    return _reg()["by_symbol"].get(symbol.lower()) if symbol else None
+
+def by_coingecko_id(coingecko_id):
+    return _reg()["by_coingecko_id"].get(coingecko_id)
+
+def by_mint(mint):
+    return _reg()["by_mint"].get(mint)
+
+def by_pair(address):
+    return _reg()["by_pair"].get(address.lower()) if address else None
+
+def coingecko_id(symbol):
+    token = get(symbol)
+    return token.get("coingecko_id") if token else None
+
+def binance_symbol(symbol):
+    token = get(symbol)
+    return token.get("binance_symbol") if token else None
+
+def dex_url(symbol):
+    token = get(symbol)
+    return token.get("dex_url") if token else None
+
+def is_priced(symbol):
+    return coingecko_id(symbol) is not None
+
+def symbol_for_mint(mint):
+    token = by_mint(mint)
+    return token["symbol"] if token else None
+
+# --- Collections ---
+def symbols():
+    """Priced symbols in file order."""
+    return _reg()["priced"]
+
+def all_tokens():
+    return _reg()["tokens"]
+
+def solana_tokens():
+    """[(SYMBOL, mint)] for every token with a Solana mint."""
+    return [(t["symbol"].upper(), t["mint"]) for t in _reg()["tokens"] if t.get("mint")]
+
+# --- Hot reload job ---
+def token_registry_job(context):
+    reload()
 
+def register_token_registry_job(application):
+    from jobs import schedule_repeating
+    schedule_repeating(application, "token_registry", token_registry_job, interval=RELOAD_SECONDS, first=RELOAD_SECONDS)
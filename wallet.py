@@ -15,20 +15,6 @@ else:
     print("i AES_PASSWORD")
     AES_PASSWORD = bytes.fromhex(AES_PASSWORD_HEX)  # Convert hex string to bytes
 
-# Use Railway PostgreSQL
-conn = psycopg2.connect(os.environ["DATABASE_URL"])
-c = conn.cursor()
-
-# --- DB Setup ---
-c.execute("""
-CREATE TABLE IF NOT EXISTS swap_users (
-    user_id INTEGER PRIMARY KEY,
-    encrypted_privkey BYTEA,
-    wallet_address TEXT
-)
-""")
-conn.commit()
-
 # --- AES ---
 def encrypt_private_key(key_bytes: bytes, password: bytes) -> bytes:
     iv = os.urandom(16)
@@ -0,0 +1,75 @@
+import psycopg2
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Public wallet addresses are read from swap_users.wallet_address, never derived
+# from the encrypted key. Decryption only belongs on the signing path.
+CACHE_TTL = 300  # seconds
+
+# --- In-memory lookup cache: {user_id: (address_or_None, cached_at)} ---
+_address_cache = {}
+
+def get_wallet_address(user_id: int) -> str | None:
+    """Return the user's public Solana address, or None if they have no wallet."""
+    cached = _address_cache.get(user_id)
+    if cached and time.time() - cached[1] < CACHE_TTL:
+        return cached[0]
+
+    try:
+        with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT wallet_address FROM swap_users WHERE user_id = %s", (user_id,))
+                row = cur.fetchone()
+    except psycopg2.Error as e:
+        logger.error(f"Database error in get_wallet_address: {e}")
+        return None
+
+    address = row[0] if row and row[0] else None
+    _address_cache[user_id] = (address, time.time())
+    return address
+
+def get_wallet_addresses(user_ids) -> dict:
+    """Bulk lookup: {user_id: address} for every user that has a wallet."""
+    now = time.time()
+    result = {}
+    missing = []
+    for user_id in user_ids:
+        cached = _address_cache.get(user_id)
+        if cached and now - cached[1] < CACHE_TTL:
+            if cached[0]:
+                result[user_id] = cached[0]
+        else:
+            missing.append(user_id)
+
+    if missing:
+        try:
+            with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT user_id, wallet_address FROM swap_users WHERE user_id = ANY(%s)",
+                        (missing,)
+                    )
+                    rows = dict(cur.fetchall())
+        except psycopg2.Error as e:
+            logger.error(f"Database error in get_wallet_addresses: {e}")
+            return result
+
+        for user_id in missing:
+            address = rows.get(user_id) or None
+            _address_cache[user_id] = (address, now)
+            if address:
+                result[user_id] = address
+    return result
+
+def has_wallet(user_id: int) -> bool:
+    return get_wallet_address(user_id) is not None
+
+def set_wallet_address(user_id: int, address: str | None):
+    """Prime the cache after the address was written to swap_users."""
+    _address_cache[user_id] = (address, time.time())
+
+def invalidate_wallet_address(user_id: int):
+    _address_cache.pop(user_id, None)
@@ -1,24 +1,13 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CommandHandler
-from solana.rpc.async_api import AsyncClient
-from solders.pubkey import Pubkey
-from solana.rpc.types import TokenAccountOpts
 import logging
 import psycopg2
 import os
-from wallet import (
-    generate_wallet,
-    save_encrypted_key,
-    encrypt_private_key,
-    get_encrypted_key,
-    AES_PASSWORD,
-    decode_base58_private_key,
-    decrypt_private_key,
-    load_keypair
-)
-from swap import perform_swap, SYSTEM_SOL
-from tokens import TOKEN_MINTS
-from autosnip import subscribe_to_snipe
+from tokens import SYSTEM_SOL
+from wallet_directory import get_wallet_address, has_wallet, set_wallet_address
+
+# wallet/swap/portfolio (solana, solders, cryptography) are imported inside the
+# handlers so processes that never trade don't pay for loading them.
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,24 +20,13 @@ async def create_wallet(update_or_callback_query, context):
     except AttributeError:
         user_id = update_or_callback_query.from_user.id
 
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    c = conn.cursor()
-    try:
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS swap_users (
-                user_id INTEGER PRIMARY KEY,
-                encrypted_privkey BYTEA,
-                wallet_address TEXT
-            )
-        """)
-        c.execute("SELECT wallet_address FROM swap_users WHERE user_id = %s", (user_id,))
-        if c.fetchone() and c.fetchone()[0]:
-            await update_or_callback_query.message.reply_text(
-                "⚠️ You already have a wallet. Please delete it first before creating a new one."
-            )
-            return
-    finally:
-        conn.close()
+    if has_wallet(user_id):
+        await update_or_callback_query.message.reply_text(
+            "⚠️ You already have a wallet. Please delete it first before creating a new one."
+        )
+        return
+
+    from wallet import generate_wallet, encrypt_private_key, save_encrypted_key, AES_PASSWORD
 
     keypair = generate_wallet()
     privkey_bytes = bytes(keypair)
@@ -66,6 +44,7 @@ async def create_wallet(update_or_callback_query, context):
         conn.commit()
     finally:
         conn.close()
+    set_wallet_address(user_id, str(keypair.pubkey()))
 
     await update_or_callback_query.message.reply_text(
         f"🎉 Wallet created!\n\n*Public Address:*\n`{keypair.pubkey()}`",
@@ -80,6 +59,8 @@ async def import_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /import_wallet <base58_private_key>")
         return
 
+    from wallet import decode_base58_private_key, encrypt_private_key, save_encrypted_key, load_keypair, AES_PASSWORD
+
     try:
         privkey_bytes = decode_base58_private_key(context.args[0])
         if len(privkey_bytes) not in [32, 64]:
@@ -105,6 +86,7 @@ async def import_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
             conn.commit()
         finally:
             conn.close()
+        set_wallet_address(user_id, str(keypair.pubkey()))
 
         await update.message.reply_text(
             f"✅ Wallet imported!\n\n*Public Address:*\n`{keypair.pubkey()}`",
@@ -130,6 +112,9 @@ async def buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Invalid amount: {e}")
         return
 
+    from swap import perform_swap
+    from wallet import AES_PASSWORD
+
     try:
         logger.info(f"perform_swap args: user_id={user_id}, input_mint={SYSTEM_SOL}, output_mint={token_mint}, amount={amount_sol}")
         tx_sig = await perform_swap(user_id, SYSTEM_SOL, token_mint, amount_sol, AES_PASSWORD)
@@ -154,6 +139,9 @@ async def sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Invalid amount: {e}")
         return
 
+    from swap import perform_swap
+    from wallet import AES_PASSWORD
+
     try:
         logger.info(f"perform_swap args: user_id={user_id}, input_mint={token_mint}, output_mint={SYSTEM_SOL}, amount={amount_tokens}")
         tx_sig = await perform_swap(user_id, token_mint, SYSTEM_SOL, amount_tokens, AES_PASSWORD)
@@ -165,39 +153,34 @@ async def sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def balance(update, context):
     """Display SOL and SPL token balances for the user's wallet."""
     user_id = update.effective_user.id
-    encrypted = get_encrypted_key(user_id)
+    address = get_wallet_address(user_id)
 
-    if not encrypted:
+    if not address:
         logger.warning(f"No wallet for user {user_id}")
         await update.effective_message.reply_text("⚠️ You must /create_wallet or /import_wallet first.")
         return
 
     try:
-        privkey_bytes = decrypt_private_key(encrypted, AES_PASSWORD)
-        keypair = load_keypair(privkey_bytes)
-        pubkey_obj = keypair.pubkey()
-
-        async with AsyncClient("https://api.mainnet-beta.solana.com") as client:
-            sol_balance_resp = await client.get_balance(pubkey_obj)
-            sol = sol_balance_resp.value / 1_000_000_000
-
-            opts = TokenAccountOpts(program_id=Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"))
-            token_accounts_resp = await client.get_token_accounts_by_owner_json_parsed(owner=pubkey_obj, opts=opts)
-
-            token_lines = [
-                f"• `{TOKEN_MINTS.get(acc.account.data.parsed['info']['mint'], acc.account.data.parsed['info']['mint'][:6] + '...')}`: {int(acc.account.data.parsed['info']['tokenAmount']['amount']) / (10 ** int(acc.account.data.parsed['info']['tokenAmount']['decimals'])):.4f}"
-                for acc in token_accounts_resp.value
-                if isinstance(acc.account.data.parsed, dict) and int(acc.account.data.parsed['info']['tokenAmount']['amount']) > 0
-            ]
-            token_text = "\n".join(token_lines) if token_lines else "_No SPL tokens found_"
-
-            await update.effective_message.reply_text(
-                f"📍 *Wallet Address:*\n`{str(pubkey_obj)}`\n\n"
-                f"💰 *SOL:* {sol:.4f} SOL\n\n"
-                f"📦 *Tokens:*\n{token_text}",
-                parse_mode="Markdown",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Withdraw", callback_data="withdraw_start")]])
-            )
+        from portfolio import get_portfolio
+        portfolio = await get_portfolio(address)
+
+        def fmt_usd(value):
+            return f" (${value:,.2f})" if value is not None else ""
+
+        token_lines = [
+            f"• `{token['symbol'] or token['mint'][:6] + '...'}`: {token['amount']:.4f}{fmt_usd(token['usd'])}"
+            for token in portfolio["tokens"]
+        ]
+        token_text = "\n".join(token_lines) if token_lines else "_No SPL tokens found_"
+
+        await update.effective_message.reply_text(
+            f"📍 *Wallet Address:*\n`{address}`\n\n"
+            f"💰 *SOL:* {portfolio['sol']:.4f} SOL{fmt_usd(portfolio['sol_usd'])}\n\n"
+            f"📦 *Tokens:*\n{token_text}\n\n"
+            f"💵 *Total:* ${portfolio['total_usd']:,.2f}",
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Withdraw", callback_data="withdraw_start")]])
+        )
     except Exception as e:
         logger.error(f"Balance fetch failed for user {user_id}: {e}", exc_info=True)
         await update.effective_message.reply_text(f"❌ Failed to fetch balance: {e}")
@@ -217,6 +200,7 @@ async def snipe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Invalid amount: {e}")
         return
 
+    from autosnip import subscribe_to_snipe
     subscribe_to_snipe(user_id, mint, amount)
     await update.message.reply_text(
         f"🎯 Subscribed to snipe token:\nMint: `{mint}`\nAmount: `{amount} SOL`",
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import psycopg2
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.core import RPCException
+from solana.rpc.types import TxOpts
+from solders.message import Message
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.system_program import transfer, TransferParams
+from solders.transaction import Transaction
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from wallet import get_encrypted_key, decrypt_private_key, load_keypair, AES_PASSWORD
+from portfolio import invalidate_portfolio
+import solana_ws
+import chain_state
+
+logger = logging.getLogger(__name__)
+
+RPC_URL = os.environ.get("RPC_URL") or "https://api.mainnet-beta.solana.com"
+
+CONFIRM_INITIAL_DELAY = 0.5  # seconds, grows by CONFIRM_BACKOFF up to CONFIRM_MAX_DELAY
+CONFIRM_BACKOFF = 1.5
+CONFIRM_MAX_DELAY = 8
+CONFIRM_PUSH_TIMEOUT = 120   # the blockhash expires well before this
+MAX_RECHECKS = 5             # re-checks of a sent withdrawal after errors, per process
+QUEUED_MAX_AGE_MINUTES = 10  # queued rows older than this are never sent after a restart
+# A SOL transfer uses ~450 CU; the budget instructions add a few hundred more. The
+# priority fee is paid on the requested limit, not on what is used.
+TRANSFER_COMPUTE_UNIT_LIMIT = 1_000
+BASE_FEE_LAMPORTS = 5_000  # per signature
+
+# Status flow: queued -> sent -> confirmed | failed | expired
+# A row is marked 'sent' with its signature BEFORE the transaction leaves the
+# process, so after a crash every possibly-landed withdrawal can be re-checked.
+
+# --- Running pipeline tasks (kept referenced so they are not garbage collected) ---
+_tasks = set()
+_rechecks = {}  # withdrawal id -> re-checks scheduled after an error
+
+# --- DB ---
+def _update(withdrawal_id: int, **fields):
+    assignments = ", ".join(f"{name} = %s" for name in fields)
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE withdrawals SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                (*fields.values(), withdrawal_id)
+            )
+
+def _load(withdrawal_id: int):
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, user_id, source_address, dest_address, lamports, status, signature, last_valid_block_height "
+                "FROM withdrawals WHERE id = %s",
+                (withdrawal_id,)
+            )
+            row = cur.fetchone()
+    if not row:
+        return None
+    keys = ("id", "user_id", "source_address", "dest_address", "lamports", "status", "signature", "last_valid_block_height")
+    return dict(zip(keys, row))
+
+def queue_withdrawal(user_id: int, source_address: str, dest_address: str, lamports: int) -> int:
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO withdrawals (user_id, source_address, dest_address, lamports) "
+                "VALUES (%s, %s, %s, %s) RETURNING id",
+                (user_id, source_address, dest_address, lamports)
+            )
+            return cur.fetchone()[0]
+
+def network_fee_lamports() -> int:
+    """Network fee a withdrawal sent now would pay: base fee plus priority fee on the CU limit."""
+    priority_fee = chain_state.get_priority_fee() or 0
+    return BASE_FEE_LAMPORTS + -(-priority_fee * TRANSFER_COMPUTE_UNIT_LIMIT // 1_000_000)
+
+# --- Pipeline ---
+async def _send(client: AsyncClient, w: dict):
+    encrypted = get_encrypted_key(w["user_id"])
+    if not encrypted:
+        raise Exception("⚠️ Wallet not found.")
+    keypair = load_keypair(decrypt_private_key(encrypted, AES_PASSWORD))
+
+    instructions = [
+        transfer(
+            TransferParams(
+                from_pubkey=keypair.pubkey(),
+                to_pubkey=Pubkey.from_string(w["dest_address"]),
+                lamports=w["lamports"]
+            )
+        )
+    ]
+    priority_fee = chain_state.get_priority_fee()
+    if priority_fee is not None:
+        instructions[:0] = [set_compute_unit_limit(TRANSFER_COMPUTE_UNIT_LIMIT), set_compute_unit_price(priority_fee)]
+
+    # Prefetched blockhash (at most a few seconds old): sign and send immediately after
+    blockhash, last_valid_block_height = await chain_state.get_blockhash(client)
+    message = Message(instructions, payer=keypair.pubkey())
+    transaction = Transaction([keypair], message, blockhash)
+
+    w["signature"] = str(transaction.signatures[0])
+    w["last_valid_block_height"] = last_valid_block_height
+    _update(w["id"], status="sent", signature=w["signature"],
+            last_valid_block_height=w["last_valid_block_height"])
+
+    await client.send_raw_transaction(bytes(transaction), opts=TxOpts(skip_preflight=False))
+
+async def _confirm(client: AsyncClient, w: dict) -> str:
+    """Poll signature status with backoff (woken early by websocket push). Returns the final status."""
+    signature = Signature.from_string(w["signature"])
+    # One push subscription for the whole confirmation; if it fails (websocket
+    # down) the loop just sleeps between polls
+    waiter = asyncio.create_task(solana_ws.wait_for_signature(w["signature"], timeout=CONFIRM_PUSH_TIMEOUT))
+    delay = CONFIRM_INITIAL_DELAY
+    try:
+        while True:
+            statuses = await client.get_signature_statuses([signature], search_transaction_history=True)
+            status = statuses.value[0]
+            if status is not None and status.err is not None:
+                _update(w["id"], status="failed", error=str(status.err))
+                return "failed"
+            if status is not None and solana_ws.commitment_rank(status.confirmation_status) >= solana_ws.commitment_rank("confirmed"):
+                _update(w["id"], status="confirmed")
+                return "confirmed"
+
+            if status is None and w["last_valid_block_height"] is not None:
+                height = (await client.get_block_height()).value
+                if height > w["last_valid_block_height"]:
+                    # The blockhash is expired, so this transaction can never land
+                    _update(w["id"], status="expired", error="blockhash expired before confirmation")
+                    return "expired"
+
+            if waiter.done():
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.wait({waiter}, timeout=delay)
+            delay = min(delay * CONFIRM_BACKOFF, CONFIRM_MAX_DELAY)
+    finally:
+        if waiter.done():
+            if not waiter.cancelled():
+                waiter.exception()  # mark retrieved
+        else:
+            waiter.cancel()
+            await solana_ws.cancel_signature_wait(w["signature"])
+
+async def _notify(bot, w: dict, outcome: str, error: str | None = None):
+    sol = w["lamports"] / 1_000_000_000
+    if outcome == "confirmed":
+        text = f"✅ Withdrawal of {sol:.4f} SOL confirmed!\n🔗 https://solscan.io/tx/{w['signature']}"
+    elif outcome == "expired":
+        text = f"⚠️ Withdrawal of {sol:.4f} SOL was not included in time. No funds were moved, please try again."
+    elif outcome == "unknown":
+        text = (f"⚠️ Withdrawal of {sol:.4f} SOL was sent but could not be confirmed yet. "
+                f"Please check before retrying:\n🔗 https://solscan.io/tx/{w['signature']}")
+    else:
+        text = f"❌ Withdrawal of {sol:.4f} SOL failed: {error or 'transaction error'}"
+    try:
+        await bot.send_message(chat_id=w["user_id"], text=text, disable_web_page_preview=True)
+    except Exception as e:
+        logger.error(f"Failed to notify user {w['user_id']} about withdrawal {w['id']}: {e}")
+
+async def _process(bot, withdrawal_id: int):
+    w = _load(withdrawal_id)
+    if not w or w["status"] not in ("queued", "sent"):
+        return
+    outcome, error = None, None
+    try:
+        async with AsyncClient(RPC_URL) as client:
+            if w["status"] == "queued":
+                try:
+                    await _send(client, w)
+                except RPCException as e:
+                    # Rejected by preflight: nothing was broadcast
+                    outcome, error = "failed", str(e)
+                    _update(w["id"], status="failed", error=error)
+            if outcome is None:
+                outcome = await _confirm(client, w)
+    except Exception as e:
+        logger.error(f"Withdrawal {withdrawal_id} failed: {e}", exc_info=True)
+        error = str(e)
+        if w.get("signature"):
+            # Possibly broadcast: keep it 'sent' and check the signature again later.
+            # Past MAX_RECHECKS the row stays 'sent' for resume_withdrawals on restart.
+            rechecks = _rechecks.get(withdrawal_id, 0)
+            if rechecks < MAX_RECHECKS:
+                _rechecks[withdrawal_id] = rechecks + 1
+                await asyncio.sleep(CONFIRM_MAX_DELAY * 2 ** rechecks)
+                start_withdrawal(bot, withdrawal_id)
+                return
+            outcome = "unknown"
+        else:
+            _update(w["id"], status="failed", error=error)
+            outcome = "failed"
+    _rechecks.pop(withdrawal_id, None)
+
+    invalidate_portfolio(w["source_address"])
+    invalidate_portfolio(w["dest_address"])
+    await _notify(bot, w, outcome, error)
+
+def start_withdrawal(bot, withdrawal_id: int):
+    """Run the withdrawal in the background; the user is notified when it finishes."""
+    task = asyncio.create_task(_process(bot, withdrawal_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def resume_withdrawals(app):
+    """Pick up withdrawals left in flight by a previous process."""
+    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE withdrawals SET status = 'failed', error = 'abandoned before sending', "
+                "updated_at = CURRENT_TIMESTAMP "
+                "WHERE status = 'queued' AND created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute' "
+                "RETURNING id",
+                (QUEUED_MAX_AGE_MINUTES,)
+            )
+            abandoned = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT id FROM withdrawals WHERE status IN ('queued', 'sent') ORDER BY id")
+            in_flight = [row[0] for row in cur.fetchall()]
+
+    for withdrawal_id in abandoned:
+        w = _load(withdrawal_id)
+        await _notify(app.bot, w, "failed", "the bot restarted before it was sent. No funds were moved")
+    for withdrawal_id in in_flight:
+        start_withdrawal(app.bot, withdrawal_id)
+    if in_flight:
+        logger.info(f"Resumed {len(in_flight)} in-flight withdrawals")